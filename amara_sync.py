@@ -2,7 +2,12 @@
 import argparse, sys, requests
 from pprint import pprint
 from api.amara_api import Amara
-from utils import eprint, download_yt_subtitles
+from utils import eprint
+from youtube_subs import download_yt_subtitles
+from subtitle_store import SubtitleStore, SUBTITLE_STORE_DIR
+from journal import Journal, default_journal_fname
+from normalize_subs import Normalizer, load_typo_map, DEFAULT_RULES, RULES
+from subtitles import SubtitleParseError
 from time import sleep
 
 def read_cmd():
@@ -37,7 +42,31 @@ def read_cmd():
    parser.add_argument(
            '-s', '--sleep', dest = 'sleep_int',
            required = False, type = float, default = -1,
-           help='Sleep interval (seconds)')
+           help='Extra sleep interval (seconds). Normally not needed, \
+           requests to Amara are rate-limited automatically.')
+   parser.add_argument(
+           '--store', dest = 'store_dir', default = SUBTITLE_STORE_DIR,
+           help='Local store of already downloaded Amara subtitles')
+   parser.add_argument(
+           '--no-cache', dest = 'use_cache',
+           default = True, action = 'store_false',
+           help='Do not use cached Amara video lookups.')
+   parser.add_argument(
+           '--rules', dest = 'rules', default = ','.join(DEFAULT_RULES),
+           help='Comma separated list of normalization rules applied before upload, \
+           available: %s. Use "none" to upload subtitles as they are.' % ', '.join(sorted(RULES)))
+   parser.add_argument(
+           '--typos', dest = 'typos_fname', default = None,
+           help='Fix typos from this map before upload, "typo<TAB>correction" per line')
+   parser.add_argument(
+           '--resume', dest = 'resume',
+           default = False, action = 'store_true',
+           help='Skip videos finished in the previous run and do not \
+           upload again subtitles that were already uploaded (see --journal).')
+   parser.add_argument(
+           '--journal', dest = 'journal_fname', default = None,
+           help='Journal file with progress of the run, written on every run, \
+           default is INPUT_FILE.amara_sync.LANG.journal')
    return parser.parse_args()
 
 
@@ -64,16 +93,46 @@ with open(opts.input_file, "r") as f:
     for line in f:
         ytids.append(line.split())
 
-amara = Amara(AMARA_SUBTITLER)
-amara_review = Amara(AMARA_REVIEWER)
+amara = Amara(AMARA_SUBTITLER, use_cache = opts.use_cache)
+amara_review = Amara(AMARA_REVIEWER, use_cache = opts.use_cache)
+store = SubtitleStore(opts.store_dir)
+
+rules = [r.strip() for r in opts.rules.split(',') if r.strip() not in ('', 'none')]
+typos = None
+if opts.typos_fname is not None:
+    typos = load_typo_map(opts.typos_fname)
+    if 'typos' not in rules:
+        rules.append('typos')
+try:
+    normalizer = Normalizer(lang, rules, typos)
+except ValueError as e:
+    eprint("ERROR: %s" % e)
+    sys.exit(1)
+
+if opts.journal_fname is None:
+    opts.journal_fname = default_journal_fname(__file__, opts.input_file, lang)
+journal = Journal(opts.journal_fname, resume = opts.resume)
 
 def check_upload_success(response, sub_version_old):
     sub_version_new = response['version_number']
     if sub_version_new != sub_version_old + 1:
         eprint("ERROR: Something went wrong during subtitle upload")
-        eprint(r)
+        eprint(response)
         sys.exit(1)
 
+def upload_subs_once(amara, ytid, amara_id, complete, subs, sub_version_old):
+    """Upload subtitles and record it in the journal.
+    Upload is skipped if the journal says that we already uploaded
+    this revision in the previous (interrupted) run."""
+    uploaded_version = journal.info(ytid).get('uploaded_version')
+    if uploaded_version is not None and uploaded_version == sub_version_old:
+        print("Subtitle revision %d was uploaded in the previous run, skipping upload"
+                % uploaded_version)
+        return
+    r = amara.upload_subs(amara_id, lang, complete, subs, SUB_FORMAT)
+    check_upload_success(r, sub_version_old)
+    journal.record(ytid, 'uploaded', uploaded_version = r['version_number'])
+
 def compare_work_status(work_status, expected_work_status):
     if work_status != expected_work_status:
         eprint("ERROR: Unexpected work status!")
@@ -114,7 +173,8 @@ def download_subs_from_public_amara(amara, ytid, lang):
         sys.exit(1)
  
     # Download subtitles from Public Amara for a given language
-    subs = amara.download_subs(amara_id_public, lang, SUB_FORMAT)
+    # (unless we already have this revision in the local store)
+    subs = store.fetch(amara, amara_id_public, lang, sub_version_public, SUB_FORMAT)
     return subs, sub_version_public
 
 def read_subs_from_file(ytid, lang, dirname, sub_format):
@@ -124,9 +184,6 @@ def read_subs_from_file(ytid, lang, dirname, sub_format):
         subs = f.read()
     return subs
 
-def replace_double_spaces(subs):
-    return subs.replace('  ',' ');
-
 # Main loop
 for i in range(len(ytids)):
     if len(ytids[i]) == 0:
@@ -134,6 +191,10 @@ for i in range(len(ytids)):
         continue
     ytid = ytids[i][0]
 
+    if journal.is_done(ytid):
+        continue
+    journal.record(ytid, journal.STARTED)
+
     sys.stdout.flush()
     sys.stderr.flush()
 
@@ -143,6 +204,8 @@ for i in range(len(ytids)):
     elif opts.yt_download:
         backup_dir = "subs_backup_%s" % lang
         subs = download_yt_subtitles(lang, SUB_FORMAT, ytid, backup_dir)
+        if subs is None:
+            sys.exit(1)
     elif opts.amara_public_download:
         subs, subs_version = download_subs_from_public_amara(amara, ytid, opts.lang)
         if subs_version < 1:
@@ -152,15 +215,20 @@ for i in range(len(ytids)):
         print("ERROR: You didn't specify the subtitle source")
         sys.exit(1)
 
-    # 1.5 Correct common mistakes
-    # Remove double spaces between words
-    subs = replace_double_spaces(subs)
+    # 1.5 Correct common mistakes (see normalize_subs.py)
+    try:
+        subs, changed = normalizer.normalize_subs(subs, SUB_FORMAT)
+    except SubtitleParseError as e:
+        eprint("WARNING: Could not parse subtitles for YTID=%s, uploading them as they are: %s" % (ytid, e))
+        changed = 0
+    if changed > 0:
+        print("Corrected %d subtitle cues" % changed)
 
     if subs.strip() == '':
         print("ERROR: Empty subtitles for YTID=%s" % ytid)
         sys.exit(1)
 
-    # Trying to reduce E 429
+    # Extra delay on top of the automatic rate limiting in Amara class
     if opts.sleep_int > 0:
         sleep(opts.sleep_int)
 
@@ -197,9 +265,9 @@ for i in range(len(ytids)):
 
         print(amara.list_actions(amara_id_private, opts.lang))
         # DH TEST: Using amara_review here to try to cheat the Error 429
-        r = amara_review.upload_subs(amara_id_private, lang, PUBLISH_SUBTITLES, subs, SUB_FORMAT)
-        check_upload_success(r, sub_version_private)
+        upload_subs_once(amara_review, ytid, amara_id_private, PUBLISH_SUBTITLES, subs, sub_version_private)
         print(amara.list_actions(amara_id_private, opts.lang))
+        journal.done(ytid)
         continue
 
     elif r['meta']['total_count'] > 1:
@@ -228,8 +296,8 @@ for i in range(len(ytids)):
             # we will leave them to the reviewer
             print("Uploading new subtitles, complete=%s" %
                     is_completely_subtitled)
-            r = amara.upload_subs(amara_id_private, lang, \
-                    is_completely_subtitled, subs, SUB_FORMAT)
+            upload_subs_once(amara, ytid, amara_id_private, \
+                    is_completely_subtitled, subs, sub_version_private)
 
             # If we want subtitles to be published, we need to assign reviewer
             # and Endorse them
@@ -239,6 +307,7 @@ for i in range(len(ytids)):
                 compare_work_status(r['work_status'], 'being-reviewed')
                 r = amara_review.mark_subtitles_complete(job_id, AMARA_TEAM)
                 compare_work_status(r['work_status'], 'complete')
+                journal.done(ytid)
                 continue
         
         elif work_status == 'needs-reviewer':
@@ -251,8 +320,7 @@ Will upload new version and mark it as ready for review.")
             compare_work_status(r['work_status'], 'being-reviewed')
 
             print("Uploading new subtitles, complete=%s" % PUBLISH_SUBTITLES)
-            r = amara_review.upload_subs(amara_id_private, lang, PUBLISH_SUBTITLES, subs, SUB_FORMAT)
-            check_upload_success(r, sub_version_private)
+            upload_subs_once(amara_review, ytid, amara_id_private, PUBLISH_SUBTITLES, subs, sub_version_private)
             # If the video is not complete, let's unassign the reviewer
             if not PUBLISH_SUBTITLES:
                 print("Unassigning reviewer")
@@ -260,6 +328,7 @@ Will upload new version and mark it as ready for review.")
                 compare_work_status(r['work_status'], 'needs-reviewer')
             else:
                 check_work_status(amara_id_private, opts.lang, AMARA_TEAM, 'complete')
+            journal.done(ytid)
             continue
 
 
@@ -269,13 +338,13 @@ Will upload new version and mark it as ready for review.")
                 print("New subtitles will NOT be uploaded")
                 r = amara_review.unassign_reviewer(job_id, AMARA_TEAM)
                 compare_work_status(r['work_status'], 'needs-reviewer')
+                journal.done(ytid)
                 continue
 
             print("Subtitles already under review, assigning new reviewer %s" % AMARA_REVIEWER)
             r = amara_review.assign_reviewer(job_id, AMARA_TEAM)
             print("Uploading new subtitles, complete=%s" % PUBLISH_SUBTITLES)
-            r = amara_review.upload_subs(amara_id_private, lang, PUBLISH_SUBTITLES, subs, SUB_FORMAT)
-            check_upload_success(r, sub_version_private)
+            upload_subs_once(amara_review, ytid, amara_id_private, PUBLISH_SUBTITLES, subs, sub_version_private)
             check_work_status(amara_id_private, opts.lang, AMARA_TEAM, 'complete')
 
         elif work_status == 'complete':
@@ -284,13 +353,15 @@ Will upload new version and mark it as ready for review.")
                 print("Uploading new subtitles, complete=%s" % PUBLISH_SUBTITLES)
             else:
                 print("Uploading new version anyway")
-            r = amara.upload_subs(amara_id_private, lang, PUBLISH_SUBTITLES, subs, SUB_FORMAT)
-            check_upload_success(r, sub_version_private)
+            upload_subs_once(amara, ytid, amara_id_private, PUBLISH_SUBTITLES, subs, sub_version_private)
             check_work_status(amara_id_private, opts.lang, AMARA_TEAM, 'complete')
+            journal.done(ytid)
             continue
 
         else:
             print("Unknown subtitle status, not sure what to do")
             sys.exit(1)
 
+    journal.done(ytid)
 
+journal.close()
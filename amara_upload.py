@@ -3,7 +3,14 @@ from subprocess import Popen, PIPE
 import argparse, sys, requests
 from pprint import pprint
 from api.amara_api import Amara
-from utils import answer_me, download_yt_subtitles
+from utils import answer_me
+from youtube_subs import download_yt_subtitles
+from journal import Journal, default_journal_fname
+from subs_diff import diff_subs
+from subtitles import SubtitleParseError
+import subs_qa
+from retime_subs import retime_subs, parse_anchor
+from concurrent.futures import ThreadPoolExecutor
 
 
 # We suppose that the uploaded subtitles are complete (non-critical)
@@ -26,6 +33,17 @@ def read_cmd():
          The list of failed YTID\' will be printed to \"failed_yt.dat\".')
    parser.add_argument('--rewrite', dest='always_rewrite', action="store_true", help='Always rewrite existing subtitles on upload. Use with extreme care')
    parser.add_argument('--no-rewrite', dest='never_rewrite', action="store_false", help='Never rewrite existing subtitles on upload.')
+   parser.add_argument('--retime', dest='retime', default=False, action="store_true", help='With "-a", adapt subtitle timing \
+         if the two videos differ in duration. Anchor points SOURCE=TARGET (in seconds) can follow the two YTIDs in the input file.')
+   parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=8, help='Number of concurrent requests \
+         when fetching video durations for "--retime"')
+   parser.add_argument(
+           '--no-cache', dest = 'use_cache',
+           default = True, action = 'store_false',
+           help='Do not use cached Amara video lookups.')
+   parser.add_argument('--resume', dest='resume', default=False, action="store_true", help='Skip videos finished in the previous run (see --journal).')
+   parser.add_argument('--journal', dest='journal_fname', default=None, help='Journal file with progress of the run, \
+         default is INPUT_FILE.amara_upload.LANG.journal')
    return parser.parse_args()
 
 opts = read_cmd()
@@ -61,7 +79,11 @@ with open(infile, "r") as f:
             ytids.append(line.split())
 
 AMARA_USERNAME = 'dhbot'
-amara = Amara(AMARA_USERNAME)
+amara = Amara(AMARA_USERNAME, use_cache = opts.use_cache)
+
+if opts.journal_fname is None:
+    opts.journal_fname = default_journal_fname(__file__, infile, lang)
+journal = Journal(opts.journal_fname, resume = opts.resume)
 
 try:
     os.remove('youtubedl.out')
@@ -69,6 +91,20 @@ try:
 except:
     pass
 
+# Durations of all videos are needed for retiming,
+# fetch them concurrently (and cache them) before we start
+if opts.amara and opts.retime:
+    def amara_id_of(ytid):
+        r = amara.check_video('https://www.youtube.com/watch?v=%s' % ytid)
+        if r['meta']['total_count'] == 0:
+            return None
+        return r['objects'][0]['id']
+    all_ytids = set(y for l in ytids for y in l[:2])
+    with ThreadPoolExecutor(max_workers = opts.jobs) as executor:
+        amara_ids = [i for i in executor.map(amara_id_of, all_ytids) if i is not None]
+    amara.get_video_durations(amara_ids, jobs = opts.jobs)
+    print("Fetched durations of %d videos" % len(amara_ids))
+
 if len(ytids) < 20: # Do not print for large inputs
    print("This is what I got from the input file:")
    print(ytids)
@@ -85,6 +121,11 @@ for i in range(len(ytids)):
     video_url_from = 'https://www.youtube.com/watch?v=%s' % ytid_from
     video_url_to = 'https://www.youtube.com/watch?v=%s' % ytid_to
 
+    # Videos are journaled by the target YTID
+    if journal.is_done(ytid_to):
+        continue
+    journal.record(ytid_to, journal.STARTED)
+
 #   PART 1: GETTING THE SUBTITLES 
     # set this to false if you want to download only
     # when language is missing on Amara
@@ -151,10 +192,24 @@ for i in range(len(ytids)):
         print(amara.AMARA_BASE_URL + lang + '/videos/' + amara_id)
 
     # When copying between 2 Amara videos, make sure that they have the same length
-    # If not, ask the user whether to proceed anyway (might screw up the subs timing)
+    # If not, adapt the subtitle timing with --retime
 
-    if opts.amara == True:
-        amara.compare_videos(amara_id_from, amara_id)
+    if opts.amara == True and opts.retime:
+        durations = amara.get_video_durations([amara_id_from, amara_id])
+        duration_from, duration_to = durations[amara_id_from], durations[amara_id]
+        try:
+            anchors = [parse_anchor(a) for a in ytids[i][2:]]
+            if duration_from != duration_to or anchors:
+                subs = retime_subs(subs, sub_format, duration_from, duration_to, anchors)
+                print("Subtitles retimed from %s s to %s s (%d anchors)" %
+                        (duration_from, duration_to, len(anchors)))
+        except ValueError as e:
+            # e.g. Amara does not know the duration of one of the videos
+            print("WARNING: Could not retime subtitles for YTID=%s, uploading them as they are: %s"
+                    % (ytid_to, e))
+    elif opts.amara == True:
+        if not amara.compare_videos(amara_id_from, amara_id):
+            print('Use "--retime" to adapt the subtitle timing to the second video.')
 
     # First check, whether subtitles for a given language are present,
     # then upload subtitles
@@ -162,6 +217,24 @@ for i in range(len(ytids)):
     if is_present and sub_version != 0:
         print("Language %s is already present in Amara video id:%s" % (opts.lang, amara_id))
         print("Subtitle revision number: %d" % sub_version)
+        # Compare with what we are about to upload,
+        # there is no point in creating an identical revision
+        if not subs and opts.yt:
+            subs = download_yt_subtitles(lang, sub_format, ytid_from)
+        if subs:
+            amara_subs = amara.download_subs(amara_id, lang, sub_format)
+            try:
+                diff = diff_subs(amara_subs, subs, sub_format)
+            except SubtitleParseError as e:
+                print("WARNING: Could not compare subtitles with Amara: %s" % e)
+                diff = None
+            if diff is not None and diff.is_identical():
+                print("Subtitles on Amara are identical, skipping upload")
+                journal.done(ytid_to, outcome = 'identical')
+                continue
+            if diff is not None:
+                print("Changes against Amara: %s" % diff.summary())
+                print(diff.format_changes(limit = 10))
         if never_rewrite:
            answer = False
         elif always_rewrite:
@@ -169,6 +242,7 @@ for i in range(len(ytids)):
         else:
            answer = answer_me("Should I upload the subtitles anyway?")
         if not answer:
+            journal.done(ytid_to, outcome = 'present')
             continue
     else:
         r = amara.add_language(amara_id, lang, is_original)
@@ -186,9 +260,21 @@ for i in range(len(ytids)):
             else:
                 sys.exit(1)
 
+    # Timing problems are easier to fix before upload (needs numpy)
+    if subs_qa.np is not None:
+        try:
+            problems = subs_qa.check_subs(subs, sub_format)
+        except SubtitleParseError as e:
+            problems = {}
+            print("WARNING: Could not check subtitles: %s" % e)
+        if problems:
+            print("WARNING: Subtitle timing problems: %s" %
+                    ', '.join("%d %s" % (n, c) for c, n in problems.items()))
+
     r = amara.upload_subs(amara_id, lang, is_complete, subs, sub_format)
     if r['version_number'] == sub_version + 1:
         print('Succesfully uploaded subtitles to: '+r['site_uri'])
+        journal.done(ytid_to, outcome = 'uploaded', version = r['version_number'])
     else:
         print("This is weird. Something probably went wrong during upload.")
         print("This is the response I got from Amara")
@@ -1,21 +1,245 @@
 #!/usr/bin/env python3
 import json, sys, os
+import asyncio, threading, time, random, weakref
+import sqlite3, re
+from collections import deque
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 import requests 
 from pprint import pprint
+try:
+    from api.metrics import METRICS
+except ImportError:
+    from metrics import METRICS
 
 def eprint(*args, **kwargs):
     print(*args, file=sys.stderr, **kwargs)
 
+
+class RateLimiter:
+    """Adaptive token bucket limiting the rate of requests to Amara.
+
+    Requests are not limited at all until the server responds
+    with HTTP 429. Then the allowed rate (requests per second) is set
+    to half of the rate we were sending at, it is halved again
+    on every further 429 and grows additively after every successful
+    request (AIMD). Once it reaches max_rate, the limit is lifted again.
+    In this way, the request rate converges to the maximum
+    that the server tolerates.
+    Retry-After pauses the whole bucket for the requested time.
+    The limiter is thread-safe so that it can be shared by AsyncAmara.
+    """
+
+    # Window (seconds) for measuring the rate of unlimited requests
+    RATE_WINDOW = 2.0
+
+    def __init__(self, rate = None, min_rate = 0.1, max_rate = 50.0,
+            increase = 0.5, burst = 10):
+        # None means no limit
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.capacity = burst
+        self.tokens = burst
+        self.last_refill = time.monotonic()
+        self.blocked_until = 0
+        # Times of recent requests
+        self.sent = deque()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        if self.rate is None:
+            self.tokens = self.capacity
+        else:
+            self.tokens = min(self.capacity,
+                    self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def _record(self, now):
+        self.sent.append(now)
+        while self.sent and self.sent[0] < now - self.RATE_WINDOW:
+            self.sent.popleft()
+
+    def acquire(self):
+        """Blocks until the request can be sent"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self.blocked_until - now
+                if wait <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        self._record(now)
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self):
+        with self.lock:
+            if self.rate is None:
+                return
+            self.rate += self.increase
+            if self.rate >= self.max_rate:
+                self.rate = None
+
+    def on_throttle(self, retry_after = None):
+        with self.lock:
+            if self.rate is None:
+                # Rate we were sending at when the server started throttling
+                now = time.monotonic()
+                self._record(now)
+                current = len(self.sent) / self.RATE_WINDOW
+            else:
+                current = self.rate
+            self.rate = max(self.min_rate, current / 2)
+            self.tokens = 0
+            if retry_after:
+                self.blocked_until = max(self.blocked_until,
+                        time.monotonic() + retry_after)
+
+
+def parse_retry_after(value):
+    """Returns number of seconds from the Retry-After header, or None
+
+    The header is either a number of seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0, retry_at.timestamp() - time.time())
+
+
+class VideoCache:
+    """Persistent SQLite cache of Amara video lookups (Amara.check_video)
+
+    Responses are keyed by (video_url, team) and expire after 'ttl' seconds.
+    Only successful lookups of existing videos are cached,
+    since missing videos might be added to Amara at any time.
+    """
+
+    def __init__(self, fname, ttl):
+        self.ttl = ttl
+        dirname = os.path.dirname(fname)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        # The cache may be shared by threads of AsyncAmara
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(fname, check_same_thread = False)
+        with self.lock, self.conn:
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS videos (
+                video_url TEXT NOT NULL,
+                team TEXT NOT NULL,
+                response TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (video_url, team))""")
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS durations (
+                amara_id TEXT PRIMARY KEY,
+                duration REAL NOT NULL,
+                fetched_at REAL NOT NULL)""")
+        self.purge_expired()
+
+    def get(self, video_url, team):
+        """Returns cached response or None if missing or expired"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT response, fetched_at FROM videos \
+                 WHERE video_url = ? AND team = ?",
+                (video_url, team or '')).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def put(self, video_url, team, response):
+        self.put_many([(video_url, team, response)])
+
+    def put_many(self, items):
+        """Stores list of (video_url, team, response) in one transaction"""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO videos VALUES (?, ?, ?, ?)",
+                [(video_url, team or '', json.dumps(response), now)
+                    for video_url, team, response in items])
+
+    def invalidate(self, video_url):
+        """Removes the video from cache for all teams"""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM videos WHERE video_url = ?",
+                    (video_url,))
+
+    def get_duration(self, amara_id):
+        """Returns cached video duration (seconds) or None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT duration, fetched_at FROM durations WHERE amara_id = ?",
+                (amara_id,)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return row[0]
+
+    def put_duration(self, amara_id, duration):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO durations VALUES (?, ?, ?)",
+                (amara_id, duration, time.time()))
+
+    def purge_expired(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM videos WHERE fetched_at < ?",
+                    (time.time() - self.ttl,))
+            self.conn.execute("DELETE FROM durations WHERE fetched_at < ?",
+                    (time.time() - self.ttl,))
+
+
+# Local data (video cache, subtitle store), can be moved elsewhere
+# e.g. for benchmarks against a local Amara stand-in server
+CACHE_DIR = os.environ.get('KSTOOLS_CACHE_DIR',
+        os.path.abspath(os.path.join(os.path.dirname(__file__), "../CACHE")))
+
 class Amara:
 
-    AMARA_BASE_URL = 'https://amara.org'
+    # Can be overridden to run against a local stand-in server,
+    # see benchmarks/amara_stub_server.py
+    AMARA_BASE_URL = os.environ.get('AMARA_BASE_URL', 'https://amara.org')
     EXIT_ON_HTTPERROR  = True
+
+    # Retrying of throttled (HTTP 429) and failed requests,
+    # with jittered exponential backoff
+    MAX_RETRIES = 6
+    BACKOFF_BASE = 1.0
+    BACKOFF_MAX = 60.0
+    # Non-idempotent requests are retried only if the server throttled them,
+    # otherwise we could e.g. upload the same subtitles twice
+    IDEMPOTENT_METHODS = ('GET', 'PUT', 'DELETE')
     
     # File 'apifile' should contain only one line with your Amara API key and Amara username.
     # Amara API can be found in Settins->Account-> API Access (bottom-right corner)
-    AMARA_API_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), "../SECRETS/amara_api_credentials.txt"))
-
-    def __init__(self, username):
+    AMARA_API_FILE = os.environ.get('AMARA_API_FILE',
+            os.path.abspath(os.path.join(os.path.dirname(__file__), "../SECRETS/amara_api_credentials.txt")))
+
+    # YouTube ID -> Amara ID mapping almost never changes,
+    # so we cache responses from check_video() on disk
+    VIDEO_CACHE_FILE = os.path.join(CACHE_DIR, "amara_videos.sqlite")
+    VIDEO_CACHE_TTL = 7 * 24 * 3600
+
+    # Maximum page size when listing video languages
+    LANGUAGES_PAGE_LIMIT = 100
+    # Page size when listing all videos of a team
+    VIDEOS_PAGE_LIMIT = 100
+    YOUTUBE_URL_REGEX = re.compile(
+        r'(?:youtube\.com/watch\?(?:.*&)?v=|youtu\.be/)([a-zA-Z0-9_-]{11})')
+
+    def __init__(self, username, rate_limiter = None, use_cache = True,
+            cache_ttl = None):
         self.username = username
         api_key = self._get_api_key(username)
         self.headers = {
@@ -25,7 +249,30 @@ class Amara:
         }
         # Persistent connection via requests.Session()
         # http://docs.python-requests.org/en/master/user/advanced/
-        self.session = requests.Session()
+        # Sessions are not thread-safe, so every thread gets its own
+        # (see AsyncAmara below)
+        self._local = threading.local()
+        if rate_limiter is None:
+            rate_limiter = RateLimiter()
+        self.rate_limiter = rate_limiter
+        self.video_cache = None
+        if use_cache:
+            if cache_ttl is None:
+                cache_ttl = self.VIDEO_CACHE_TTL
+            self.video_cache = VideoCache(self.VIDEO_CACHE_FILE, cache_ttl)
+        # In-memory language index per Amara ID, see get_language_index()
+        self._language_index = {}
+        # Language codes embedded in a fresh check_video response
+        self._video_languages = {}
+        # Video durations, see get_video_duration()
+        self._durations = {}
+        self._index_lock = threading.Lock()
+
+    @property
+    def session(self):
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
 
     def _get_api_key(self, username):
         """Reads API key from pre-defined file for a given username"""
@@ -43,9 +290,81 @@ class Amara:
         eprint("ERROR: Could not find API key for username %s" % username)
         sys.exit(1)
 
+    # Path segments following these are IDs, see _endpoint()
+    _ENDPOINT_ID_SEGMENTS = {
+        'videos': '{video_id}',
+        'languages': '{lang}',
+        'subtitle-requests': '{job_id}',
+    }
+
+    def _endpoint(self, method, url):
+        """Returns endpoint name for metrics, e.g.
+        'GET /api/videos/{video_id}/languages/'"""
+        segments = urlparse(url).path.split('/')
+        for i in range(1, len(segments)):
+            placeholder = self._ENDPOINT_ID_SEGMENTS.get(segments[i-1])
+            if placeholder and segments[i]:
+                segments[i] = placeholder
+        return "%s %s" % (method, '/'.join(segments))
+
+    def _backoff(self, attempt):
+        """Full jitter exponential backoff"""
+        return random.uniform(0,
+                min(self.BACKOFF_MAX, self.BACKOFF_BASE * 2**attempt))
+
+    def _request(self, method, url, **kwargs):
+        """Sends rate-limited request, retrying on HTTP 429 and server errors
+
+        Returns the last response, it is up to the caller
+        to check its status code.
+        """
+        method = method.upper()
+        for attempt in range(self.MAX_RETRIES + 1):
+            self.rate_limiter.acquire()
+            is_last_attempt = attempt == self.MAX_RETRIES
+            endpoint = self._endpoint(method, url)
+            bytes_sent = len(kwargs.get('data') or '')
+            start = time.monotonic()
+            try:
+                r = self.session.request(method, url,
+                        headers = self.headers, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                METRICS.record('amara', endpoint, None,
+                        time.monotonic() - start, bytes_sent)
+                if is_last_attempt or method not in self.IDEMPOTENT_METHODS:
+                    raise
+                eprint("WARNING: %s, retrying %s request" % (e, method))
+                time.sleep(self._backoff(attempt))
+                continue
+            METRICS.record('amara', endpoint, r.status_code,
+                    time.monotonic() - start, bytes_sent, len(r.content))
+
+            if r.status_code == 429:
+                retry_after = parse_retry_after(r.headers.get('Retry-After'))
+                self.rate_limiter.on_throttle(retry_after)
+                if is_last_attempt:
+                    return r
+                wait = self._backoff(attempt)
+                if retry_after is not None:
+                    wait = max(wait, retry_after)
+                eprint("WARNING: Got E 429 from Amara, waiting %.1f s" % wait)
+                time.sleep(wait)
+                continue
+
+            if r.status_code >= 500 and not is_last_attempt \
+                    and method in self.IDEMPOTENT_METHODS:
+                eprint("WARNING: Got E %d from Amara, retrying" % r.status_code)
+                time.sleep(self._backoff(attempt))
+                continue
+
+            # Errors do not tell us that the server copes with our rate
+            if r.status_code < 400:
+                self.rate_limiter.on_success()
+            return r
+
     def _get(self, url, body):
         try:
-            r = self.session.get(url, params = body, headers = self.headers)
+            r = self._request('get', url, params = body)
             r.raise_for_status()
             return r.json()
         except requests.HTTPError as e:
@@ -60,7 +379,7 @@ class Amara:
 
     def _post(self, url, body):
         try:
-            r = self.session.post(url, data = json.dumps(body), headers = self.headers)
+            r = self._request('post', url, data = json.dumps(body))
             r.raise_for_status()
             # TODO: Check what type of response we got (JSON or not?)
             return r.json()
@@ -75,7 +394,7 @@ class Amara:
 
     def _put(self, url, body):
         try:
-            r = self.session.put(url, data = json.dumps(body), headers = self.headers)
+            r = self._request('put', url, data = json.dumps(body))
             r.raise_for_status()
             return r.json()
         except requests.HTTPError as e:
@@ -88,7 +407,7 @@ class Amara:
 
     def _delete(self, url):
         try:
-            r = self.session.delete(url, headers = self.headers)
+            r = self._request('delete', url)
             r.raise_for_status()
             # NOTE: we're currently using this only to delete subtitle request,
             # in which case the server does not return body, just 204 status.
@@ -103,14 +422,93 @@ class Amara:
                 return r.status_code
  
 
-    def check_video(self, video_url, team = None):
+    def check_video(self, video_url, team = None, use_cache = True):
+        """Look up video on Amara, optionally within a given team
+
+        Responses are cached on disk, use_cache=False bypasses
+        the cache and refreshes it with the current response.
+        NOTE: Language list in the cached response might be outdated.
+        """
+        if self.video_cache is not None and use_cache:
+            response = self.video_cache.get(video_url, team)
+            if response is not None:
+                return response
+
         url = "%s/api/videos/" % self.AMARA_BASE_URL
         body = { 
             'video_url': video_url
             }
         if team is not None:
             body['team'] = team
-        return self._get(url, body)
+        response = self._get(url, body)
+
+        # Remember which languages the video has, so that check_language
+        # does not need to ask Amara about the missing ones
+        for obj in response.get('objects', []):
+            if 'languages' not in obj:
+                continue
+            with self._index_lock:
+                self._video_languages[obj['id']] = \
+                        set(lg['code'] for lg in obj['languages'])
+
+        if self.video_cache is not None and response \
+                and response['meta']['total_count'] > 0:
+            self.video_cache.put(video_url, team, response)
+        return response
+
+
+    def list_team_videos(self, team):
+        """Generator over all videos of a given Amara team
+
+        Pages through the team video list with large pages,
+        each video object contains the list of its languages.
+        """
+        url = "%s/api/videos/" % self.AMARA_BASE_URL
+        body = {
+            'team': team,
+            'limit': self.VIDEOS_PAGE_LIMIT,
+            }
+        while url is not None:
+            json_response = self._get(url, body)
+            for obj in json_response['objects']:
+                yield obj
+            url = json_response['meta']['next']
+            # The 'next' URL already contains all the query parameters
+            body = {}
+
+    def index_team_videos(self, team):
+        """Returns dictionary YTID -> Amara video object for the whole team
+
+        Use it instead of calling check_video() for thousands of YTIDs,
+        the whole team is fetched in roughly N/VIDEOS_PAGE_LIMIT requests.
+        Found videos are also stored in the video cache,
+        as if we called check_video(video_url, team).
+        """
+        index = {}
+        to_cache = []
+        for obj in self.list_team_videos(team):
+            ytids = set()
+            for url in obj.get('all_urls', []):
+                m = self.YOUTUBE_URL_REGEX.search(url)
+                if m:
+                    ytids.add(m.group(1))
+
+            with self._index_lock:
+                self._video_languages[obj['id']] = \
+                        set(lg['code'] for lg in obj['languages'])
+
+            for ytid in ytids:
+                index[ytid] = obj
+                video_url = 'https://www.youtube.com/watch?v=%s' % ytid
+                response = {
+                    'meta': {'total_count': 1, 'next': None},
+                    'objects': [obj]
+                    }
+                to_cache.append((video_url, team, response))
+
+        if self.video_cache is not None:
+            self.video_cache.put_many(to_cache)
+        return index
 
 
     def add_video(self, video_url, video_lang):
@@ -119,7 +517,8 @@ class Amara:
             'video_url': video_url,
             'primary_audio_language_code': video_lang
             }
-        
+        if self.video_cache is not None:
+            self.video_cache.invalidate(video_url)
         return self._post(url, body)
 
 
@@ -130,34 +529,69 @@ class Amara:
             'subtitles_complete': False,  # To be uploaded later
             'is_primary_audio_language': is_original
             }
+        self.invalidate_language_index(amara_id)
         return self._get(url, body)
 
 
-    def check_language(self, amara_id, lang, url=None):
-        is_lang_present = False
-        sub_version = 0
+    def get_language_index(self, amara_id, refresh = False):
+        """Returns dictionary language_code -> language state
+
+        All languages of the video are fetched at once (in as few pages
+        as possible) and kept in memory, so that subsequent calls
+        for the same video do not hit Amara, unless refresh=True.
+        The index is invalidated by our own changes to the video.
+        Language state is a dictionary with keys
+        'versions' (number of subtitle revisions), 'published',
+        'subtitles_complete' and 'is_primary_audio_language'.
+        """
+        with self._index_lock:
+            index = self._language_index.get(amara_id)
+        if index is not None and not refresh:
+            return index
+
+        index = {}
+        url = "%s/api/videos/%s/languages/" % (self.AMARA_BASE_URL, amara_id)
         body = {
-               "limit": 10
+               "limit": self.LANGUAGES_PAGE_LIMIT
                }
- 
-        if url is None:
-            url = "%s/api/videos/%s/languages/" % (self.AMARA_BASE_URL, amara_id)
- 
-        json_response = self._get(url, body)
- 
-        for obj in json_response['objects']:
-            if obj['language_code'] == lang:
-                is_lang_present = True
-                sub_version = len(obj['versions'])
-                break
- 
         # Paginated output if there are many languages
-        next = json_response['meta']['next']
-       
-        if is_lang_present == False and next != None:
-            return self.check_language(amara_id, lang, url = next)
-        else:
-            return (is_lang_present, sub_version)
+        while url is not None:
+            json_response = self._get(url, body)
+            for obj in json_response['objects']:
+                index[obj['language_code']] = {
+                    'versions': len(obj['versions']),
+                    'published': obj.get('published'),
+                    'subtitles_complete': obj.get('subtitles_complete'),
+                    'is_primary_audio_language': obj.get('is_primary_audio_language'),
+                    }
+            url = json_response['meta']['next']
+            # The 'next' URL already contains all the query parameters
+            body = {}
+
+        with self._index_lock:
+            self._language_index[amara_id] = index
+            self._video_languages[amara_id] = set(index.keys())
+        return index
+
+    def invalidate_language_index(self, amara_id):
+        with self._index_lock:
+            self._language_index.pop(amara_id, None)
+            self._video_languages.pop(amara_id, None)
+
+    def check_language(self, amara_id, lang):
+        """Returns tuple (is_lang_present, number_of_subtitle_revisions)"""
+        with self._index_lock:
+            video_languages = self._video_languages.get(amara_id)
+            is_indexed = amara_id in self._language_index
+        # We already know from check_video that the language is missing
+        if not is_indexed and video_languages is not None \
+                and lang not in video_languages:
+            return (False, 0)
+
+        index = self.get_language_index(amara_id)
+        if lang not in index:
+            return (False, 0)
+        return (True, index[lang]['versions'])
 
 
     def upload_subs(self, amara_id, lang, subtitles_complete, subs, sub_format):
@@ -170,6 +604,7 @@ class Amara:
         if subtitles_complete:
             body['action'] = 'endorse'
  
+        self.invalidate_language_index(amara_id)
         return self._post(url, body)
 
 
@@ -182,7 +617,7 @@ class Amara:
         # Cannot use _get() because subtitles are not in json format
         # Maybe we could somehow handle that in _get as well though
         try:
-            r = self.session.get(url, data=json.dumps(body), headers = self.headers )
+            r = self._request('get', url, data = json.dumps(body))
             r.raise_for_status()
         except requests.HTTPError as e:
             eprint(e, " in amara_api::download_subs")
@@ -202,16 +637,46 @@ class Amara:
         return r.text
 
 
-    # TODO: Not tested
+    def get_video(self, amara_id):
+        url = "%s/api/videos/%s/" % (self.AMARA_BASE_URL, amara_id)
+        return self._get(url, {})
+
+    def get_video_duration(self, amara_id):
+        """Returns video duration in seconds, or None if Amara does not know it
+
+        Durations do not change, so they are cached in memory
+        and in the video cache on disk.
+        """
+        with self._index_lock:
+            duration = self._durations.get(amara_id)
+        if duration is None and self.video_cache is not None:
+            duration = self.video_cache.get_duration(amara_id)
+        if duration is not None:
+            return duration
+
+        duration = self.get_video(amara_id).get('duration')
+        if duration is not None:
+            with self._index_lock:
+                self._durations[amara_id] = duration
+            if self.video_cache is not None:
+                self.video_cache.put_duration(amara_id, duration)
+        return duration
+
+    def get_video_durations(self, amara_ids, jobs = 8):
+        """Returns dictionary amara_id -> duration (or None),
+        durations that are not cached are fetched concurrently"""
+        amara_ids = list(dict.fromkeys(amara_ids))
+        if jobs <= 1 or len(amara_ids) <= 1:
+            return dict((i, self.get_video_duration(i)) for i in amara_ids)
+        with ThreadPoolExecutor(max_workers = min(jobs, len(amara_ids))) as executor:
+            durations = executor.map(self.get_video_duration, amara_ids)
+            return dict(zip(amara_ids, durations))
+
     def compare_videos(self, amara_id1, amara_id2):
-        url1 = "%s/api/videos/%s/" % (self.AMARA_BASE_URL, amara_id1)
-        url2 = "%s/api/videos/%s/" % (self.AMARA_BASE_URL, amara_id2)
-        body = { 
-            }
-        json_response = self._get(url1, body)
-        len1 = json_response['duration']
-        json_response = self._get(url2, body)
-        len2 = json_response['duration']
+        """Returns True if both videos have the same duration"""
+        durations = self.get_video_durations([amara_id1, amara_id2])
+        len1 = durations[amara_id1]
+        len2 = durations[amara_id2]
  
         if len1 == len2:
             return True
@@ -228,7 +693,7 @@ class Amara:
             }
         try:
             # TODO: Make put into _put
-            r = self.session.put(url, data = json.dumps(body), headers = self.headers)
+            r = self._request('put', url, data = json.dumps(body))
             r.raise_for_status()
             json_response = r.json()
         except requests.HTTPError as e:
@@ -252,6 +717,7 @@ class Amara:
         url = "%s/api/videos/%s/languages/%s/subtitles/actions/" \
                 % (self.AMARA_BASE_URL, amara_id, lang)
         body = {'actions': action}
+        self.invalidate_language_index(amara_id)
         response = self._get(url, body)
         return response
 
@@ -319,3 +785,65 @@ class Amara:
         url = "%s/api/languages/" % (self.AMARA_BASE_URL)
         body = {}
         return self._get(url, body)
+
+
+class AsyncAmara:
+    """Asyncio variant of the Amara class with the same method surface.
+
+    Each call is executed in a thread pool by the underlying synchronous
+    Amara client and at most 'max_in_flight' requests are in flight at once.
+
+    Example:
+        amara = AsyncAmara('dhbot', max_in_flight = 8)
+        responses = await asyncio.gather(
+                *[amara.check_video(url, team) for url in video_urls])
+    """
+
+    def __init__(self, username, max_in_flight = 8, **kwargs):
+        # All concurrent requests share the rate limiter of this client
+        self.amara = Amara(username, **kwargs)
+        self.username = username
+        self.max_in_flight = max_in_flight
+        self._executor = ThreadPoolExecutor(max_workers = max_in_flight)
+        # One semaphore per event loop, the same client can be used
+        # in several asyncio.run() calls
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def __getattr__(self, name):
+        # Constants such as AMARA_BASE_URL
+        if name == 'amara':
+            raise AttributeError(name)
+        return getattr(self.amara, name)
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_in_flight)
+        async with semaphore:
+            return await loop.run_in_executor(self._executor,
+                    lambda: func(*args, **kwargs))
+
+    def close(self):
+        self._executor.shutdown(wait = True)
+
+
+def _make_async_method(name):
+    sync_method = getattr(Amara, name)
+
+    async def method(self, *args, **kwargs):
+        return await self._run(getattr(self.amara, name), *args, **kwargs)
+
+    method.__name__ = name
+    method.__doc__ = sync_method.__doc__
+    return method
+
+for _name in ('check_video', 'add_video', 'add_language', 'check_language',
+        'get_language_index', 'upload_subs', 'download_subs', 'compare_videos',
+        'get_video', 'get_video_duration', 'get_video_durations',
+        'add_primary_audio_lang', 'index_team_videos', 'list_actions', 'perform_action',
+        'list_subtitle_requests', 'create_subtitle_request',
+        'delete_subtitle_request', 'assign_subtitler', 'assign_reviewer',
+        'unassign_reviewer', 'mark_subtitles_complete',
+        'list_all_amara_languages'):
+    setattr(AsyncAmara, _name, _make_async_method(_name))
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""Per-endpoint instrumentation of HTTP calls to Amara and YouTube APIs
+
+Every API call is recorded in the global METRICS registry (call counts,
+latency histogram, bytes transferred and response status classes).
+At the end of the run, the summary is written if requested
+via environment variables:
+
+    KSTOOLS_METRICS=summary.json     JSON summary ('-' for stderr)
+    KSTOOLS_METRICS_PROM=kstools.prom     Prometheus textfile
+"""
+import os, sys, json, time, threading, atexit
+
+# Upper bounds of latency histogram buckets (seconds)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float('inf'))
+
+def status_class(status):
+    """Maps HTTP status code to '2xx', '3xx', '4xx', '429', '5xx' or 'error'"""
+    if status is None:
+        return 'error'
+    if status == 429:
+        return '429'
+    return "%dxx" % (status // 100)
+
+
+class EndpointStats:
+
+    def __init__(self):
+        self.calls = 0
+        self.statuses = {}
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def record(self, status, latency, bytes_sent, bytes_received):
+        self.calls += 1
+        cls = status_class(status)
+        self.statuses[cls] = self.statuses.get(cls, 0) + 1
+        self.latency_sum += latency
+        self.latency_max = max(self.latency_max, latency)
+        for i, le in enumerate(LATENCY_BUCKETS):
+            if latency <= le:
+                self.buckets[i] += 1
+                break
+        self.bytes_sent += bytes_sent
+        self.bytes_received += bytes_received
+
+    def as_dict(self):
+        cumulative = 0
+        buckets = {}
+        for le, count in zip(LATENCY_BUCKETS, self.buckets):
+            cumulative += count
+            buckets['+Inf' if le == float('inf') else str(le)] = cumulative
+        return {
+            'calls': self.calls,
+            'statuses': dict(self.statuses),
+            'latency_seconds': {
+                'sum': round(self.latency_sum, 6),
+                'mean': round(self.latency_sum / self.calls, 6) if self.calls else 0,
+                'max': round(self.latency_max, 6),
+                'buckets': buckets,
+            },
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+        }
+
+
+class Metrics:
+    """Thread-safe registry of per-endpoint statistics"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        # (service, endpoint) -> EndpointStats
+        self.stats = {}
+
+    def record(self, service, endpoint, status, latency,
+            bytes_sent = 0, bytes_received = 0):
+        """Records one HTTP call
+
+        status - HTTP status code, None if we did not get any response
+        latency - in seconds
+        """
+        with self.lock:
+            key = (service, endpoint)
+            if key not in self.stats:
+                self.stats[key] = EndpointStats()
+            self.stats[key].record(status, latency, bytes_sent, bytes_received)
+
+    def summary(self):
+        with self.lock:
+            services = {}
+            for (service, endpoint), stats in sorted(self.stats.items()):
+                services.setdefault(service, {})[endpoint] = stats.as_dict()
+        return {
+            'script': os.path.basename(sys.argv[0]),
+            'started_at': self.started_at,
+            'wall_time_seconds': round(time.time() - self.started_at, 3),
+            'total_calls': sum(e['calls'] for s in services.values() for e in s.values()),
+            'services': services,
+        }
+
+    def write_json(self, fname):
+        summary = json.dumps(self.summary(), indent = 2)
+        if fname == '-':
+            print(summary, file = sys.stderr)
+            return
+        with open(fname, 'w') as f:
+            f.write(summary + '\n')
+
+    def write_prometheus(self, fname):
+        """Writes metrics in a format for node_exporter textfile collector"""
+        script = os.path.basename(sys.argv[0])
+        lines = [
+            '# HELP kstools_http_requests_total HTTP calls by endpoint and status class.',
+            '# TYPE kstools_http_requests_total counter',
+        ]
+        with self.lock:
+            items = sorted(self.stats.items())
+
+        def labels(service, endpoint, **extra):
+            l = 'script="%s",service="%s",endpoint="%s"' % (script, service, endpoint)
+            for k, v in extra.items():
+                l += ',%s="%s"' % (k, v)
+            return '{%s}' % l
+
+        for (service, endpoint), stats in items:
+            for cls, count in sorted(stats.statuses.items()):
+                lines.append('kstools_http_requests_total%s %d'
+                        % (labels(service, endpoint, status = cls), count))
+        lines += [
+            '# HELP kstools_http_request_duration_seconds Latency of HTTP calls.',
+            '# TYPE kstools_http_request_duration_seconds histogram',
+        ]
+        for (service, endpoint), stats in items:
+            d = stats.as_dict()['latency_seconds']
+            for le, count in d['buckets'].items():
+                lines.append('kstools_http_request_duration_seconds_bucket%s %d'
+                        % (labels(service, endpoint, le = le), count))
+            lines.append('kstools_http_request_duration_seconds_sum%s %f'
+                    % (labels(service, endpoint), stats.latency_sum))
+            lines.append('kstools_http_request_duration_seconds_count%s %d'
+                    % (labels(service, endpoint), stats.calls))
+        lines += [
+            '# HELP kstools_http_bytes_total Bytes transferred by HTTP calls.',
+            '# TYPE kstools_http_bytes_total counter',
+        ]
+        for (service, endpoint), stats in items:
+            lines.append('kstools_http_bytes_total%s %d'
+                    % (labels(service, endpoint, direction = 'sent'), stats.bytes_sent))
+            lines.append('kstools_http_bytes_total%s %d'
+                    % (labels(service, endpoint, direction = 'received'), stats.bytes_received))
+
+        # The textfile collector must never see a half-written file
+        tmp_fname = "%s.%d.tmp" % (fname, os.getpid())
+        with open(tmp_fname, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_fname, fname)
+
+
+METRICS = Metrics()
+
+def _emit_at_exit():
+    if not METRICS.stats:
+        return
+    json_fname = os.environ.get('KSTOOLS_METRICS')
+    prom_fname = os.environ.get('KSTOOLS_METRICS_PROM')
+    if json_fname:
+        METRICS.write_json(json_fname)
+    if prom_fname:
+        METRICS.write_prometheus(prom_fname)
+
+atexit.register(_emit_at_exit)
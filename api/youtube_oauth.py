@@ -3,18 +3,72 @@
 # Usage example:
 # python captions.py --videoid='<video_id>' --name='<name>' --file='<file>' --language='<language>' --action='action'
 
-import httplib2, os, sys, re, datetime
+import argparse, os, sys, re, datetime, time, pickle, threading
+from concurrent.futures import ThreadPoolExecutor
 from pprint import pprint
 
-from googleapiclient.discovery import build_from_document
-from googleapiclient.errors import HttpError
-from oauth2client.client import flow_from_clientsecrets
-from oauth2client.file import Storage
-from oauth2client.tools import argparser, run_flow
+# NOTE: googleapiclient and oauth2client are imported only when needed,
+# they take most of the startup time of this script.
 
 import logging
 logging.basicConfig()
 
+try:
+    from api.metrics import METRICS
+    from api.youtube_quota import QUOTA, CACHE_DIR
+except ImportError:
+    from metrics import METRICS
+    from youtube_quota import QUOTA, CACHE_DIR
+
+# Created on first use by _instrumented_request_class()
+InstrumentedHttpRequest = None
+
+def _instrumented_request_class():
+  """Returns HttpRequest subclass which records every API call in METRICS
+  and charges its cost to the daily QUOTA
+
+  Endpoint is the API method, e.g. 'youtube.captions.list'"""
+  global InstrumentedHttpRequest
+  if InstrumentedHttpRequest is not None:
+    return InstrumentedHttpRequest
+
+  from googleapiclient.errors import HttpError
+  from googleapiclient.http import HttpRequest
+
+  class _InstrumentedHttpRequest(HttpRequest):
+
+    def execute(self, http=None, num_retries=0):
+      responses = []
+      received = []
+      self.add_response_callback(responses.append)
+      postproc = self.postproc
+      def counting_postproc(resp, content):
+        received.append(len(content or b''))
+        return postproc(resp, content)
+      self.postproc = counting_postproc
+
+      bytes_sent = len(self.body or '')
+      if self.resumable is not None:
+        bytes_sent += self.resumable.size() or 0
+      start = time.monotonic()
+      try:
+        return super().execute(http=http, num_retries=num_retries)
+      except HttpError as e:
+        received.append(len(e.content or b''))
+        if e.resp.status == 403 and b'quotaExceeded' in (e.content or b''):
+          QUOTA.mark_exhausted()
+        raise
+      finally:
+        status = responses[-1].status if responses else None
+        METRICS.record('youtube', self.methodId, status,
+            time.monotonic() - start, bytes_sent, sum(received))
+        # Even failed requests cost quota
+        if status is not None:
+          QUOTA.charge(self.methodId)
+
+  InstrumentedHttpRequest = _InstrumentedHttpRequest
+  return InstrumentedHttpRequest
+
 def get_isosplit(s, split):
     if split in s:
         n, s = s.split(split)
@@ -73,8 +127,114 @@ https://developers.google.com/api-client-library/python/guide/aaa_client_secrets
 """ % os.path.abspath(os.path.join(os.path.dirname(__file__),
                                    CLIENT_SECRETS_FILE))
 
+# https://stackoverflow.com/questions/29762529/where-can-i-find-the-youtube-v3-api-captions-json-discovery-document
+DISCOVERY_DOC_FILE = "%s/youtube-v3-api.json" % os.path.dirname(os.path.abspath(__file__))
+DISCOVERY_CACHE_FILE = os.path.join(CACHE_DIR, "youtube-v3-api.pickle")
+
+# API resources that we actually use, the rest is dropped
+# from the cached discovery document
+USED_RESOURCES = ('captions', 'videos', 'channels', 'playlists', 'playlistItems')
+
+def _schema_refs(obj, refs):
+  """Collects names of all schemas referenced via '$ref' in obj"""
+  if isinstance(obj, dict):
+    for k, v in obj.items():
+      if k == '$ref':
+        refs.add(v)
+      else:
+        _schema_refs(v, refs)
+  elif isinstance(obj, list):
+    for v in obj:
+      _schema_refs(v, refs)
+  return refs
+
+def _prune_discovery_doc(doc):
+  """Keeps only USED_RESOURCES and schemas they (transitively) refer to"""
+  doc = dict(doc)
+  doc['resources'] = {name: res for name, res in doc['resources'].items()
+      if name in USED_RESOURCES}
+  schemas = doc['schemas']
+  todo = _schema_refs(doc['resources'], set())
+  used = set()
+  while todo:
+    name = todo.pop()
+    if name in used or name not in schemas:
+      continue
+    used.add(name)
+    todo |= _schema_refs(schemas[name], set())
+  doc['schemas'] = {name: schemas[name] for name in used}
+  return doc
+
+def load_discovery_doc():
+  """Returns parsed and pruned discovery document of YouTube API
+
+  The result is cached as a pickle, which is invalidated
+  when the JSON discovery document changes."""
+  st = os.stat(DISCOVERY_DOC_FILE)
+  key = (st.st_size, st.st_mtime_ns, USED_RESOURCES)
+  try:
+    with open(DISCOVERY_CACHE_FILE, 'rb') as f:
+      cached = pickle.load(f)
+    if cached['key'] == key:
+      return cached['doc']
+  except Exception:
+    # Missing or broken cache, we'll create a new one
+    pass
+
+  import json
+  with open(DISCOVERY_DOC_FILE, "r", encoding = "utf-8") as f:
+    doc = _prune_discovery_doc(json.load(f))
+  try:
+    os.makedirs(os.path.dirname(DISCOVERY_CACHE_FILE), exist_ok = True)
+    tmp_fname = "%s.%d.tmp" % (DISCOVERY_CACHE_FILE, os.getpid())
+    with open(tmp_fname, 'wb') as f:
+      pickle.dump({'key': key, 'doc': doc}, f, protocol = pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_fname, DISCOVERY_CACHE_FILE)
+  except OSError as e:
+    print("WARNING: Could not cache discovery document: %s" % e)
+  return doc
+
+def oauth_argparser():
+  """Returns parser with the same flags as oauth2client.tools.argparser
+  (needed by run_flow), so that we do not need to import oauth2client
+  just to parse command line options."""
+  parser = argparse.ArgumentParser(add_help=False)
+  parser.add_argument('--auth_host_name', default='localhost',
+    help='Hostname when running a local web server.')
+  parser.add_argument('--noauth_local_webserver', action='store_true',
+    default=False, help='Do not run a local web server.')
+  parser.add_argument('--auth_host_port', default=[8080, 8090], type=int,
+    nargs='*', help='Port web server should listen on.')
+  parser.add_argument('--logging_level', default='ERROR',
+    choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+    help='Set the logging level of detailed output.')
+  return parser
+
+# Credentials of the authenticated service, used to create
+# a separate authorized http object for every thread
+_credentials = None
+_thread_local = threading.local()
+
+def _thread_http():
+  """Returns authorized http object for the current thread
+
+  httplib2.Http is not thread-safe, so concurrent requests
+  must be executed with execute(http=_thread_http())"""
+  http = getattr(_thread_local, 'http', None)
+  if http is None:
+    import httplib2
+    http = _credentials.authorize(httplib2.Http())
+    _thread_local.http = http
+  return http
+
 # Authorize the request and store authorization credentials.
 def get_authenticated_service(args):
+  import httplib2
+  from googleapiclient.discovery import build_from_document
+  from oauth2client.client import flow_from_clientsecrets
+  from oauth2client.file import Storage
+  from oauth2client.tools import run_flow
+
   flow = flow_from_clientsecrets(CLIENT_SECRETS_FILE, scope=YOUTUBE_READ_WRITE_SSL_SCOPE,
     message=MISSING_CLIENT_SECRETS_MESSAGE)
 
@@ -86,10 +246,11 @@ def get_authenticated_service(args):
   if credentials is None or credentials.invalid:
     credentials = run_flow(flow, storage, args)
 
-  # https://stackoverflow.com/questions/29762529/where-can-i-find-the-youtube-v3-api-captions-json-discovery-document
-  with open("%s/youtube-v3-api.json" % os.path.dirname(__file__), "r", encoding = "utf-8") as f:
-    doc = f.read()
-    return build_from_document(doc, http=credentials.authorize(httplib2.Http()))
+  global _credentials
+  _credentials = credentials
+  return build_from_document(load_discovery_doc(),
+      http=credentials.authorize(httplib2.Http()),
+      requestBuilder=_instrumented_request_class())
 
 
 # Call the API's captions.list method to list the existing caption tracks.
@@ -109,8 +270,75 @@ def list_captions(youtube, video_id, verbose=True):
   return results["items"]
 
 
+# Maximum number of requests in one batch
+# https://developers.google.com/youtube/v3/guides/implementation/batch
+CAPTIONS_BATCH_SIZE = 50
+
+# List caption tracks for many videos, using batched HTTP requests
+def list_captions_bulk(youtube, video_ids, verbose=False):
+  """Returns dictionary YTID -> list of caption tracks (as in list_captions)
+
+  Up to CAPTIONS_BATCH_SIZE captions.list calls are sent in one HTTP request.
+  Videos for which the call failed are missing in the result,
+  call list_captions() for them to get the actual error.
+  """
+  from googleapiclient.errors import HttpError
+  video_ids = list(dict.fromkeys(video_ids))
+  all_captions = {}
+
+  def callback(request_id, response, exception):
+    if exception is not None:
+      if isinstance(exception, HttpError) and exception.resp.status == 403 \
+              and b'quotaExceeded' in (exception.content or b''):
+        QUOTA.mark_exhausted()
+      print("Could not list captions for YTID %s: %s" % (request_id, exception))
+      return
+    all_captions[request_id] = response["items"]
+    for item in response["items"]:
+      if verbose:
+        print("Caption track '%s(%s)' in '%s' language, YTID %s." % (
+            item["snippet"]["name"], item["id"], item["snippet"]["language"], request_id))
+
+  for i in range(0, len(video_ids), CAPTIONS_BATCH_SIZE):
+    chunk = video_ids[i:i + CAPTIONS_BATCH_SIZE]
+    batch = youtube.new_batch_http_request(callback=callback)
+    for video_id in chunk:
+      batch.add(youtube.captions().list(part="snippet", videoId=video_id),
+          request_id=video_id)
+
+    # Inner requests of the batch do not go through
+    # InstrumentedHttpRequest, so we need to account for them here
+    status = None
+    start = time.monotonic()
+    try:
+      batch.execute()
+      status = 200
+    except HttpError as e:
+      status = e.resp.status
+      raise
+    finally:
+      METRICS.record('youtube', 'youtube.captions.list[batch]', status,
+          time.monotonic() - start)
+      if status is not None:
+        for video_id in chunk:
+          QUOTA.charge('youtube.captions.list')
+
+  return all_captions
+
+
+def _caption_media(file):
+  """Caption track to upload, file is either a filename
+  or the subtitles themselves as bytes (uploaded from memory)"""
+  if isinstance(file, bytes):
+    from googleapiclient.http import MediaInMemoryUpload
+    return MediaInMemoryUpload(file, mimetype='text/xml')
+  return file
+
+
 # Call the API's captions.insert method to upload a caption track in draft status.
 def upload_caption(youtube, video_id, language, name, is_draft, file):
+  """file - filename or subtitles as bytes"""
+  from googleapiclient.errors import HttpError
   try:
     insert_result = youtube.captions().insert(
     part="snippet",
@@ -123,7 +351,7 @@ def upload_caption(youtube, video_id, language, name, is_draft, file):
       ),
     ),
     media_mime_type = 'text/xml',
-    media_body = file,
+    media_body = _caption_media(file),
     ).execute()
   except HttpError as e:
       print("Got the following error during sub upload, YTID = ", video_id)
@@ -136,12 +364,15 @@ def upload_caption(youtube, video_id, language, name, is_draft, file):
   status = insert_result["snippet"]["status"]
   print("Uploaded caption track '%s(%s) in '%s' language, '%s' status." % (name,
       id, language, status) )
-  return True
+  # Caption ID of the new track
+  return id
 
 
 # Call the API's captions.update method to update an existing caption track's draft status
 # and publish it. If a new binary file is present, update the track with the file as well.
 def update_caption(youtube, video_id, language, caption_id, is_draft, file):
+  """file - filename or subtitles as bytes, or None to update only draft status"""
+  from googleapiclient.errors import HttpError
   try:
     update_result = youtube.captions().update(
     part="snippet",
@@ -152,7 +383,7 @@ def update_caption(youtube, video_id, language, caption_id, is_draft, file):
       )
     ),
     media_mime_type = 'text/xml',
-    media_body=file
+    media_body=_caption_media(file)
     ).execute()
 
   except HttpError as e:
@@ -169,13 +400,17 @@ def update_caption(youtube, video_id, language, caption_id, is_draft, file):
   return True
 
 
-# Call the API's captions.download method to download an existing caption track.
-def download_caption(youtube, caption_id, tfmt):
-  subtitle = youtube.captions().download(
+# Call the API's captions.download method, returns caption track as bytes
+def fetch_caption(youtube, caption_id, tfmt):
+  return youtube.captions().download(
     id=caption_id,
     tfmt=tfmt
   ).execute()
 
+# Call the API's captions.download method to download an existing caption track.
+def download_caption(youtube, caption_id, tfmt):
+  subtitle = fetch_caption(youtube, caption_id, tfmt)
+
   #print("First line of caption track: %s" % (subtitle))
   with open(caption_id, "wb") as f:
       f.write(subtitle)
@@ -225,12 +460,24 @@ def update_video_language(youtube, youtube_id, lang):
             )
     return snippet
 
-# Get specific information for a list of videos
-def list_videos(youtube, youtube_ids):
-    """https://developers.google.com/youtube/v3/docs/videos/list
+# Columns printed by list_videos()
+VIDEO_TSV_FIELDS = ('title', 'video_id', 'published_at', 'duration', 'lang',
+    'has_captions', 'privacy_status', 'license', 'made_for_kids')
 
-    Adapted from Khan codebase in:
-    webapp/gcloud/youtube/youtube_api.py
+# Download only what we print
+VIDEO_LIST_PROJECTION = ('items(id,'
+    'snippet(title,publishedAt,defaultAudioLanguage,defaultLanguage),'
+    'contentDetails(duration,caption),'
+    'status(privacyStatus,license,madeForKids))')
+
+def iter_videos(youtube, youtube_ids, jobs=8,
+        part='id,snippet,contentDetails,status', fields=VIDEO_LIST_PROJECTION):
+    """Yields video resources for given YTIDs, in the input order
+
+    The YTIDs are fetched in chunks of 50 (the API maximum),
+    up to `jobs` chunks are fetched concurrently. Only a few chunks
+    are kept in memory at any time.
+    Videos that do not exist (or are private) are skipped.
     """
     # Youtube service returns results for ids with trailing
     # whitespaces.  We need to strip it here to make sure that we
@@ -239,39 +486,81 @@ def list_videos(youtube, youtube_ids):
 
     # The YouTube API will only let us fetch 50 IDs at a time.
     max_results = 50
-    data = []
-    for i in range(0, len(all_youtube_ids), max_results):
-        response = youtube.videos().list(
-            part='id,snippet,contentDetails,status',
-            id=",".join(all_youtube_ids[i:i + max_results]),
-            maxResults=max_results).execute()
-        data.extend(response["items"])
-
-    fields = ('title', 'video_id', 'published_at', 'duration', 'lang',
-    'has_captions', 'privacy_status', 'license', 'made_for_kids')
-    header = "\t".join(fields)
-    fmtstring = "\t".join(["%s" for i in fields])
-    print(header)
-    for video in data:
-        snippet = video['snippet']
-        details = video['contentDetails']
-        status = video['status']
-        to_print = {
-                'video_id': video['id'],
-                'title': snippet['title'],
-                'has_captions': details['caption'],
-                'published_at': snippet['publishedAt'],
-                'duration': parse_isoduration(details['duration']),
-                'privacy_status': status['privacyStatus'],
-                'license': status['license'],
-                'made_for_kids': status['madeForKids'],
-        }
-        # For some reason, some video are missing this param
-        to_print['lang'] = snippet.get('defaultAudioLanguage') or snippet.get('defaultLanguage', '')
+    chunks = [all_youtube_ids[i:i + max_results]
+        for i in range(0, len(all_youtube_ids), max_results)]
+
+    def fetch(chunk):
+        request = youtube.videos().list(
+            part=part,
+            id=",".join(chunk),
+            fields=fields,
+            maxResults=max_results)
+        if _credentials is None:
+            return request.execute()["items"]
+        return request.execute(http=_thread_http())["items"]
+
+    # Without per-thread http objects, we cannot run concurrently
+    if jobs <= 1 or _credentials is None:
+        for chunk in chunks:
+            for video in fetch(chunk):
+                yield video
+        return
+
+    window = 2 * jobs
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending = []
+        next_chunk = 0
+        try:
+            for i in range(len(chunks)):
+                while next_chunk < len(chunks) and next_chunk < i + window:
+                    pending.append(executor.submit(fetch, chunks[next_chunk]))
+                    next_chunk += 1
+                for video in pending.pop(0).result():
+                    yield video
+        finally:
+            for future in pending:
+                future.cancel()
+
+def video_tsv_row(video):
+    """Returns dictionary with VIDEO_TSV_FIELDS for a video resource"""
+    snippet = video['snippet']
+    details = video['contentDetails']
+    status = video['status']
+    row = {
+            'video_id': video['id'],
+            'title': snippet['title'],
+            'has_captions': details['caption'],
+            'published_at': snippet['publishedAt'],
+            'duration': parse_isoduration(details['duration']),
+            'privacy_status': status['privacyStatus'],
+            'license': status['license'],
+            'made_for_kids': status['madeForKids'],
+    }
+    # For some reason, some video are missing this param
+    row['lang'] = snippet.get('defaultAudioLanguage') or snippet.get('defaultLanguage', '')
+    return row
 
-        print(fmtstring % tuple([to_print[key] for key in fields]))
+# Get specific information for a list of videos
+def list_videos(youtube, youtube_ids, jobs=8):
+    """https://developers.google.com/youtube/v3/docs/videos/list
 
-    return data
+    Prints TSV table with VIDEO_TSV_FIELDS as soon as the data arrive,
+    returns number of printed videos.
+
+    Adapted from Khan codebase in:
+    webapp/gcloud/youtube/youtube_api.py
+    """
+    header = "\t".join(VIDEO_TSV_FIELDS)
+    fmtstring = "\t".join(["%s" for i in VIDEO_TSV_FIELDS])
+    print(header)
+    count = 0
+    for video in iter_videos(youtube, youtube_ids, jobs=jobs):
+        row = video_tsv_row(video)
+        print(fmtstring % tuple([row[key] for key in VIDEO_TSV_FIELDS]))
+        sys.stdout.flush()
+        count += 1
+
+    return count
 
 
 # Get API information about a YT channel
@@ -312,28 +601,65 @@ def list_channel_playlists(youtube, channel_id):
     return all_playlists
 
 
+def iter_pages(make_request, prefetch=True):
+    """Yields all pages of a paginated API response
+
+    make_request(page_token) should return API request for a given page
+    (page_token is None for the first page).
+    With prefetch=True, the next page is requested in the background
+    as soon as we know its token, so that the request overlaps
+    with processing of the current page by the caller.
+    """
+    # Prefetching needs a separate http object for the background thread
+    executor = None
+    if prefetch and _credentials is not None:
+        executor = ThreadPoolExecutor(max_workers=1)
+
+    def fetch(page_token):
+        request = make_request(page_token)
+        if executor is None:
+            return request.execute()
+        return request.execute(http=_thread_http())
+
+    try:
+        response = fetch(None)
+        while True:
+            page_token = response.get('nextPageToken')
+            future = None
+            if page_token is not None and executor is not None:
+                future = executor.submit(fetch, page_token)
+            yield response
+            if page_token is None:
+                break
+            response = future.result() if future is not None else fetch(page_token)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+def iter_custom_playlists(youtube, channel_id):
+    """Yields playlist resources for a given channel
+    https://developers.google.com/youtube/v3/docs/playlists/list"""
+    pages = iter_pages(lambda page_token: youtube.playlists().list(
+        part='id,snippet',
+        maxResults=50,
+        pageToken=page_token,
+        channelId=channel_id))
+    for response in pages:
+        for pl in response['items']:
+            yield pl
+
+
 # List custom playlists
-def list_custom_playlists(youtube, channel_id, nextPageToken=None):
-    """https://developers.google.com/youtube/v3/docs/channels/list"""
+def list_custom_playlists(youtube, channel_id):
+    """https://developers.google.com/youtube/v3/docs/playlists/list"""
     all_playlists = {}
-    response = youtube.playlists().list(
-	part='id,snippet',
-        maxResults=50,
-        pageToken=nextPageToken,
-	channelId=channel_id).execute()
-    playlists = response['items']
-    for pl in playlists:
+    for pl in iter_custom_playlists(youtube, channel_id):
         title = pl['snippet']['title']
         playlist_id = pl['id']
         all_playlists[title] = playlist_id
         print("%s\t%s" % (playlist_id, title))
 
-    if 'nextPageToken' in response.keys():
-        all_playlists.update(list_custom_playlists(
-                youtube, channel_id, response['nextPageToken']
-                )
-        )
-
     return all_playlists
 
 
@@ -344,36 +670,39 @@ def list_custom_playlists(youtube, channel_id, nextPageToken=None):
 def list_all_videos_in_channel(youtube, channel_id):
     playlists = list_channel_playlists(youtube, channel_id)
     playlist_id = playlists['uploads']
-    list_all_videos_in_playlist(youtube, playlist_id)
+    return list_all_videos_in_playlist(youtube, playlist_id)
 
 
-def list_all_videos_in_playlist(youtube, playlist_id, nextPageToken=None):
+def iter_playlist_items(youtube, playlist_id):
+    """Yields playlist item resources, as the pages arrive
+    https://developers.google.com/youtube/v3/docs/playlistItems/list"""
+    pages = iter_pages(lambda page_token: youtube.playlistItems().list(
+        part='id,snippet',
+        maxResults=50,
+        pageToken=page_token,
+        playlistId=playlist_id))
+    for response in pages:
+        for video in response['items']:
+            yield video
+
+
+def list_all_videos_in_playlist(youtube, playlist_id):
     """https://developers.google.com/youtube/v3/docs/playlistItems/list"""
 
-    if nextPageToken is None:
-        print("Printing videos in playlist %s" % playlist_id)
+    print("Printing videos in playlist %s" % playlist_id)
 
     youtube_ids = set()
-    response = youtube.playlistItems().list(
-	part='id,snippet',
-        maxResults=50,
-        pageToken=nextPageToken,
-	playlistId=playlist_id).execute()
-    for video in response['items']:
+    for video in iter_playlist_items(youtube, playlist_id):
         snippet = video['snippet']
         title = snippet['title']
         video_id = snippet['resourceId']['videoId']
         youtube_ids.add(video_id)
         print("%s\t%s" % (video_id, title))
-    if 'nextPageToken' in response.keys():
-        youtube_ids.union(list_all_videos_in_playlist(
-                youtube, playlist_id, response['nextPageToken']
-                )
-        )
     return youtube_ids
 
 
 if __name__ == "__main__":
+  argparser = oauth_argparser()
   # The "videoid" option specifies the YouTube video ID that uniquely
   # identifies the video for which the caption track will be uploaded.
   argparser.add_argument("--videoid",
@@ -395,6 +724,8 @@ if __name__ == "__main__":
   argparser.add_argument("--channelid", help="YouTube Channel ID")
   argparser.add_argument("--playlistid", help="YouTube playlist ID")
   argparser.add_argument("--videolang", help="Language of video")
+  argparser.add_argument("--jobs", type=int, default=8,
+    help="Number of concurrent requests for list_many_videos")
 
 
   args = argparser.parse_args()
@@ -407,7 +738,9 @@ if __name__ == "__main__":
           # actions related to channels
           'list_channel', 'list_channel_videos', 'list_channel_playlists',
           # actions related to playlists
-          'list_playlist', 'list_playlist_videos')
+          'list_playlist', 'list_playlist_videos',
+          # remaining daily API quota
+          'show_quota')
 
   if args.action not in SUPPORTED_ACTIONS:
       print("Available actions:", SUPPORTED_ACTIONS)
@@ -451,15 +784,20 @@ if __name__ == "__main__":
           exit("We do not support upload to other languages besides Czech!")
 
 
+  if args.action == 'show_quota':
+    print(QUOTA.summary())
+    sys.exit(0)
+
   youtube = get_authenticated_service(args)
+  from googleapiclient.errors import HttpError
 
-  youtube_ids = set()
+  youtube_ids = []
   if args.videoids_file:
     with open(args.videoids_file, 'r') as f:
-        youtube_ids = set(f.read().split('\n'))
-        youtube_ids.remove('')
+        # Keep the input order, but skip duplicates
+        youtube_ids = list(dict.fromkeys(l.strip() for l in f if l.strip()))
   elif args.videoid:
-      youtube_ids = set([args.videoid])
+      youtube_ids = [args.videoid]
 
   YTID_REGEX = r'^[a-zA-Z0-9_-]{11}$'
   for youtube_id in youtube_ids:
@@ -485,7 +823,7 @@ if __name__ == "__main__":
         list_video(youtube, args.videoid)
     # Bulk listing specific data for videos
     elif args.action == 'list_many_videos':
-        list_videos(youtube, youtube_ids)
+        list_videos(youtube, youtube_ids, jobs=args.jobs)
     elif args.action == 'update_video_language':
         update_video_language(youtube, args.videoid, args.videolang)
     # Caption actions
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Accounting of YouTube Data API quota
+
+Every API call costs some units of the daily quota (10000 units
+by default), see https://developers.google.com/youtube/v3/determine_quota_cost
+Quota usage is persisted on disk, so that it is tracked across runs.
+The quota is reset at midnight Pacific Time.
+
+The global QUOTA tracker is charged automatically for every executed
+request (see youtube_oauth.InstrumentedHttpRequest). Batch scripts
+should check QUOTA.can_afford() before doing expensive calls.
+"""
+import os, json, threading
+from datetime import datetime, timedelta, timezone
+
+try:
+    from zoneinfo import ZoneInfo
+    PACIFIC_TZ = ZoneInfo('America/Los_Angeles')
+except Exception:
+    # Python < 3.9 or missing tz database, ignore daylight saving time
+    PACIFIC_TZ = timezone(timedelta(hours = -8))
+
+# Unit cost of API methods, as reported by HttpRequest.methodId
+QUOTA_COSTS = {
+    'youtube.captions.list': 50,
+    'youtube.captions.insert': 400,
+    'youtube.captions.update': 450,
+    'youtube.captions.download': 200,
+    'youtube.captions.delete': 50,
+    'youtube.videos.list': 1,
+    'youtube.videos.update': 50,
+    'youtube.channels.list': 1,
+    'youtube.playlists.list': 1,
+    'youtube.playlistItems.list': 1,
+}
+# Cost of methods not listed above
+DEFAULT_COST = 1
+
+DAILY_QUOTA = int(os.environ.get('KSTOOLS_YT_QUOTA', 10000))
+
+CACHE_DIR = os.environ.get('KSTOOLS_CACHE_DIR',
+        os.path.abspath(os.path.join(os.path.dirname(__file__), "../CACHE")))
+QUOTA_FILE = os.path.join(CACHE_DIR, "youtube_quota.json")
+
+
+def quota_day(now = None):
+    """Returns the current quota day (date in Pacific Time) as string"""
+    if now is None:
+        now = datetime.now(timezone.utc)
+    return now.astimezone(PACIFIC_TZ).strftime('%Y-%m-%d')
+
+
+def method_cost(method_id):
+    return QUOTA_COSTS.get(method_id, DEFAULT_COST)
+
+
+class QuotaTracker:
+    """Tracks quota units used today, persisted in a JSON file
+
+    The file is re-read before every change, so that the quota
+    used by other scripts running on the same day is accounted for.
+    """
+
+    def __init__(self, fname = QUOTA_FILE, daily_limit = DAILY_QUOTA):
+        self.fname = fname
+        self.daily_limit = daily_limit
+        self.lock = threading.Lock()
+
+    def _load(self):
+        day = quota_day()
+        try:
+            with open(self.fname, 'r') as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            state = {}
+        if state.get('day') != day:
+            state = {'day': day, 'used': 0, 'exhausted': False, 'calls': {}}
+        return state
+
+    def _save(self, state):
+        os.makedirs(os.path.dirname(self.fname), exist_ok = True)
+        tmp_fname = "%s.%d.tmp" % (self.fname, os.getpid())
+        with open(tmp_fname, 'w') as f:
+            json.dump(state, f, indent = 2)
+        os.replace(tmp_fname, self.fname)
+
+    def charge(self, method_id, units = None):
+        """Records that we called a given API method"""
+        if units is None:
+            units = method_cost(method_id)
+        with self.lock:
+            state = self._load()
+            state['used'] += units
+            state['calls'][method_id] = state['calls'].get(method_id, 0) + 1
+            self._save(state)
+
+    def mark_exhausted(self):
+        """YouTube told us we are out of quota, do not try again today"""
+        with self.lock:
+            state = self._load()
+            state['exhausted'] = True
+            self._save(state)
+
+    def used(self):
+        with self.lock:
+            return self._load()['used']
+
+    def remaining(self):
+        with self.lock:
+            state = self._load()
+        if state['exhausted']:
+            return 0
+        return max(0, self.daily_limit - state['used'])
+
+    def can_afford(self, *method_ids):
+        """Can we still call all the given methods today?"""
+        return sum(method_cost(m) for m in method_ids) <= self.remaining()
+
+    def summary(self):
+        with self.lock:
+            state = self._load()
+        return "YouTube quota for %s: used %d of %d units%s" % (state['day'],
+                state['used'], self.daily_limit,
+                ' (exhausted)' if state['exhausted'] else '')
+
+
+QUOTA = QuotaTracker()
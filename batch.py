@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+import sys, io, threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import redirect_stdout
+
+# Result of processing one item
+# index  - position of the item in the input
+# value  - return value of the processed function
+# error  - exception raised by the function (including SystemExit), or None
+# output - everything the function printed to stdout
+BatchResult = namedtuple('BatchResult', ['index', 'item', 'value', 'error', 'output'])
+
+
+class _ThreadLocalStdout:
+    """Stand-in for sys.stdout which captures output of worker threads
+
+    Threads that registered a buffer write into it,
+    other threads (i.e. the main thread) write to the real stdout.
+    """
+
+    def __init__(self, stdout):
+        self.stdout = stdout
+        self.local = threading.local()
+
+    def _target(self):
+        buffer = getattr(self.local, 'buffer', None)
+        if buffer is None:
+            return self.stdout
+        return buffer
+
+    def write(self, s):
+        return self._target().write(s)
+
+    def flush(self):
+        return self._target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stdout, name)
+
+
+def _run_in_thread(stdout, func, item):
+    stdout.local.buffer = io.StringIO()
+    try:
+        value, error = func(item), None
+    except BaseException as e:
+        value, error = None, e
+    finally:
+        output = stdout.local.buffer.getvalue()
+        stdout.local.buffer = None
+    return value, error, output
+
+
+def _run_in_process(func, item):
+    buf = io.StringIO()
+    try:
+        with redirect_stdout(buf):
+            value, error = func(item), None
+    except BaseException as e:
+        value, error = None, e
+    return value, error, buf.getvalue()
+
+
+def _print_progress(done, total):
+    # Do not mess up the terminal if the results are printed there as well
+    if sys.stderr.isatty() and not sys.__stdout__.isatty():
+        sys.stderr.write("\rProcessed %d/%d" % (done, total))
+        if done == total:
+            sys.stderr.write("\n")
+        sys.stderr.flush()
+
+
+def run_batch(func, items, jobs = 1, processes = False, progress = True):
+    """Runs func(item) for all items, yields BatchResult in the input order
+
+    With jobs > 1, items are processed concurrently in a thread pool
+    (or in a process pool if processes=True, then func must be picklable).
+    Output printed by func is captured per item and returned in the result,
+    so that the caller can print it in the input order.
+    Exceptions (including sys.exit()) are not raised but returned
+    in the result as well, it is up to the caller to re-raise them.
+    At most a few items per worker are in flight, so memory use does not
+    grow with the number of items.
+
+    With jobs == 1, items are processed in the calling thread
+    and the output is printed directly (so e.g. interactive questions work).
+
+    Example:
+        for result in run_batch(process_ytid, ytids, jobs = 8):
+            print(result.output, end = '')
+            if result.error is not None:
+                raise result.error
+    """
+    items = list(items)
+    total = len(items)
+
+    if jobs <= 1:
+        for i, item in enumerate(items):
+            try:
+                value, error = func(item), None
+            except BaseException as e:
+                value, error = None, e
+            yield BatchResult(i, item, value, error, '')
+            if progress:
+                _print_progress(i + 1, total)
+        return
+
+    if processes:
+        executor = ProcessPoolExecutor(max_workers = jobs)
+        submit = lambda item: executor.submit(_run_in_process, func, item)
+    else:
+        stdout = _ThreadLocalStdout(sys.stdout)
+        sys.stdout = stdout
+        executor = ThreadPoolExecutor(max_workers = jobs)
+        submit = lambda item: executor.submit(_run_in_thread, stdout, func, item)
+
+    window = 4 * jobs
+    pending = []
+    next_item = 0
+    try:
+        for i in range(total):
+            # Keep the pool busy, but do not submit everything at once
+            while next_item < total and next_item < i + window:
+                pending.append(submit(items[next_item]))
+                next_item += 1
+            value, error, output = pending.pop(0).result()
+            yield BatchResult(i, items[i], value, error, output)
+            if progress:
+                _print_progress(i + 1, total)
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait = True)
+        if not processes:
+            sys.stdout = stdout.stdout
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+import argparse, json, re, time, random, threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Local stand-in for the parts of Amara API used by api/amara_api.py
+# Used for reproducible benchmarks of the batch scripts, see run_benchmarks.py
+#
+# Point the scripts to it via environment variables:
+#   AMARA_BASE_URL=http://127.0.0.1:8000
+#   AMARA_API_FILE=<file with "<any_key> <username>" lines>
+#
+# GET /_stats returns number of requests served per endpoint,
+# POST /_reset resets the counters.
+
+TEAM = 'khan-academy'
+DEFAULT_PAGE_LIMIT = 20
+
+SAMPLE_SUBS = """WEBVTT
+
+00:00:00.000 --> 00:00:02.500
+Subtitles for video %s
+
+00:00:02.500 --> 00:00:05.000
+in language %s.
+"""
+
+def read_cmd():
+   """Function for reading command line options."""
+   desc = "Local stand-in Amara server for benchmarks"
+   parser = argparse.ArgumentParser(description=desc)
+   parser.add_argument('ytids_file', metavar='YTIDS_FILE',
+           help='Text file with YouTube IDs of videos on the server (first column).')
+   parser.add_argument('--port', dest='port', type=int, default=8000)
+   parser.add_argument('--latency', dest='latency', type=float, default=0.05,
+           help='Latency of every response (seconds)')
+   parser.add_argument('--page-size', dest='page_size', type=int, default=100,
+           help='Maximum page size of paginated responses')
+   parser.add_argument('--rate-429', dest='rate_429', type=float, default=0.0,
+           help='Fraction of requests answered with HTTP 429')
+   parser.add_argument('--retry-after', dest='retry_after', type=float, default=1.0,
+           help='Retry-After header of HTTP 429 responses (seconds)')
+   parser.add_argument('-l', '--lang', dest='lang', default='cs',
+           help='Language of subtitles present on the server')
+   parser.add_argument('--lang-fraction', dest='lang_fraction', type=float, default=0.5,
+           help='Fraction of videos with subtitles in LANG')
+   parser.add_argument('--missing-fraction', dest='missing_fraction', type=float, default=0.1,
+           help='Fraction of YTIDs that are not on the team')
+   parser.add_argument('--extra-languages', dest='extra_languages', type=int, default=15,
+           help='Number of other languages per video')
+   parser.add_argument('--seed', dest='seed', type=int, default=42)
+   return parser.parse_args()
+
+
+class AmaraState:
+    """In-memory videos, languages and subtitle requests"""
+
+    LANGUAGE_POOL = ['ar', 'bg', 'de', 'es', 'fr', 'hi', 'hu', 'it', 'ja',
+            'ko', 'my', 'nl', 'pl', 'pt', 'ru', 'sk', 'sv', 'tr', 'uk', 'zh']
+
+    def __init__(self, ytids, lang, lang_fraction, missing_fraction,
+            extra_languages, seed):
+        self.lock = threading.Lock()
+        self.rng = random.Random(seed)
+        self.videos = {}     # amara_id -> video
+        self.by_url = {}     # video_url -> [amara_id]
+        self.languages = {}  # amara_id -> {lang -> language}
+        self.subs = {}       # (amara_id, lang) -> [subtitle versions]
+        self.requests = {}   # job_id -> subtitle request
+        self.next_id = 0
+        pool = [l for l in self.LANGUAGE_POOL if l != lang]
+        for ytid in ytids:
+            if self.rng.random() < missing_fraction:
+                continue
+            amara_id = self.add_video(ytid, TEAM)
+            self.add_version(amara_id, 'en', 'en')
+            for l in self.rng.sample(pool, min(extra_languages, len(pool))):
+                self.add_version(amara_id, l, l)
+            if self.rng.random() < lang_fraction:
+                self.add_version(amara_id, lang, lang)
+
+    def _new_id(self):
+        self.next_id += 1
+        return "V%07d" % self.next_id
+
+    def add_video(self, ytid, team, primary_lang = 'en'):
+        amara_id = self._new_id()
+        video_url = 'https://www.youtube.com/watch?v=%s' % ytid
+        self.videos[amara_id] = {
+            'id': amara_id,
+            'title': 'Video %s' % ytid,
+            'team': team,
+            'duration': 300,
+            'primary_audio_language_code': primary_lang,
+            'all_urls': [video_url],
+        }
+        self.by_url.setdefault(video_url, []).append(amara_id)
+        self.languages[amara_id] = {}
+        return amara_id
+
+    def add_version(self, amara_id, lang, text, complete = True):
+        languages = self.languages[amara_id]
+        if lang not in languages:
+            languages[lang] = {
+                'language_code': lang,
+                'published': complete,
+                'subtitles_complete': complete,
+                'is_primary_audio_language': lang == 'en',
+                'versions': [],
+            }
+        versions = languages[lang]['versions']
+        version_no = len(versions) + 1
+        versions.insert(0, {'version_no': version_no, 'published': complete})
+        self.subs.setdefault((amara_id, lang), []).append(text)
+        if complete:
+            languages[lang]['published'] = True
+            languages[lang]['subtitles_complete'] = True
+        return version_no
+
+    def video_object(self, amara_id):
+        obj = dict(self.videos[amara_id])
+        obj['languages'] = [{
+            'code': l['language_code'],
+            'published': l['published'],
+            } for l in self.languages[amara_id].values()]
+        return obj
+
+
+def paginate(handler, objects, query):
+    limit = int(query.get('limit', [DEFAULT_PAGE_LIMIT])[0])
+    limit = max(1, min(limit, handler.server.opts.page_size))
+    offset = int(query.get('offset', [0])[0])
+    page = objects[offset:offset + limit]
+    next_url = None
+    if offset + limit < len(objects):
+        q = {k: v[0] for k, v in query.items()}
+        q['limit'] = limit
+        q['offset'] = offset + limit
+        next_url = "%s%s?%s" % (handler.server.base_url, urlparse(handler.path).path,
+                '&'.join("%s=%s" % (k, v) for k, v in q.items()))
+    return {
+        'meta': {
+            'total_count': len(objects),
+            'limit': limit,
+            'offset': offset,
+            'next': next_url,
+            },
+        'objects': page,
+    }
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    # HTTP/1.1 so that clients can reuse connections
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body = None, headers = None):
+        if body is None:
+            data = b''
+        elif isinstance(body, str):
+            data = body.encode('utf-8')
+        else:
+            data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length == 0:
+            return {}
+        return json.loads(self.rfile.read(length).decode('utf-8') or '{}')
+
+    def _handle(self, method):
+        server = self.server
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        path = url.path
+        body = self._body() if method in ('POST', 'PUT', 'GET') else {}
+
+        if path == '/_stats':
+            with server.stats_lock:
+                return self._send(200, {'total': sum(server.stats.values()),
+                    'endpoints': server.stats})
+        if path == '/_reset':
+            with server.stats_lock:
+                server.stats.clear()
+            return self._send(204)
+
+        endpoint = "%s %s" % (method, re.sub(r'/V\d+/', '/{video_id}/',
+            re.sub(r'/languages/[^/]+/', '/languages/{lang}/', path)))
+        with server.stats_lock:
+            server.stats[endpoint] = server.stats.get(endpoint, 0) + 1
+
+        time.sleep(server.opts.latency)
+        with server.rng_lock:
+            throttle = server.rng.random() < server.opts.rate_429
+        if throttle:
+            return self._send(429, {'detail': 'Request was throttled.'},
+                    {'Retry-After': '%g' % server.opts.retry_after})
+
+        with server.state.lock:
+            return self._route(method, path, query, body)
+
+    def _route(self, method, path, query, body):
+        state = self.server.state
+        parts = [p for p in path.split('/') if p]
+
+        if parts[:2] == ['api', 'languages']:
+            return self._send(200, {'meta': {'next': None}, 'objects': []})
+
+        if parts[:2] == ['api', 'videos'] and len(parts) == 2:
+            if method == 'POST':
+                ytid = body['video_url'].split('v=')[-1]
+                amara_id = state.add_video(ytid, None,
+                        body.get('primary_audio_language_code'))
+                return self._send(200, state.video_object(amara_id))
+            if 'video_url' in query:
+                ids = state.by_url.get(query['video_url'][0], [])
+            else:
+                ids = list(state.videos.keys())
+            if 'team' in query:
+                ids = [i for i in ids if state.videos[i]['team'] == query['team'][0]]
+            return self._send(200, paginate(self,
+                [state.video_object(i) for i in ids], query))
+
+        if parts[:2] == ['api', 'videos'] and len(parts) >= 3:
+            amara_id = parts[2]
+            if amara_id not in state.videos:
+                return self._send(404, {'detail': 'Not found.'})
+            if len(parts) == 3:
+                if method == 'PUT':
+                    state.videos[amara_id].update(body)
+                return self._send(200, state.video_object(amara_id))
+            languages = state.languages[amara_id]
+            if len(parts) == 4:
+                objects = sorted(languages.values(), key = lambda l: l['language_code'])
+                return self._send(200, paginate(self, objects, query))
+            lang = parts[4]
+            if len(parts) == 6 and parts[5] == 'subtitles':
+                if method == 'POST':
+                    version_no = state.add_version(amara_id, lang,
+                            body.get('subtitles', ''), body.get('action') == 'endorse')
+                    return self._send(200, {
+                        'version_number': version_no,
+                        'site_uri': "%s/videos/%s/%s/" % (self.server.base_url, amara_id, lang),
+                        })
+                versions = state.subs.get((amara_id, lang))
+                if not versions:
+                    return self._send(404, {'detail': 'Not found.'})
+                return self._send(200, SAMPLE_SUBS % (amara_id, lang))
+            if len(parts) == 7 and parts[6] == 'actions':
+                return self._send(200, [])
+
+        if parts[:2] == ['api', 'teams'] and len(parts) >= 4 \
+                and parts[3] == 'subtitle-requests':
+            team = parts[2]
+            if len(parts) == 4:
+                if method == 'POST':
+                    state.next_id += 1
+                    job_id = 'J%d' % state.next_id
+                    state.requests[job_id] = {'job_id': job_id, 'team': team,
+                        'video': body['video'], 'language': body['language'],
+                        'work_status': 'needs-subtitler'}
+                    return self._send(200, state.requests[job_id])
+                objects = [r for r in state.requests.values() if r['team'] == team
+                        and r['video'] == query.get('video', [None])[0]
+                        and r['language'] == query.get('language', [None])[0]]
+                return self._send(200, paginate(self, objects, query))
+            job = state.requests.get(parts[4])
+            if job is None:
+                return self._send(404, {'detail': 'Not found.'})
+            if method == 'DELETE':
+                del state.requests[parts[4]]
+                return self._send(204)
+            if method == 'PUT':
+                job.update(body)
+            return self._send(200, job)
+
+        return self._send(404, {'detail': 'Not found.'})
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+
+def make_server(opts, ytids, port = 0):
+    """Returns server listening on a given port (0 = any free port)"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.daemon_threads = True
+    server.opts = opts
+    server.base_url = 'http://127.0.0.1:%d' % server.server_port
+    server.state = AmaraState(ytids, opts.lang, opts.lang_fraction,
+            opts.missing_fraction, opts.extra_languages, opts.seed)
+    server.rng = random.Random(opts.seed)
+    server.rng_lock = threading.Lock()
+    server.stats = {}
+    server.stats_lock = threading.Lock()
+    return server
+
+
+def read_ytids(fname):
+    ytids = []
+    with open(fname, 'r') as f:
+        for line in f:
+            l = line.split()
+            if len(l) > 0 and l[0][0] != '#':
+                ytids.append(l[0])
+    return ytids
+
+
+if __name__ == '__main__':
+    opts = read_cmd()
+    server = make_server(opts, read_ytids(opts.ytids_file), opts.port)
+    print("Serving stand-in Amara API at %s (%d videos)"
+            % (server.base_url, len(server.state.videos)))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+import argparse, sys, os, json, time, random, string, threading, tempfile, subprocess
+from argparse import Namespace
+
+from amara_stub_server import make_server
+
+# Runs the Amara-facing batch scripts against the local stand-in
+# Amara server and reports wall time and number of requests per YTID.
+#
+# Example:
+#   ./run_benchmarks.py -n 200 --latency 0.1 --json before.json
+#   (apply your changes)
+#   ./run_benchmarks.py -n 200 --latency 0.1 --json after.json
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+LANG = 'cs'
+
+# name -> (script, arguments, server settings, reuse cache from the previous scenario?)
+# YTIDS and FILE_DIR in arguments are replaced by actual paths
+SCENARIOS = [
+    ('check_missing_j1', 'check_missing_videos_on_amara.py',
+        ['YTIDS', '-l', LANG, '-j', '1'], {}, False),
+    ('check_missing_j8', 'check_missing_videos_on_amara.py',
+        ['YTIDS', '-l', LANG, '-j', '8'], {}, False),
+    ('check_missing_j8_warm', 'check_missing_videos_on_amara.py',
+        ['YTIDS', '-l', LANG, '-j', '8'], {}, True),
+    ('check_missing_bulk', 'check_missing_videos_on_amara.py',
+        ['YTIDS', '-l', LANG, '--bulk'], {}, False),
+    # All subtitles are already on Amara, so that we never touch YouTube
+    ('sync_subs_yt2amara', 'sync_subs_yt2amara.py',
+        ['YTIDS', '-l', LANG],
+        {'lang_fraction': 1.0, 'missing_fraction': 0.0}, False),
+    ('amara_sync_files', 'amara_sync.py',
+        ['YTIDS', '-l', LANG, '-f', 'FILE_DIR'],
+        {'missing_fraction': 0.0}, False),
+]
+
+SAMPLE_SUBS = """WEBVTT
+
+00:00:00.000 --> 00:00:03.000
+Lokální titulky pro video %s
+"""
+
+def read_cmd():
+   """Function for reading command line options."""
+   desc = "Benchmarks of batch scripts against local stand-in Amara server"
+   parser = argparse.ArgumentParser(description=desc)
+   parser.add_argument('-n', '--num-videos', dest='num_videos', type=int, default=100,
+           help='Number of generated YouTube IDs')
+   parser.add_argument('-i', '--input', dest='input_file', default=None,
+           help='Use YouTube IDs from a given file instead of generated ones')
+   parser.add_argument('--latency', dest='latency', type=float, default=0.05,
+           help='Latency of every response of the server (seconds)')
+   parser.add_argument('--page-size', dest='page_size', type=int, default=100,
+           help='Maximum page size of paginated responses')
+   parser.add_argument('--rate-429', dest='rate_429', type=float, default=0.0,
+           help='Fraction of requests answered with HTTP 429')
+   parser.add_argument('--retry-after', dest='retry_after', type=float, default=1.0,
+           help='Retry-After header of HTTP 429 responses (seconds)')
+   parser.add_argument('-s', '--scenario', dest='scenarios', action='append', default=None,
+           help='Run only given scenario (can be repeated). Available: %s'
+           % ', '.join(s[0] for s in SCENARIOS))
+   parser.add_argument('--json', dest='json_fname', default=None,
+           help='Write results to a JSON file')
+   parser.add_argument('-v', '--verbose', dest='verbose', default=False, action='store_true',
+           help='Show output of the scripts')
+   parser.add_argument('--seed', dest='seed', type=int, default=42)
+   return parser.parse_args()
+
+
+def generate_ytids(n, seed):
+    rng = random.Random(seed)
+    chars = string.ascii_letters + string.digits + '-_'
+    return [''.join(rng.choice(chars) for i in range(11)) for j in range(n)]
+
+
+def start_server(opts, ytids, settings):
+    server_opts = Namespace(
+            latency = opts.latency,
+            page_size = opts.page_size,
+            rate_429 = opts.rate_429,
+            retry_after = opts.retry_after,
+            lang = LANG,
+            lang_fraction = 0.5,
+            missing_fraction = 0.1,
+            extra_languages = 15,
+            seed = opts.seed)
+    for k, v in settings.items():
+        setattr(server_opts, k, v)
+    server = make_server(server_opts, ytids)
+    thread = threading.Thread(target = server.serve_forever, daemon = True)
+    thread.start()
+    return server
+
+
+def run_scenario(opts, scenario, ytids, workdir, cache_dir):
+    name, script, args, settings, warm = scenario
+    server = start_server(opts, ytids, settings)
+
+    ytids_fname = os.path.join(workdir, "%s.ytids" % name)
+    with open(ytids_fname, 'w') as f:
+        f.write('\n'.join(ytids) + '\n')
+    file_dir = os.path.join(workdir, 'subs')
+    args = [{'YTIDS': ytids_fname, 'FILE_DIR': file_dir}.get(a, a) for a in args]
+
+    env = dict(os.environ)
+    env['AMARA_BASE_URL'] = server.base_url
+    env['AMARA_API_FILE'] = os.path.join(workdir, 'amara_api_keys')
+    env['KSTOOLS_CACHE_DIR'] = cache_dir
+    env['KSTOOLS_METRICS'] = os.path.join(workdir, "%s.metrics.json" % name)
+    env.pop('KSTOOLS_METRICS_PROM', None)
+
+    output = None if opts.verbose else subprocess.DEVNULL
+    start = time.time()
+    p = subprocess.run([sys.executable, os.path.join(REPO_DIR, script)] + args,
+            cwd = workdir, env = env, stdout = output, stderr = output)
+    wall_time = time.time() - start
+
+    with server.stats_lock:
+        stats = dict(server.stats)
+    server.shutdown()
+    server.server_close()
+
+    requests_total = sum(stats.values())
+    return {
+        'scenario': name,
+        'script': script,
+        'arguments': args,
+        'warm_cache': warm,
+        'returncode': p.returncode,
+        'ytids': len(ytids),
+        'wall_time_seconds': round(wall_time, 3),
+        'requests_total': requests_total,
+        'requests_per_ytid': round(requests_total / len(ytids), 3),
+        'endpoints': stats,
+    }
+
+
+def print_results(results):
+    print("%-24s %10s %10s %12s %6s" % ('scenario', 'wall [s]', 'requests', 'req/YTID', 'exit'))
+    for r in results:
+        print("%-24s %10.2f %10d %12.2f %6d" % (r['scenario'], r['wall_time_seconds'],
+            r['requests_total'], r['requests_per_ytid'], r['returncode']))
+
+
+if __name__ == '__main__':
+    opts = read_cmd()
+
+    if opts.input_file is not None:
+        from amara_stub_server import read_ytids
+        ytids = read_ytids(opts.input_file)
+    else:
+        ytids = generate_ytids(opts.num_videos, opts.seed)
+
+    scenarios = SCENARIOS
+    if opts.scenarios is not None:
+        unknown = set(opts.scenarios) - set(s[0] for s in SCENARIOS)
+        if unknown:
+            print("ERROR: Unknown scenario(s) %s" % ', '.join(sorted(unknown)))
+            sys.exit(1)
+        scenarios = [s for s in SCENARIOS if s[0] in opts.scenarios]
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix = 'kstools-bench-') as workdir:
+        # Any API key will do, the stand-in server does not check them
+        with open(os.path.join(workdir, 'amara_api_keys'), 'w') as f:
+            for username in ('dhbot', 'danekhollas'):
+                f.write("benchmark-key %s\n" % username)
+        os.makedirs(os.path.join(workdir, 'subs'))
+        for ytid in ytids:
+            fname = os.path.join(workdir, 'subs', "%s.%s.vtt" % (ytid, LANG))
+            with open(fname, 'w') as f:
+                f.write(SAMPLE_SUBS % ytid)
+
+        cache_dir = None
+        for i, scenario in enumerate(scenarios):
+            if cache_dir is None or not scenario[4]:
+                cache_dir = os.path.join(workdir, "cache%d" % i)
+            print("Running %s..." % scenario[0], file = sys.stderr)
+            results.append(run_scenario(opts, scenario, ytids, workdir, cache_dir))
+
+    print_results(results)
+    if opts.json_fname is not None:
+        with open(opts.json_fname, 'w') as f:
+            json.dump({
+                'settings': {
+                    'ytids': len(ytids),
+                    'latency': opts.latency,
+                    'page_size': opts.page_size,
+                    'rate_429': opts.rate_429,
+                    'seed': opts.seed,
+                    },
+                'results': results,
+                }, f, indent = 2)
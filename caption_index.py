@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+import os, json, hashlib, threading, time
+
+# Default location of the index, next to the other caches
+CAPTION_INDEX_FILE = os.path.join(os.environ.get('KSTOOLS_CACHE_DIR',
+        os.path.abspath(os.path.join(os.path.dirname(__file__), "CACHE"))),
+        "youtube_pushed_captions.jsonl")
+
+def content_hash(data):
+    """SHA-256 of subtitles (str or bytes)"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+class CaptionIndex:
+    """Index of caption tracks that we pushed to YouTube
+
+    For every (ytid, lang, caption_id) we remember the hash of the pushed
+    subtitles and the Amara revision they came from, so that unchanged
+    subtitles do not need to be uploaded again. Optionally also the hash
+    of the track as returned by captions().download, which is not
+    byte-identical to what we uploaded, but lets us detect
+    later edits done directly on YouTube.
+
+    The index is an append-only file with one JSON record per line,
+    the last record for a given key wins.
+    """
+
+    def __init__(self, fname = CAPTION_INDEX_FILE):
+        self.fname = fname
+        self.lock = threading.Lock()
+        self.index = {}
+        os.makedirs(os.path.dirname(os.path.abspath(fname)), exist_ok = True)
+        self._load_index()
+
+    def _key(self, ytid, lang, caption_id):
+        return "%s/%s/%s" % (ytid, lang, caption_id)
+
+    def _load_index(self):
+        if not os.path.isfile(self.fname):
+            return
+        with open(self.fname, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Truncated last line after a crash
+                    continue
+                self.index[record['key']] = record
+
+    def get(self, ytid, lang, caption_id):
+        """Returns the last record for a caption track or None"""
+        with self.lock:
+            return self.index.get(self._key(ytid, lang, caption_id))
+
+    def put(self, ytid, lang, caption_id, **info):
+        """Records (or updates) info about a caption track, e.g.
+        sha256, amara_id, amara_version, youtube_sha256"""
+        key = self._key(ytid, lang, caption_id)
+        with self.lock:
+            record = dict(self.index.get(key, {}))
+            record.update(info)
+            record.update({
+                'key': key,
+                'ytid': ytid,
+                'lang': lang,
+                'caption_id': caption_id,
+                'updated_at': time.time(),
+            })
+            self.index[key] = record
+            with open(self.fname, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        return record
+
+    def is_unchanged(self, ytid, lang, caption_id, sha256):
+        """Did we already push exactly these subtitles to this track?"""
+        record = self.get(ytid, lang, caption_id)
+        return record is not None and record.get('sha256') == sha256
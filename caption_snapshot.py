@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+import argparse, os, sys, json, time
+
+import api.youtube_oauth as ytapi
+from api.youtube_quota import QUOTA, method_cost
+from utils import eprint
+
+# Default location of the snapshot, next to the other caches
+CAPTION_SNAPSHOT_FILE = os.path.join(os.environ.get('KSTOOLS_CACHE_DIR',
+        os.path.abspath(os.path.join(os.path.dirname(__file__), "CACHE"))),
+        "youtube_caption_snapshot.json")
+
+# Only what we need to detect changes of a video. Etag of the bare 'id'
+# part does not change with captions, so we ask for contentDetails,
+# which include the caption flag (the cost is the same for any parts)
+VIDEO_CHANGES_PART = 'contentDetails'
+VIDEO_CHANGES_PROJECTION = 'items(id,etag,contentDetails/caption)'
+
+
+class CaptionSnapshot:
+    """Local snapshot of caption tracks of videos on our YouTube channel
+
+    For every YTID, we keep the caption tracks in the same format
+    as returned by ytapi.list_captions(), together with the etag
+    of the video and its contentDetails.caption flag, so that a refresh
+    only needs to list captions for videos that changed since the last time.
+
+    Layout of the JSON file:
+        {"channel_id": ..., "updated_at": ...,
+         "videos": {YTID: {"title": ..., "etag": ..., "caption": ...,
+                           "listed_at": ..., "captions": [caption track, ...]}}}
+    """
+
+    def __init__(self, fname = CAPTION_SNAPSHOT_FILE):
+        self.fname = fname
+        self.channel_id = None
+        self.updated_at = None
+        self.videos = {}
+        if os.path.isfile(fname):
+            with open(fname, 'r') as f:
+                data = json.load(f)
+            self.channel_id = data.get('channel_id')
+            self.updated_at = data.get('updated_at')
+            self.videos = data['videos']
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.fname)), exist_ok = True)
+        data = {
+            'channel_id': self.channel_id,
+            'updated_at': self.updated_at,
+            'videos': self.videos,
+        }
+        tmp_fname = "%s.%d.tmp" % (self.fname, os.getpid())
+        with open(tmp_fname, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_fname, self.fname)
+
+    def has(self, ytid):
+        """Do we know caption tracks for a given video?"""
+        return ytid in self.videos and self.videos[ytid].get('captions') is not None
+
+    def captions(self, ytid):
+        """Returns list of caption tracks (as from list_captions) or None"""
+        if ytid not in self.videos:
+            return None
+        return self.videos[ytid].get('captions')
+
+    def languages(self, ytid):
+        return set(c['snippet']['language'] for c in self.captions(ytid) or [])
+
+    def set_captions(self, ytid, captions):
+        video = self.videos.setdefault(ytid, {})
+        video['captions'] = [{'id': c['id'], 'snippet': c['snippet']} for c in captions]
+        video['listed_at'] = time.time()
+
+    def add_caption(self, ytid, caption_id, lang, is_draft, name = ''):
+        """Records caption track that we just uploaded"""
+        if not self.has(ytid):
+            return
+        self.videos[ytid]['captions'].append({
+            'id': caption_id,
+            'snippet': {
+                'language': lang,
+                'name': name,
+                'isDraft': is_draft,
+                },
+            })
+
+    def invalidate(self, ytid):
+        """Forget caption tracks of a video, they will be listed again"""
+        if ytid in self.videos:
+            self.videos[ytid]['captions'] = None
+
+
+def channel_uploads(youtube, channel_id):
+    """Yields (YTID, title) for all videos uploaded to a channel"""
+    response = youtube.channels().list(
+        part='contentDetails',
+        id=channel_id).execute()
+    playlist_id = response['items'][0]['contentDetails']['relatedPlaylists']['uploads']
+    for item in ytapi.iter_playlist_items(youtube, playlist_id):
+        snippet = item['snippet']
+        yield snippet['resourceId']['videoId'], snippet['title']
+
+
+def refresh_snapshot(youtube, snapshot, channel_id, full = False, jobs = 8):
+    """Updates snapshot for all videos of a channel
+
+    Unless full=True, captions are listed only for new videos
+    and for videos whose etag or caption flag changed since the last refresh.
+    Returns number of videos for which captions were listed.
+    """
+    videos = {}
+    for ytid, title in channel_uploads(youtube, channel_id):
+        videos[ytid] = title
+    eprint("Found %d videos on channel %s" % (len(videos), channel_id))
+
+    # Videos that are no longer on the channel
+    for ytid in set(snapshot.videos) - set(videos):
+        del snapshot.videos[ytid]
+
+    to_list = []
+    for video in ytapi.iter_videos(youtube, list(videos), jobs = jobs,
+            part = VIDEO_CHANGES_PART, fields = VIDEO_CHANGES_PROJECTION):
+        ytid = video['id']
+        caption = video.get('contentDetails', {}).get('caption')
+        old = snapshot.videos.get(ytid)
+        if full or old is None or old.get('captions') is None \
+                or old.get('etag') != video['etag'] \
+                or old.get('caption') != caption:
+            to_list.append(ytid)
+        entry = snapshot.videos.setdefault(ytid, {'captions': None})
+        entry['title'] = videos[ytid]
+        # Store etag and caption flag only after we list the captions
+        entry['new_etag'] = (video['etag'], caption)
+
+    # Captions are expensive, list only as many as we can afford today
+    affordable = QUOTA.remaining() // method_cost('youtube.captions.list')
+    if affordable < len(to_list):
+        eprint("WARNING: YouTube quota allows listing captions only for %d of %d changed videos"
+                % (affordable, len(to_list)))
+        eprint("Run the refresh again tomorrow")
+        to_list = to_list[:affordable]
+
+    eprint("Listing captions for %d new or changed videos" % len(to_list))
+    for i in range(0, len(to_list), ytapi.CAPTIONS_BATCH_SIZE):
+        chunk = to_list[i:i + ytapi.CAPTIONS_BATCH_SIZE]
+        all_captions = ytapi.list_captions_bulk(youtube, chunk)
+        for ytid, captions in all_captions.items():
+            snapshot.set_captions(ytid, captions)
+            entry = snapshot.videos[ytid]
+            entry['etag'], entry['caption'] = entry['new_etag']
+        # Save progress, listing can take a while for large channels
+        snapshot.save()
+
+    for entry in snapshot.videos.values():
+        entry.pop('new_etag', None)
+    snapshot.channel_id = channel_id
+    snapshot.updated_at = time.time()
+    snapshot.save()
+    return len(to_list)
+
+
+def read_cmd():
+   """Function for reading command line options."""
+   desc = "Snapshot of caption tracks of all videos on a YouTube channel"
+   parser = argparse.ArgumentParser(description=desc, parents = [ytapi.oauth_argparser()])
+   parser.add_argument('--channelid', dest = 'channel_id', default = None,
+           help='YouTube channel ID (default is the channel of the existing snapshot)')
+   parser.add_argument('--snapshot', dest = 'snapshot_fname', default = CAPTION_SNAPSHOT_FILE,
+           help='Snapshot file')
+   parser.add_argument('--refresh', dest = 'refresh', default = False, action = 'store_true',
+           help='Update the snapshot, listing captions only for new or changed videos')
+   parser.add_argument('--full', dest = 'full', default = False, action = 'store_true',
+           help='With --refresh, list captions for all videos')
+   parser.add_argument('-l', '--lang', dest = 'lang', default = None,
+           help='Print YTIDs of videos without caption track in a given language')
+   parser.add_argument('-j', '--jobs', dest = 'jobs', type = int, default = 8,
+           help='Number of concurrent requests when listing videos')
+   return parser.parse_args()
+
+
+if __name__ == '__main__':
+    opts = read_cmd()
+    snapshot = CaptionSnapshot(opts.snapshot_fname)
+
+    if opts.refresh:
+        channel_id = opts.channel_id or snapshot.channel_id
+        if channel_id is None:
+            print("ERROR: Please specify channel ID using --channelid")
+            sys.exit(1)
+        youtube = ytapi.get_authenticated_service(opts)
+        refresh_snapshot(youtube, snapshot, channel_id, opts.full, opts.jobs)
+        eprint(QUOTA.summary())
+    elif snapshot.updated_at is None:
+        print("ERROR: Snapshot %s does not exist, create it with --refresh" % opts.snapshot_fname)
+        sys.exit(1)
+
+    if opts.lang is not None:
+        for ytid, video in snapshot.videos.items():
+            if video.get('captions') is None:
+                continue
+            if opts.lang not in snapshot.languages(ytid):
+                print("%s\t%s" % (ytid, video.get('title', '')))
+    else:
+        listed = sum(1 for ytid in snapshot.videos if snapshot.has(ytid))
+        print("%d videos in snapshot, captions known for %d" % (len(snapshot.videos), listed))
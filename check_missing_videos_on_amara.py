@@ -1,8 +1,7 @@
 #!/usr/bin/env python3
-import argparse, sys, requests
-from time import sleep
+import argparse, sys, requests, asyncio
 
-from api.amara_api import Amara
+from api.amara_api import AsyncAmara
 
 def read_cmd():
    """Function for reading command line options."""
@@ -13,11 +12,25 @@ def read_cmd():
    parser.add_argument(
            '-s', '--sleep', dest = 'sleep_int',
            required = False, type = float, default = -1,
-           help='Sleep interval (seconds)')
+           help='Extra sleep interval (seconds). Normally not needed, \
+           requests to Amara are rate-limited automatically.')
    parser.add_argument(
            '-l', '--lang', dest = 'lang',
            required = False, default = None,
            help='What language?')
+   parser.add_argument(
+           '-j', '--jobs', dest = 'jobs',
+           required = False, type = int, default = 8,
+           help='Maximum number of concurrent requests to Amara')
+   parser.add_argument(
+           '-b', '--bulk', dest = 'bulk',
+           default = False, action = 'store_true',
+           help='Download list of all videos on the team first. \
+           Much faster for large inputs.')
+   parser.add_argument(
+           '--no-cache', dest = 'use_cache',
+           default = True, action = 'store_false',
+           help='Do not use cached Amara video lookups.')
    return parser.parse_args()
 
 
@@ -32,38 +45,69 @@ with open(opts.input_file, "r") as f:
         ytids.append(line.split())
 
 AMARA_USERNAME = 'dhbot'
-amara = Amara(AMARA_USERNAME)
-
-# Main loop
-for i in range(len(ytids)):
-    if len(ytids[i]) == 0:
-        print("")
-        continue
-    ytid = ytids[i][0]
+amara = AsyncAmara(AMARA_USERNAME, max_in_flight = opts.jobs,
+        use_cache = opts.use_cache)
 
-    # Trying to reduce E 429
-    if opts.sleep_int > 0:
-        sleep(opts.sleep_int)
-
-    sys.stdout.flush()
-    sys.stderr.flush()
+# YTID -> Amara video, filled in bulk mode
+team_index = None
 
+async def check_ytid(ytid):
+    """Returns list of lines to print for a given YTID"""
+    out = []
     video_url = 'https://www.youtube.com/watch?v=%s' % ytid
     amara_id = None
 
     # Check whether the video is already on Amara
-    amara_response = amara.check_video(video_url, amara_team)
-    for r in amara_response['objects']:
-        if r['team'] == amara_team:
-            amara_id = r['id']
+    if team_index is not None:
+        if ytid in team_index:
+            amara_id = team_index[ytid]['id']
+    else:
+        amara_response = await amara.check_video(video_url, amara_team)
+        for r in amara_response['objects']:
+            if r['team'] == amara_team:
+                amara_id = r['id']
 
     if not amara_id:
-        print("Video missing on %s Amara!\t%s" % (amara_team, video_url))
-        continue
+        out.append("Video missing on %s Amara!\t%s" % (amara_team, video_url))
+        return out
 
     # Optionally, we check for subtitles in a given language
     if opts.lang is not None:
-        is_present, sub_version = amara.check_language(amara_id, opts.lang)
+        if team_index is not None:
+            languages = team_index[ytid]['languages']
+            is_present = opts.lang in [lg['code'] for lg in languages]
+        else:
+            is_present, sub_version = await amara.check_language(amara_id, opts.lang)
         if not is_present:
-            print("%s subtitles missing\t%s" % (opts.lang, ytid))
+            out.append("%s subtitles missing\t%s" % (opts.lang, ytid))
+    return out
+
+async def main():
+    global team_index
+    if opts.bulk:
+        team_index = await amara.index_team_videos(amara_team)
+        print("Found %d videos on %s Amara" % (len(team_index), amara_team),
+                file = sys.stderr)
+
+    # Requests are fanned out concurrently,
+    # but the results are printed in the input order
+    tasks = []
+    for l in ytids:
+        if len(l) == 0:
+            tasks.append(None)
+            continue
+        tasks.append(asyncio.ensure_future(check_ytid(l[0])))
+        # Extra delay on top of the automatic rate limiting in Amara class
+        if opts.sleep_int > 0:
+            await asyncio.sleep(opts.sleep_int)
+
+    for task in tasks:
+        if task is None:
+            print("")
+            continue
+        for line in await task:
+            print(line)
+        sys.stdout.flush()
 
+asyncio.run(main())
+amara.close()
@@ -4,6 +4,8 @@ from time import sleep
 from pprint import pprint
 
 from api.amara_api import Amara
+from utils import eprint
+from batch import run_batch
 
 def read_cmd():
    """Function for reading command line options."""
@@ -14,11 +16,21 @@ def read_cmd():
    parser.add_argument(
            '-s', '--sleep', dest = 'sleep_int',
            required = False, type = float, default = -1,
-           help='Sleep interval (seconds)')
+           help='Extra sleep interval (seconds). Normally not needed, \
+           requests to Amara are rate-limited automatically.')
    parser.add_argument(
            '-l', '--lang', dest = 'lang',
            required = False, default = None,
            help='What language?')
+   parser.add_argument(
+           '-b', '--bulk', dest = 'bulk',
+           default = False, action = 'store_true',
+           help='Download list of all videos on the team first. \
+           Much faster for large inputs.')
+   parser.add_argument(
+           '-j', '--jobs', dest = 'jobs',
+           required = False, type = int, default = 1,
+           help='Number of videos processed concurrently')
    return parser.parse_args()
 
 def find_subtitles(present_languages, lang, amara_id):
@@ -51,25 +63,33 @@ with open(opts.input_file, "r") as f:
 AMARA_USERNAME = 'dhbot'
 amara = Amara(AMARA_USERNAME)
 
-# Main loop
-for i in range(len(ytids)):
-    if len(ytids[i]) == 0:
+# In bulk mode, we look up videos in the team index
+# and call check_video only for videos which are not on the team
+team_index = None
+if opts.bulk:
+    team_index = amara.index_team_videos(AMARA_TEAM)
+    eprint("Found %d videos on %s Amara" % (len(team_index), AMARA_TEAM))
+
+def check_ytid(line):
+    """Check subtitles for YTID in the first column of the input line"""
+    if len(line) == 0:
         print("")
-        continue
-    ytid = ytids[i][0]
+        return
+    ytid = line[0]
 
-    # Trying to reduce E 429
+    # Extra delay on top of the automatic rate limiting in Amara class
     if opts.sleep_int > 0:
         sleep(opts.sleep_int)
 
-    sys.stdout.flush()
-    sys.stderr.flush()
-
     video_url = 'https://www.youtube.com/watch?v=%s' % ytid
     amara_team_id = amara_public_id = None
 
     # Check whether the video is already on Amara
-    amara_response = amara.check_video(video_url)
+    if team_index is not None and ytid in team_index:
+        amara_response = {'objects': [team_index[ytid]]}
+    else:
+        # We need current list of languages, so we bypass the cache
+        amara_response = amara.check_video(video_url, use_cache = False)
     for r in amara_response['objects']:
         if r['team'] == AMARA_TEAM:
             amara_team_id = r['id']
@@ -115,5 +135,11 @@ for i in range(len(ytids)):
         elif subs_incomplete:
             print("Incomplete subtitles found on Public Amara.\t%s\t%s\t%s\t%s\t%s" % (ytid, video_url,
                 video_title, amara_public_id, amara_url))
-            print(lang)
 
+
+# Main loop
+for result in run_batch(check_ytid, ytids, jobs = opts.jobs):
+    print(result.output, end = '')
+    sys.stdout.flush()
+    if result.error is not None:
+        raise result.error
@@ -4,6 +4,7 @@ from time import sleep
 from pprint import pprint
 from api.amara_api import Amara
 from utils import answer_me
+from journal import Journal, default_journal_fname
 
 def read_cmd():
    desc = "Deleting Subtitle Requests on Amara in bulk"
@@ -16,7 +17,20 @@ def read_cmd():
    parser.add_argument(
            '-s', '--sleep', dest = 'sleep_int',
            required = False, type = float, default = -1,
-           help='Sleep interval (seconds)')
+           help='Extra sleep interval (seconds). Normally not needed, \
+           requests to Amara are rate-limited automatically.')
+   parser.add_argument(
+           '--no-cache', dest = 'use_cache',
+           default = True, action = 'store_false',
+           help='Do not use cached Amara video lookups.')
+   parser.add_argument(
+           '--resume', dest = 'resume',
+           default = False, action = 'store_true',
+           help='Skip videos finished in the previous run (see --journal).')
+   parser.add_argument(
+           '--journal', dest = 'journal_fname', default = None,
+           help='Journal file with progress of the run, \
+           default is INPUT_FILE.delete_subtitle_requests.LANG.journal')
    return parser.parse_args()
 
 
@@ -32,7 +46,11 @@ with open(opts.input_file, "r") as f:
     for line in f:
         ytids.append(line.split())
 
-amara = Amara(AMARA_USERNAME)
+amara = Amara(AMARA_USERNAME, use_cache = opts.use_cache)
+
+if opts.journal_fname is None:
+    opts.journal_fname = default_journal_fname(__file__, opts.input_file, lang)
+journal = Journal(opts.journal_fname, resume = opts.resume)
 
 # Main loop
 for i in range(len(ytids)):
@@ -41,6 +59,10 @@ for i in range(len(ytids)):
         continue
     ytid = ytids[i][0]
 
+    if journal.is_done(ytid):
+        continue
+    journal.record(ytid, journal.STARTED)
+
     sys.stdout.flush()
     sys.stderr.flush()
 
@@ -56,24 +78,29 @@ for i in range(len(ytids)):
     amara_id = amara_response['objects'][0]['id']
     amara_title = amara_response['objects'][0]['title']
 
-    # Trying to reduce E 429
+    # Extra delay on top of the automatic rate limiting in Amara class
     if opts.sleep_int > 0:
         sleep(opts.sleep_int)
 
     subs_request = amara.list_subtitle_requests(amara_id, opts.lang, AMARA_TEAM)
     if subs_request['meta']['total_count'] == 0:
         print("Subtitle request not found, skipping...YTID\t%s" % ytid)
+        journal.done(ytid, outcome = 'not-found')
         continue
 
     job_id = subs_request['objects'][0]['job_id']
     work_status = subs_request['objects'][0]['work_status']
     if work_status != 'needs-subtitler':
         print("Subtitle request is being worked on. YTID:\t%s" % ytid)
+        journal.done(ytid, outcome = 'in-progress')
         continue
 
     http_status = amara.delete_subtitle_request(job_id, AMARA_TEAM)
     if http_status != 204:
         print("ERROR when deleting the subtitle request YTID=%s. HTTP code: %d"
                 % (ytid, http_status))
+        journal.record(ytid, 'failed', http_status = http_status)
+        continue
 
     print("Subtitle request successfuly deleted. YTID\t%s" % ytid)
+    journal.done(ytid, outcome = 'deleted')
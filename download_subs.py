@@ -3,7 +3,10 @@ import argparse, sys, os, requests
 from subprocess import Popen, PIPE
 from pprint import pprint
 from api.amara_api import Amara
-from utils import answer_me, download_yt_subtitles
+from utils import answer_me, eprint
+from youtube_subs import download_yt_subtitles
+from subtitle_store import SubtitleStore, SUBTITLE_STORE_DIR
+from batch import run_batch
 from time import sleep
 
 def read_cmd():
@@ -24,7 +27,19 @@ def read_cmd():
    parser.add_argument(
            '-s', '--sleep', dest = 'sleep_int',
            required = False, type = float, default = -1,
-           help='Sleep interval (seconds)')
+           help='Extra sleep interval (seconds). Normally not needed, \
+           requests to Amara are rate-limited automatically.')
+   parser.add_argument(
+           '--store', dest = 'store_dir', default = SUBTITLE_STORE_DIR,
+           help='Local store of already downloaded Amara subtitles')
+   parser.add_argument(
+           '--no-cache', dest = 'use_cache',
+           default = True, action = 'store_false',
+           help='Do not use cached Amara video lookups.')
+   parser.add_argument(
+           '-j', '--jobs', dest = 'jobs',
+           required = False, type = int, default = 1,
+           help='Number of videos processed concurrently')
    return parser.parse_args()
 
 opts = read_cmd()
@@ -42,6 +57,12 @@ if opts.youtube == False and opts.amara == False:
     print('Type "-h" for help')
     sys.exit(1)
 
+# Video download writes to the current directory and to shared log files,
+# so we cannot run it concurrently
+if opts.jobs > 1 and opts.video:
+    print('Option "--jobs" is not supported together with "--video"')
+    sys.exit(1)
+
 # List ytids may also contain filenames
 ytids = []
 # Reading file with YT id's
@@ -62,12 +83,12 @@ except:
 
 AMARA_USERNAME = 'dhbot'
 if opts.amara:
-    amara = Amara(AMARA_USERNAME)
+    amara = Amara(AMARA_USERNAME, use_cache = opts.use_cache)
+    store = SubtitleStore(opts.store_dir)
 
-# Main loop
-for i in range(len(ytids)):
-
-    ytid = ytids[i][0]
+def download(line):
+    """Download subtitles for YTID in the first column of the input line"""
+    ytid = line[0]
     video_url = 'https://www.youtube.com/watch?v=%s' % ytid
     amara_id = ''
 
@@ -86,6 +107,8 @@ for i in range(len(ytids)):
     if opts.youtube:
 
         subs = download_yt_subtitles(opts.lang, opts.sub_format, ytid, opts.dirname)
+        if subs is None:
+            sys.exit(1)
 
     elif opts.amara:
 
@@ -112,12 +135,20 @@ for i in range(len(ytids)):
             sys.exit(1)
  
         # Download and write subtitles from Amara for a given language
-        subs = amara.download_subs(amara_id, opts.lang, opts.sub_format)
+        # (unless we already have this revision in the local store)
+        subs = store.fetch(amara, amara_id, opts.lang, sub_version, opts.sub_format)
         fname = "%s/%s.%s.%s" % (opts.dirname, ytid, opts.lang, opts.sub_format)
         with open(fname, 'w') as f:
             f.write(subs)
 
-    # Trying to reduce E 429
+    # Extra delay on top of the automatic rate limiting in Amara class
     if opts.sleep_int > 0:
         sleep(opts.sleep_int)
 
+
+# Main loop
+for result in run_batch(download, ytids, jobs = opts.jobs):
+    print(result.output, end = '')
+    sys.stdout.flush()
+    if result.error is not None:
+        raise result.error
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+import os, json, time
+
+class Journal:
+    """Append-only journal of per-YTID progress of a batch script
+
+    Every record is one JSON line with YTID, stage and optional info,
+    e.g. {"ytid": "...", "stage": "uploaded", "version": 3}.
+    Stage 'done' marks a finished item. When the script is restarted
+    with resume=True, finished items can be skipped and unfinished ones
+    can continue from the last recorded stage. Without resume, a new run
+    is started, older records are kept in the file but ignored.
+    Either way, a YTID finished in this run is done, so YTIDs listed
+    more than once in the input are processed only once.
+    """
+
+    STARTED = 'started'
+    DONE = 'done'
+
+    def __init__(self, fname, resume = False):
+        self.fname = fname
+        # ytid -> last record, merged with info from previous stages
+        self.items = {}
+        if resume:
+            self._load()
+        self.f = open(fname, 'a')
+        if not resume:
+            self._write({'event': 'new_run', 'time': time.time()})
+
+    def _load(self):
+        if not os.path.isfile(self.fname):
+            return
+        with open(self.fname, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Truncated last line after a crash
+                    continue
+                if record.get('event') == 'new_run':
+                    self.items = {}
+                elif 'ytid' in record:
+                    item = self.items.setdefault(record['ytid'], {})
+                    item.update(record)
+
+    def _write(self, record):
+        self.f.write(json.dumps(record) + '\n')
+        # Make sure the record survives if the script dies right after
+        self.f.flush()
+
+    def record(self, ytid, stage, **info):
+        """Records that a given YTID reached a given stage"""
+        record = {'ytid': ytid, 'stage': stage, 'time': time.time()}
+        record.update(info)
+        item = self.items.setdefault(ytid, {})
+        item.update(record)
+        self._write(record)
+
+    def done(self, ytid, **info):
+        self.record(ytid, self.DONE, **info)
+
+    def stage(self, ytid):
+        """Returns the last recorded stage for YTID, or None"""
+        return self.items.get(ytid, {}).get('stage')
+
+    def is_done(self, ytid):
+        return self.stage(ytid) == self.DONE
+
+    def info(self, ytid):
+        """Returns all info recorded for YTID (merged over all stages)"""
+        return self.items.get(ytid, {})
+
+    def close(self):
+        self.f.close()
+
+
+def default_journal_fname(script, input_file, lang = None):
+    """E.g. ytids.txt -> ytids.txt.amara_sync.cs.journal"""
+    script = os.path.splitext(os.path.basename(script))[0]
+    if lang is None:
+        return "%s.%s.journal" % (input_file, script)
+    return "%s.%s.%s.journal" % (input_file, script, lang)
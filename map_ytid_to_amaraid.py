@@ -3,6 +3,7 @@ import argparse, sys, requests
 from pprint import pprint
 from api.amara_api import Amara
 from utils import answer_me
+from batch import run_batch
 
 def print_header():
     print("Amara link | Number of subtitle revisions | Video Title")
@@ -20,6 +21,14 @@ def read_cmd():
    parser.add_argument('--no-header', dest = 'header',
           action = 'store_false', default = True,
           help='Print header.')
+   parser.add_argument(
+           '--no-cache', dest = 'use_cache',
+           default = True, action = 'store_false',
+           help='Do not use cached Amara video lookups.')
+   parser.add_argument(
+           '-j', '--jobs', dest = 'jobs',
+           required = False, type = int, default = 1,
+           help='Number of videos processed concurrently')
    return parser.parse_args()
 
 
@@ -37,20 +46,17 @@ with open(opts.input_file, "r") as f:
         ytids.append(line.split())
 
 AMARA_USERNAME = 'dhbot'
-amara = Amara(AMARA_USERNAME)
+amara = Amara(AMARA_USERNAME, use_cache = opts.use_cache)
 
 if opts.header:
     print_header()
 
-# Main loop
-for i in range(len(ytids)):
-    if len(ytids[i]) == 0:
+def map_ytid(line):
+    """Print Amara link for YTID in the first column of the input line"""
+    if len(line) == 0:
         print("")
-        continue
-    ytid = ytids[i][0]
-
-    sys.stdout.flush()
-    sys.stderr.flush()
+        return
+    ytid = line[0]
 
     video_url = 'https://www.youtube.com/watch?v=%s' % ytid
 
@@ -80,3 +86,10 @@ for i in range(len(ytids)):
     #title = amara_title.split("|")[0].strip().lower().replace(' ','_')
     #print("%s\t%s" % (ytid, title))
 
+
+# Main loop
+for result in run_batch(map_ytid, ytids, jobs = opts.jobs):
+    print(result.output, end = '')
+    sys.stdout.flush()
+    if result.error is not None:
+        raise result.error
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""Rule-based normalization of subtitles
+
+Rules are applied to the text of every cue, timing is left untouched.
+Only the text of changed cues is rewritten, the rest of the file
+(cue settings, comments, styles) stays as it was.
+Available rules (see RULES):
+    double_spaces - replace repeated spaces by one (the default)
+    whitespace  - collapse repeated spaces, strip lines, drop empty lines
+    quotes      - straight quotes to typographic quotes for a given language
+    reflow      - break lines longer than max_line_length
+    punctuation - no spaces before punctuation, no doubled punctuation
+    typos       - replace words from a typo map (see load_typo_map())
+
+Can be used as a module (see normalize_subs()) or as a batch program
+which normalizes a whole directory of subtitle files
+or the local store of Amara subtitles in a process pool.
+"""
+import argparse, sys, os, re, glob, gzip, textwrap
+from functools import partial
+
+import subtitles
+from batch import run_batch
+from subtitle_store import SubtitleStore, SUBTITLE_STORE_DIR
+from utils import eprint
+
+# Other rules change what people wrote, so they need to be asked for
+DEFAULT_RULES = ('double_spaces',)
+MAX_LINE_LENGTH = 42
+
+# Opening and closing double quotes, English style is the default
+QUOTES = {
+    'cs': ('„', '“'),
+    'sk': ('„', '“'),
+    'de': ('„', '“'),
+    'pl': ('„', '”'),
+    'bg': ('„', '“'),
+    'fr': ('« ', ' »'),
+    'es': ('«', '»'),
+    'ru': ('«', '»'),
+    'en': ('“', '”'),
+}
+# In French, there is a (non-breaking) space before these
+FRENCH_SPACED_PUNCTUATION = ';:!?'
+
+RULES = {}
+
+def rule(name):
+    """Decorator registering a normalization rule
+
+    Rule is a function rule(text, normalizer) -> text,
+    called for the text of every cue.
+    """
+    def register(func):
+        RULES[name] = func
+        return func
+    return register
+
+
+@rule('double_spaces')
+def replace_double_spaces(text, normalizer):
+    return re.sub(r'  +', ' ', text)
+
+@rule('whitespace')
+def normalize_whitespace(text, normalizer):
+    lines = (re.sub(r'[ \t]+', ' ', line).strip() for line in text.split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+_STRAIGHT_QUOTES_RE = re.compile(r'"([^"\n]*)"')
+_APOSTROPHE_RE = re.compile(r"(\w)'(\w)")
+
+@rule('quotes')
+def typographic_quotes(text, normalizer):
+    opening, closing = QUOTES.get(normalizer.lang, QUOTES['en'])
+    text = _STRAIGHT_QUOTES_RE.sub(
+            lambda m: opening + m.group(1).strip() + closing, text)
+    return _APOSTROPHE_RE.sub('\\1’\\2', text)
+
+@rule('reflow')
+def reflow(text, normalizer):
+    width = normalizer.max_line_length
+    if all(len(line) <= width for line in text.split('\n')):
+        return text
+    words = text.split()
+    one_line = ' '.join(words)
+    if len(one_line) <= 2 * width:
+        # Two lines of similar length look best
+        best = None
+        for i in range(1, len(words)):
+            first, second = ' '.join(words[:i]), ' '.join(words[i:])
+            if len(first) > width or len(second) > width:
+                continue
+            balance = abs(len(first) - len(second))
+            if best is None or balance < best[0]:
+                best = (balance, first + '\n' + second)
+        if best is not None:
+            return best[1]
+    return textwrap.fill(one_line, width = width, break_long_words = False)
+
+@rule('punctuation')
+def normalize_punctuation(text, normalizer):
+    spaced = FRENCH_SPACED_PUNCTUATION if normalizer.lang == 'fr' else ''
+    marks = ''.join(c for c in ',.;:!?' if c not in spaced)
+    # Only before a space or the end of line, so that e.g. "Hello :)" stays
+    text = re.sub(r'[ \t]+([%s])(?=\s|$)' % re.escape(marks), '\\1', text)
+    # Doubled punctuation, but keep ellipsis
+    text = re.sub(r'(?<!\.)\.\.(?!\.)', '.', text)
+    text = re.sub(r',+', ',', text)
+    text = re.sub(r',([.!?])', '\\1', text)
+    return text
+
+@rule('typos')
+def fix_typos(text, normalizer):
+    if normalizer.typos_re is None:
+        return text
+    return normalizer.typos_re.sub(lambda m: normalizer.typos[m.group(0)], text)
+
+
+def load_typo_map(fname):
+    """Reads typo map, one "typo<TAB>correction" per line,
+    lines starting with # are ignored"""
+    typos = {}
+    with open(fname, 'r', encoding = 'utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line.strip() == '' or line.startswith('#'):
+                continue
+            l = line.split('\t')
+            if len(l) != 2:
+                raise ValueError("Invalid line in typo map %s: '%s'" % (fname, line))
+            typos[l[0]] = l[1]
+    return typos
+
+
+class Normalizer:
+    """Applies a sequence of rules to subtitles in a given language
+
+    Instances are picklable, so they can be passed to a process pool.
+    """
+
+    def __init__(self, lang, rules = DEFAULT_RULES, typos = None,
+            max_line_length = MAX_LINE_LENGTH):
+        for name in rules:
+            if name not in RULES:
+                raise ValueError("Unknown normalization rule '%s'" % name)
+        self.lang = lang
+        self.rules = tuple(rules)
+        self.max_line_length = max_line_length
+        self.typos = typos or {}
+        self.typos_re = None
+        if self.typos:
+            # Longest first, so that longer phrases win
+            words = sorted(self.typos, key = len, reverse = True)
+            self.typos_re = re.compile(r'(?<!\w)(?:%s)(?!\w)'
+                    % '|'.join(re.escape(w) for w in words))
+
+    def normalize_text(self, text):
+        for name in self.rules:
+            text = RULES[name](text, self)
+        return text
+
+    def normalize_table(self, table):
+        """Returns (new CueTable, number of changed cues)"""
+        result = table.empty_copy()
+        changed = 0
+        for cue in table:
+            text = self.normalize_text(cue.text)
+            if text != cue.text:
+                changed += 1
+            result.append(*cue._replace(text = text))
+        return result, changed
+
+    def normalize_subs(self, subs, sub_format):
+        """Returns (normalized subtitles, number of changed cues)
+
+        Only the text of changed cues is replaced in the original string,
+        if nothing changed, the original string is returned.
+        Subtitles in other formats than vtt, srt and sbv (e.g. dfxp)
+        only get double spaces removed, if that rule is enabled.
+        Raises subtitles.SubtitleParseError if subtitles cannot be parsed.
+        """
+        if not subtitles.can_replace_texts(sub_format):
+            if 'double_spaces' not in self.rules:
+                return subs, 0
+            new_subs = re.sub(r'  +', ' ', subs)
+            return new_subs, int(new_subs != subs)
+        table = subtitles.parse(subs, sub_format)
+        texts = table.texts()
+        new_texts = [self.normalize_text(text) for text in texts]
+        changed = sum(1 for old, new in zip(texts, new_texts) if old != new)
+        if changed == 0:
+            return subs, 0
+        return subtitles.replace_texts(subs, sub_format, new_texts), changed
+
+
+def normalize_subs(subs, sub_format, lang, rules = DEFAULT_RULES, typos = None):
+    """Shortcut for Normalizer(...).normalize_subs(), returns normalized subtitles"""
+    return Normalizer(lang, rules, typos).normalize_subs(subs, sub_format)[0]
+
+
+def normalize_file(item, normalizer, dry_run = False):
+    """Normalizes one file, item is tuple (input file, output file, sub_format)
+    Returns number of changed cues"""
+    fname, out_fname, sub_format = item
+    with open(fname, 'r', encoding = 'utf-8') as f:
+        subs = f.read()
+    new_subs, changed = normalizer.normalize_subs(subs, sub_format)
+    if dry_run:
+        return changed
+    if changed > 0 or out_fname != fname:
+        os.makedirs(os.path.dirname(os.path.abspath(out_fname)), exist_ok = True)
+        with open(out_fname, 'w', encoding = 'utf-8') as f:
+            f.write(new_subs)
+    return changed
+
+
+def normalize_stored(item, normalizer, dry_run = False):
+    """Normalizes subtitles from the store, item is tuple
+    (gzipped object file, output file, sub_format)"""
+    fname, out_fname, sub_format = item
+    with gzip.open(fname, 'rb') as f:
+        subs = f.read().decode('utf-8')
+    new_subs, changed = normalizer.normalize_subs(subs, sub_format)
+    if not dry_run:
+        os.makedirs(os.path.dirname(os.path.abspath(out_fname)), exist_ok = True)
+        with open(out_fname, 'w', encoding = 'utf-8') as f:
+            f.write(new_subs)
+    return changed
+
+
+def read_cmd():
+   """Function for reading command line options."""
+   desc = "Program for normalizing many subtitle files at once. \
+           Files named <YTID>.<LANG>.<FORMAT> are taken from a directory, \
+           or the latest revisions of subtitles from the local store of Amara subtitles."
+   parser = argparse.ArgumentParser(description=desc)
+   parser.add_argument('-l', '--lang', dest = 'lang', required = True,
+           help='Which language do we normalize?')
+   parser.add_argument('-d', '--dir', dest = 'dirname', default = None,
+           help='Directory with subtitle files')
+   parser.add_argument('--store', dest = 'store_dir', nargs = '?', default = None,
+           const = SUBTITLE_STORE_DIR,
+           help='Normalize subtitles from the local store of Amara subtitles \
+           (files <AMARA_ID>.<LANG>.<FORMAT> are written to --output)')
+   parser.add_argument('-o', '--output', dest = 'out_dir', default = None,
+           help='Output directory (default is to rewrite files in place)')
+   parser.add_argument('--sub-format', dest = 'sub_format', default = None,
+           help='Normalize only files in this format (default is all supported formats)')
+   parser.add_argument('--rules', dest = 'rules', default = ','.join(DEFAULT_RULES),
+           help='Comma separated list of rules, available: %s' % ', '.join(sorted(RULES)))
+   parser.add_argument('--typos', dest = 'typos_fname', default = None,
+           help='Typo map for a given language, "typo<TAB>correction" per line')
+   parser.add_argument('--max-line-length', dest = 'max_line_length', type = int,
+           default = MAX_LINE_LENGTH, help='Maximum line length for the reflow rule')
+   parser.add_argument('-n', '--dry-run', dest = 'dry_run', default = False, action = 'store_true',
+           help='Only report what would be changed')
+   parser.add_argument('-j', '--jobs', dest = 'jobs', type = int, default = os.cpu_count() or 1,
+           help='Number of worker processes')
+   return parser.parse_args()
+
+
+def dir_items(dirname, out_dir, lang, sub_formats):
+    items = []
+    for sub_format in sub_formats:
+        for fname in sorted(glob.glob(os.path.join(dirname, "*.%s.%s" % (lang, sub_format)))):
+            out_fname = fname
+            if out_dir is not None:
+                out_fname = os.path.join(out_dir, os.path.basename(fname))
+            items.append((fname, out_fname, sub_format))
+    return items
+
+
+def store_items(store, out_dir, lang, sub_formats):
+    """Latest stored revision for every Amara video"""
+    latest = {}
+    for record in store.index.values():
+        if record['lang'] != lang or record['sub_format'] not in sub_formats:
+            continue
+        key = (record['amara_id'], record['sub_format'])
+        if key not in latest or latest[key]['version'] < record['version']:
+            latest[key] = record
+    items = []
+    for (amara_id, sub_format), record in sorted(latest.items()):
+        # Without out_dir (dry run) the name is only used in the report
+        out_fname = "%s.%s.%s" % (amara_id, lang, sub_format)
+        if out_dir is not None:
+            out_fname = os.path.join(out_dir, out_fname)
+        items.append((store.object_fname(record['sha256']), out_fname, sub_format))
+    return items
+
+
+if __name__ == '__main__':
+    opts = read_cmd()
+    if (opts.dirname is None) == (opts.store_dir is None):
+        print('Please, set either "--dir" or "--store".')
+        sys.exit(1)
+    if opts.store_dir is not None and opts.out_dir is None and not opts.dry_run:
+        print('Option "--store" requires output directory "--output"')
+        sys.exit(1)
+
+    typos = None
+    if opts.typos_fname is not None:
+        typos = load_typo_map(opts.typos_fname)
+    rules = [r.strip() for r in opts.rules.split(',') if r.strip()]
+    if typos is not None and 'typos' not in rules:
+        rules.append('typos')
+    try:
+        normalizer = Normalizer(opts.lang, rules, typos, opts.max_line_length)
+    except ValueError as e:
+        eprint("ERROR: %s" % e)
+        sys.exit(1)
+
+    sub_formats = subtitles.SUPPORTED_FORMATS
+    if opts.sub_format is not None:
+        sub_formats = (opts.sub_format,)
+
+    if opts.dirname is not None:
+        items = dir_items(opts.dirname, opts.out_dir, opts.lang, sub_formats)
+        func = partial(normalize_file, normalizer = normalizer, dry_run = opts.dry_run)
+    else:
+        store = SubtitleStore(opts.store_dir)
+        items = store_items(store, opts.out_dir, opts.lang, sub_formats)
+        func = partial(normalize_stored, normalizer = normalizer, dry_run = opts.dry_run)
+
+    changed_files = changed_cues = failed = 0
+    for result in run_batch(func, items, jobs = opts.jobs, processes = True):
+        # Object files in the store are not very descriptive
+        fname = result.item[1] if opts.store_dir is not None else result.item[0]
+        if result.error is not None:
+            eprint("ERROR: %s: %s" % (fname, result.error))
+            failed += 1
+            continue
+        if result.value > 0:
+            changed_files += 1
+            changed_cues += result.value
+            print("%s\t%d cues changed" % (fname, result.value))
+
+    eprint("Normalized %d files, %d files changed (%d cues), %d failed"
+            % (len(items), changed_files, changed_cues, failed))
+    if failed > 0:
+        sys.exit(1)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Retiming of subtitles for a video of a different duration
+
+Cue times are mapped piecewise linearly between anchor points
+(time in the source video, time in the target video).
+Without extra anchors, the whole video is stretched linearly,
+i.e. the anchors are (0, 0) and (source duration, target duration).
+Extra anchors help when e.g. only the intro of the new video is longer.
+
+Anchors are written as SOURCE=TARGET, times in seconds or [hh:]mm:ss.ttt,
+e.g. "12.5=15.0" or "1:02.000=1:05.500".
+"""
+import argparse, sys
+from bisect import bisect_right
+
+import subtitles
+
+
+def parse_anchor(s):
+    """Parses 'SOURCE=TARGET' into tuple of times in seconds"""
+    l = s.split('=')
+    if len(l) != 2:
+        raise ValueError("Invalid anchor '%s', expected SOURCE=TARGET" % s)
+    return tuple(_parse_time(t) for t in l)
+
+def _parse_time(t):
+    if ':' in t:
+        return subtitles.parse_timestamp(t)
+    return float(t)
+
+
+def make_anchors(src_duration = None, dst_duration = None, anchors = ()):
+    """Returns sorted list of anchors including the start and end of the videos"""
+    points = dict(anchors)
+    points.setdefault(0.0, 0.0)
+    if src_duration is not None and dst_duration is not None:
+        points.setdefault(float(src_duration), float(dst_duration))
+    points = sorted(points.items())
+    if len(points) < 2:
+        raise ValueError("Retiming needs video durations or at least one anchor")
+    for (s1, d1), (s2, d2) in zip(points, points[1:]):
+        if d2 < d1:
+            raise ValueError("Anchors %g=%g and %g=%g are not in order" % (s1, d1, s2, d2))
+    return points
+
+
+class TimeMap:
+    """Piecewise linear mapping of times between anchor points,
+    times outside the anchors use the nearest segment"""
+
+    def __init__(self, anchors):
+        self.src = [a[0] for a in anchors]
+        self.dst = [a[1] for a in anchors]
+
+    def __call__(self, t):
+        i = min(max(bisect_right(self.src, t) - 1, 0), len(self.src) - 2)
+        s1, s2 = self.src[i], self.src[i+1]
+        d1, d2 = self.dst[i], self.dst[i+1]
+        return max(0.0, d1 + (t - s1) * (d2 - d1) / (s2 - s1))
+
+
+def retime_table(table, anchors):
+    """Returns new CueTable with mapped cue times,
+    everything else (text, cue settings, styles) is kept"""
+    time_map = TimeMap(anchors)
+    result = table.empty_copy()
+    for cue in table:
+        result.append(*cue._replace(start = time_map(cue.start), end = time_map(cue.end)))
+    return result
+
+
+def retime_subs(subs, sub_format, src_duration = None, dst_duration = None, anchors = ()):
+    """Retimes subtitles given as string, returns string in the same format"""
+    anchors = make_anchors(src_duration, dst_duration, anchors)
+    table = retime_table(subtitles.parse(subs, sub_format), anchors)
+    return subtitles.serialize(table, sub_format)
+
+
+def read_cmd():
+   """Function for reading command line options."""
+   desc = "Retime subtitle file for a video of a different duration. " + \
+           "Use 'amara_upload.py -a --retime' to retime subtitles copied between Amara videos."
+   parser = argparse.ArgumentParser(description=desc)
+   parser.add_argument('input_fname', metavar='INPUT_FILE', help='Subtitle file')
+   parser.add_argument('-o', '--output', dest = 'out_fname', required = True,
+           help='Output subtitle file, the format is given by its extension')
+   parser.add_argument('--from-duration', dest = 'src_duration', type = float, default = None,
+           help='Duration of the original video (seconds)')
+   parser.add_argument('--to-duration', dest = 'dst_duration', type = float, default = None,
+           help='Duration of the new video (seconds)')
+   parser.add_argument('-a', '--anchor', dest = 'anchors', action = 'append', default = [],
+           help='Anchor point SOURCE=TARGET, can be given more times')
+   return parser.parse_args()
+
+
+if __name__ == '__main__':
+    opts = read_cmd()
+    try:
+        anchors = make_anchors(opts.src_duration, opts.dst_duration,
+                [parse_anchor(a) for a in opts.anchors])
+        table = subtitles.read_file(opts.input_fname)
+    except (ValueError, subtitles.SubtitleParseError) as e:
+        print("ERROR: %s" % e)
+        sys.exit(1)
+    table = retime_table(table, anchors)
+    if opts.input_fname.rsplit('.', 1)[-1] != opts.out_fname.rsplit('.', 1)[-1]:
+        table = table.without_settings()
+    subtitles.write_file(table, opts.out_fname)
+    print("Retimed %d cues, written to %s" % (len(table), opts.out_fname))
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""Cue-level comparison of two versions of subtitles
+
+Cues are aligned by their text (differences in whitespace are ignored),
+cues that do not match are paired up by overlapping time ranges.
+Every difference is reported as one of
+    added   - cue only in the new version
+    removed - cue only in the old version
+    retimed - same text, different timing
+    restyled - same text and timing, different cue settings (e.g. position)
+    edited  - different text at the same time (timing may differ as well)
+Changes of STYLE and REGION blocks are reported as well (styles_changed).
+
+Example:
+    diff = diff_subs(subs_on_amara, subs_from_youtube, 'vtt')
+    if diff.is_identical():
+        print("Nothing to upload")
+    else:
+        print(diff.summary())
+"""
+import argparse, sys
+from collections import namedtuple, Counter
+from difflib import SequenceMatcher
+
+import subtitles
+
+# Timing differences smaller than this (in seconds) are ignored,
+# formats differ in precision and YouTube rounds times of uploaded captions
+TIME_TOLERANCE = 0.05
+
+CHANGE_KINDS = ('added', 'removed', 'retimed', 'restyled', 'edited')
+
+# old, new - subtitles.Cue or None
+# old_index, new_index - position of the cue in the old/new version or None
+CueChange = namedtuple('CueChange', ['kind', 'old', 'new', 'old_index', 'new_index'])
+
+
+def _text_key(text):
+    return ' '.join(text.split())
+
+def _settings_key(settings):
+    # Order of cue settings does not matter
+    return sorted(settings.split())
+
+
+class SubtitleDiff:
+
+    def __init__(self, changes, old_count, new_count, styles_changed = False):
+        self.changes = changes
+        self.old_count = old_count
+        self.new_count = new_count
+        self.styles_changed = styles_changed
+
+    def is_identical(self):
+        return len(self.changes) == 0 and not self.styles_changed
+
+    def counts(self):
+        """Returns dictionary kind -> number of changes"""
+        counts = Counter(c.kind for c in self.changes)
+        return dict((kind, counts[kind]) for kind in CHANGE_KINDS)
+
+    def summary(self):
+        if self.is_identical():
+            return "identical (%d cues)" % self.new_count
+        counts = self.counts()
+        changes = ["%d %s" % (counts[k], k) for k in CHANGE_KINDS if counts[k]]
+        if self.styles_changed:
+            changes.append("styles changed")
+        return "%d cues -> %d cues: %s" % (self.old_count, self.new_count, ', '.join(changes))
+
+    def format_changes(self, limit = None):
+        """Human readable list of changes, one per line"""
+        lines = []
+        for change in self.changes[:limit]:
+            old, new = change.old, change.new
+            if change.kind == 'added':
+                lines.append("+ %s %s" % (_format_time(new), _text_key(new.text)))
+            elif change.kind == 'removed':
+                lines.append("- %s %s" % (_format_time(old), _text_key(old.text)))
+            elif change.kind == 'retimed':
+                lines.append("~ %s -> %s %s" % (_format_time(old), _format_time(new),
+                    _text_key(new.text)))
+            elif change.kind == 'restyled':
+                lines.append("* %s '%s' -> '%s' %s" % (_format_time(new), old.settings,
+                    new.settings, _text_key(new.text)))
+            else:
+                lines.append("! %s %s\n  %s %s" % (_format_time(old), _text_key(old.text),
+                    _format_time(new), _text_key(new.text)))
+        if limit is not None and len(self.changes) > limit:
+            lines.append("... and %d more changes" % (len(self.changes) - limit))
+        return '\n'.join(lines)
+
+
+def _format_time(cue):
+    return "[%s --> %s]" % (subtitles.format_timestamp(cue.start),
+            subtitles.format_timestamp(cue.end))
+
+
+def _same_timing(old, new, tolerance):
+    return abs(old.start - new.start) <= tolerance and abs(old.end - new.end) <= tolerance
+
+
+def _overlap(old, new):
+    return min(old.end, new.end) - max(old.start, new.start)
+
+
+def _pair_by_time(old_table, new_table, i1, i2, j1, j2, changes):
+    """Pairs up cues with different text in old[i1:i2] and new[j1:j2]"""
+    i, j = i1, j1
+    while i < i2 and j < j2:
+        old, new = old_table[i], new_table[j]
+        if _overlap(old, new) > 0:
+            changes.append(CueChange('edited', old, new, i, j))
+            i += 1
+            j += 1
+        elif old.start <= new.start:
+            changes.append(CueChange('removed', old, None, i, None))
+            i += 1
+        else:
+            changes.append(CueChange('added', None, new, None, j))
+            j += 1
+    for i in range(i, i2):
+        changes.append(CueChange('removed', old_table[i], None, i, None))
+    for j in range(j, j2):
+        changes.append(CueChange('added', None, new_table[j], None, j))
+
+
+def diff_tables(old_table, new_table, tolerance = TIME_TOLERANCE):
+    """Compares two CueTables, returns SubtitleDiff"""
+    old_keys = [_text_key(t) for t in old_table.texts()]
+    new_keys = [_text_key(t) for t in new_table.texts()]
+    changes = []
+    matcher = SequenceMatcher(None, old_keys, new_keys, autojunk = False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            for i, j in zip(range(i1, i2), range(j1, j2)):
+                old, new = old_table[i], new_table[j]
+                if not _same_timing(old, new, tolerance):
+                    changes.append(CueChange('retimed', old, new, i, j))
+                elif _settings_key(old.settings) != _settings_key(new.settings):
+                    changes.append(CueChange('restyled', old, new, i, j))
+        else:
+            _pair_by_time(old_table, new_table, i1, i2, j1, j2, changes)
+    # Header metadata (e.g. 'Kind: captions') and NOTE comments do not
+    # change how subtitles look, so they are not compared
+    styles_changed = old_table.style_blocks() != new_table.style_blocks()
+    return SubtitleDiff(changes, len(old_table), len(new_table), styles_changed)
+
+
+def diff_subs(old_subs, new_subs, sub_format = None, new_format = None,
+        tolerance = TIME_TOLERANCE):
+    """Compares two versions of subtitles given as strings (or bytes)
+
+    sub_format  - format of the old subtitles, guessed if None
+    new_format  - format of the new subtitles, default is sub_format
+    Raises subtitles.SubtitleParseError if they cannot be parsed.
+    """
+    if isinstance(old_subs, bytes):
+        old_subs = old_subs.decode('utf-8')
+    if isinstance(new_subs, bytes):
+        new_subs = new_subs.decode('utf-8')
+    if new_format is None:
+        new_format = sub_format
+    return diff_tables(subtitles.parse(old_subs, sub_format),
+            subtitles.parse(new_subs, new_format), tolerance)
+
+
+def read_cmd():
+   """Function for reading command line options."""
+   desc = "Compare two subtitle files cue by cue."
+   parser = argparse.ArgumentParser(description=desc)
+   parser.add_argument('old_fname', metavar='OLD_FILE', help='Old version of subtitles')
+   parser.add_argument('new_fname', metavar='NEW_FILE', help='New version of subtitles')
+   parser.add_argument('-t', '--tolerance', dest = 'tolerance', type = float, default = TIME_TOLERANCE,
+           help='Ignore timing differences smaller than this (seconds)')
+   parser.add_argument('-q', '--quiet', dest = 'quiet', default = False, action = 'store_true',
+           help='Print only the summary')
+   return parser.parse_args()
+
+
+if __name__ == '__main__':
+    opts = read_cmd()
+    try:
+        old_table = subtitles.read_file(opts.old_fname)
+        new_table = subtitles.read_file(opts.new_fname)
+    except (subtitles.SubtitleParseError, ValueError) as e:
+        print("ERROR: %s" % e)
+        sys.exit(1)
+    diff = diff_tables(old_table, new_table, opts.tolerance)
+    if not opts.quiet and not diff.is_identical():
+        print(diff.format_changes())
+    print(diff.summary())
+    # Like diff(1), exit status 1 means that the files differ
+    sys.exit(0 if diff.is_identical() else 1)
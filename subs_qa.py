@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""Timing QA of many subtitle tracks at once
+
+All tracks are loaded into NumPy arrays of cue start/end times and
+character counts, so the checks below run over the whole corpus at once:
+    overlap      - cue starts before the previous one ended
+    short_gap    - gap between cues is too short to notice (flicker)
+    zero_length  - cue ends before or when it starts
+    high_cps     - more characters per second than people can read
+    past_video   - cue ends after the end of the video
+                   (needs durations from list_many_videos, see --durations)
+
+Example:
+    ./subs_qa.py -l cs -d subs --durations videos.tsv -o qa.json
+"""
+import argparse, sys, os, glob, json
+from array import array
+
+import subtitles
+from batch import run_batch
+from utils import eprint
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CHECKS = ('overlap', 'short_gap', 'zero_length', 'high_cps', 'past_video')
+
+# Characters per second, readable for most adults
+MAX_CPS = 21.0
+# Two frames at 24 fps
+MIN_GAP = 0.083
+# Subtitle times are rounded to milliseconds
+TIME_TOLERANCE = 0.001
+# Video durations from YouTube are in whole seconds
+DURATION_TOLERANCE = 1.0
+# Problematic cues listed per track and check in the report
+MAX_EXAMPLES = 5
+
+
+def load_track(fname, sub_format = None):
+    """Returns (starts, ends, char counts) of a subtitle file as arrays
+
+    Line breaks do not count as characters.
+    """
+    table = subtitles.read_file(fname, sub_format)
+    chars = array('L', (len(text) - text.count('\n') for text in table.texts()))
+    return table.starts, table.ends, chars
+
+
+def read_durations(fname):
+    """Reads video durations from TSV printed by
+    ./api/youtube_oauth.py --action list_many_videos --videoids-file ytids.txt
+    Returns dictionary YTID -> duration in seconds"""
+    durations = {}
+    with open(fname, 'r') as f:
+        header = f.readline().rstrip('\n').split('\t')
+        try:
+            id_col = header.index('video_id')
+            duration_col = header.index('duration')
+        except ValueError:
+            raise ValueError("File %s does not have columns 'video_id' and 'duration'" % fname)
+        for line in f:
+            l = line.rstrip('\n').split('\t')
+            if len(l) <= max(id_col, duration_col):
+                continue
+            durations[l[id_col]] = float(l[duration_col])
+    return durations
+
+
+class Corpus:
+    """Cues of many tracks concatenated into NumPy arrays
+
+    Cues of track k are starts[offsets[k]:offsets[k+1]] etc.
+    track[i] is the index of the track of cue i.
+    """
+
+    def __init__(self, names, tracks, video_durations = None):
+        if np is None:
+            raise ImportError("numpy module is needed for subtitle QA")
+        self.names = list(names)
+        lengths = np.array([len(t[0]) for t in tracks], dtype = np.int64)
+        self.offsets = np.concatenate(([0], np.cumsum(lengths)))
+        # Arrays from the array module are buffers, no copying per cue
+        self.starts = _concat([np.frombuffer(t[0], dtype = np.float64) for t in tracks], np.float64)
+        self.ends = _concat([np.frombuffer(t[1], dtype = np.float64) for t in tracks], np.float64)
+        self.chars = _concat([np.array(t[2], dtype = np.int64) for t in tracks], np.int64)
+        self.track = np.repeat(np.arange(len(tracks)), lengths)
+        # NaN where the video duration is not known
+        self.video_durations = np.full(len(tracks), np.nan)
+        if video_durations is not None:
+            self.video_durations[:] = video_durations
+
+    def __len__(self):
+        return len(self.names)
+
+    def check(self, max_cps = MAX_CPS, min_gap = MIN_GAP):
+        """Returns dictionary check -> boolean array over all cues"""
+        self.max_cps, self.min_gap = max_cps, min_gap
+        durations = self.ends - self.starts
+        problems = {}
+        problems['zero_length'] = durations <= TIME_TOLERANCE
+
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            cps = np.where(durations > 0, self.chars / durations, np.inf)
+        problems['high_cps'] = (cps > max_cps) & ~problems['zero_length']
+
+        # Gap before every cue, only within the same track
+        gaps = np.full(len(self.starts), np.inf)
+        same_track = self.track[1:] == self.track[:-1]
+        gaps[1:] = np.where(same_track, self.starts[1:] - self.ends[:-1], np.inf)
+        problems['overlap'] = gaps < -TIME_TOLERANCE
+        problems['short_gap'] = (gaps > TIME_TOLERANCE) & (gaps < min_gap)
+
+        video_durations = self.video_durations[self.track]
+        with np.errstate(invalid = 'ignore'):
+            problems['past_video'] = self.ends > video_durations + DURATION_TOLERANCE
+
+        self.cps = cps
+        self.gaps = gaps
+        return problems
+
+    def report(self, problems, max_examples = MAX_EXAMPLES):
+        """Returns machine-readable report as a dictionary"""
+        n = len(self)
+        counts = dict((c, np.bincount(self.track[problems[c]], minlength = n)) for c in CHECKS)
+        finite_cps = np.where(np.isfinite(self.cps), self.cps, 0.0)
+        max_cps = np.zeros(n)
+        if len(self.track):
+            np.maximum.at(max_cps, self.track, finite_cps)
+        any_problem = np.zeros(n, dtype = bool)
+        for c in CHECKS:
+            any_problem |= counts[c] > 0
+
+        tracks = []
+        for k in np.nonzero(any_problem)[0]:
+            first, last = self.offsets[k], self.offsets[k+1]
+            track = {
+                'name': self.names[k],
+                'cues': int(last - first),
+                'video_duration': None if np.isnan(self.video_durations[k])
+                    else float(self.video_durations[k]),
+                'max_cps': round(float(max_cps[k]), 1),
+                'problems': dict((c, int(counts[c][k])) for c in CHECKS if counts[c][k]),
+                'examples': [],
+            }
+            for c in CHECKS:
+                for i in np.nonzero(problems[c][first:last])[0][:max_examples]:
+                    i = int(i)
+                    track['examples'].append({
+                        'check': c,
+                        'cue': i,
+                        'start': float(self.starts[first + i]),
+                        'end': float(self.ends[first + i]),
+                    })
+            tracks.append(track)
+
+        return {
+            'settings': {
+                'max_cps': self.max_cps,
+                'min_gap': self.min_gap,
+            },
+            'summary': {
+                'tracks': n,
+                'cues': int(len(self.starts)),
+                'tracks_with_problems': int(any_problem.sum()),
+                'problems': dict((c, int(problems[c].sum())) for c in CHECKS),
+            },
+            'tracks': tracks,
+        }
+
+
+def _concat(arrays, dtype):
+    if len(arrays) == 0:
+        return np.zeros(0, dtype = dtype)
+    return np.concatenate(arrays)
+
+
+def check_subs(subs, sub_format, video_duration = None):
+    """QA of a single track given as string,
+    returns dictionary check -> number of problematic cues"""
+    table = subtitles.parse(subs, sub_format)
+    chars = array('L', (len(text) - text.count('\n') for text in table.texts()))
+    durations = None if video_duration is None else [video_duration]
+    corpus = Corpus(['subs'], [(table.starts, table.ends, chars)], durations)
+    problems = corpus.check()
+    return dict((c, int(problems[c].sum())) for c in CHECKS if problems[c].any())
+
+
+def read_cmd():
+   """Function for reading command line options."""
+   desc = "Timing QA of subtitles. Checks overlapping and zero-length cues, \
+           too short gaps, characters per second and cues after the end of the video \
+           for all files <YTID>.<LANG>.<FORMAT> in a directory."
+   parser = argparse.ArgumentParser(description=desc)
+   parser.add_argument('files', metavar='FILE', nargs='*', help='Subtitle files (instead of --dir)')
+   parser.add_argument('-l', '--lang', dest = 'lang', default = None,
+           help='Check only subtitles in this language')
+   parser.add_argument('-d', '--dir', dest = 'dirname', default = None,
+           help='Directory with subtitle files, e.g. from download_subs.py')
+   parser.add_argument('--durations', dest = 'durations_fname', default = None,
+           help='Video durations, TSV output of "./api/youtube_oauth.py --action list_many_videos"')
+   parser.add_argument('--max-cps', dest = 'max_cps', type = float, default = MAX_CPS,
+           help='Maximum characters per second')
+   parser.add_argument('--min-gap', dest = 'min_gap', type = float, default = MIN_GAP,
+           help='Minimum gap between cues (seconds)')
+   parser.add_argument('-o', '--output', dest = 'out_fname', default = '-',
+           help='JSON report (default is stdout)')
+   parser.add_argument('-j', '--jobs', dest = 'jobs', type = int, default = os.cpu_count() or 1,
+           help='Number of processes parsing the files')
+   return parser.parse_args()
+
+
+def list_files(dirname, lang):
+    files = []
+    for fname in sorted(glob.glob(os.path.join(dirname, '*.*.*'))):
+        l = os.path.basename(fname).split('.')
+        if not subtitles.is_supported(l[-1]):
+            continue
+        if lang is not None and l[-2] != lang:
+            continue
+        files.append(fname)
+    return files
+
+
+if __name__ == '__main__':
+    opts = read_cmd()
+    if np is None:
+        eprint("ERROR: Subtitle QA needs numpy, please install it (pip install numpy)")
+        sys.exit(1)
+
+    files = list(opts.files)
+    if opts.dirname is not None:
+        files += list_files(opts.dirname, opts.lang)
+    if len(files) == 0:
+        eprint("ERROR: No subtitle files to check")
+        sys.exit(1)
+
+    durations = {}
+    if opts.durations_fname is not None:
+        durations = read_durations(opts.durations_fname)
+
+    names, tracks, video_durations = [], [], []
+    failed = []
+    for result in run_batch(load_track, files, jobs = opts.jobs, processes = True):
+        if result.error is not None:
+            eprint("ERROR: %s: %s" % (result.item, result.error))
+            failed.append(result.item)
+            continue
+        names.append(result.item)
+        tracks.append(result.value)
+        ytid = os.path.basename(result.item).split('.')[0]
+        video_durations.append(durations.get(ytid, np.nan))
+
+    corpus = Corpus(names, tracks, video_durations)
+    problems = corpus.check(opts.max_cps, opts.min_gap)
+    report = corpus.report(problems)
+    report['failed'] = failed
+
+    if opts.out_fname == '-':
+        json.dump(report, sys.stdout, indent = 1)
+        print()
+    else:
+        with open(opts.out_fname, 'w') as f:
+            json.dump(report, f, indent = 1)
+
+    summary = report['summary']
+    eprint("Checked %d tracks (%d cues), %d tracks with problems, %d files could not be parsed"
+            % (summary['tracks'], summary['cues'], summary['tracks_with_problems'], len(failed)))
+    for c in CHECKS:
+        eprint("%12s: %d cues" % (c, summary['problems'][c]))
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+import os, json, gzip, hashlib, threading, time
+
+# Default location of the store, next to the Amara video cache
+SUBTITLE_STORE_DIR = os.path.join(os.environ.get('KSTOOLS_CACHE_DIR',
+        os.path.abspath(os.path.join(os.path.dirname(__file__), "CACHE"))), "subtitles")
+
+class SubtitleStore:
+    """Local content-addressed store of subtitles downloaded from Amara
+
+    Subtitles are keyed by (amara_id, lang, version_number, sub_format).
+    Their content is stored gzipped under its SHA-256 hash,
+    so identical subtitles (e.g. the same revision in different videos)
+    are stored only once. The index is an append-only file with one JSON
+    record per line, the last record for a given key wins.
+
+    Layout:
+        <dirname>/index.jsonl
+        <dirname>/objects/<first two hex digits>/<sha256>.gz
+    """
+
+    INDEX_FNAME = 'index.jsonl'
+
+    def __init__(self, dirname = SUBTITLE_STORE_DIR):
+        self.dirname = dirname
+        self.index_fname = os.path.join(dirname, self.INDEX_FNAME)
+        self.lock = threading.Lock()
+        self.index = {}
+        os.makedirs(os.path.join(dirname, 'objects'), exist_ok = True)
+        self._load_index()
+
+    def _key(self, amara_id, lang, version, sub_format):
+        return "%s/%s/%s/%d" % (amara_id, lang, sub_format, version)
+
+    def object_fname(self, digest):
+        return os.path.join(self.dirname, 'objects', digest[:2], digest + '.gz')
+
+    def _load_index(self):
+        if not os.path.isfile(self.index_fname):
+            return
+        with open(self.index_fname, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Truncated last line after a crash
+                    continue
+                self.index[record['key']] = record
+
+    def has(self, amara_id, lang, version, sub_format):
+        key = self._key(amara_id, lang, version, sub_format)
+        with self.lock:
+            record = self.index.get(key)
+        return record is not None \
+                and os.path.isfile(self.object_fname(record['sha256']))
+
+    def get(self, amara_id, lang, version, sub_format):
+        """Returns stored subtitles or None"""
+        key = self._key(amara_id, lang, version, sub_format)
+        with self.lock:
+            record = self.index.get(key)
+        if record is None:
+            return None
+        try:
+            with gzip.open(self.object_fname(record['sha256']), 'rb') as f:
+                return f.read().decode('utf-8')
+        except FileNotFoundError:
+            return None
+
+    def put(self, amara_id, lang, version, sub_format, subs):
+        """Stores subtitles, returns their SHA-256 hash"""
+        data = subs.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        fname = self.object_fname(digest)
+        if not os.path.isfile(fname):
+            os.makedirs(os.path.dirname(fname), exist_ok = True)
+            # Write to temporary file first so that we never
+            # leave a half-written object behind
+            tmp_fname = "%s.%d.%d.tmp" % (fname, os.getpid(), threading.get_ident())
+            with gzip.open(tmp_fname, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_fname, fname)
+
+        record = {
+            'key': self._key(amara_id, lang, version, sub_format),
+            'amara_id': amara_id,
+            'lang': lang,
+            'version': version,
+            'sub_format': sub_format,
+            'sha256': digest,
+            'size': len(data),
+            'stored_at': time.time(),
+        }
+        with self.lock:
+            self.index[record['key']] = record
+            with open(self.index_fname, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        return digest
+
+    def fetch(self, amara, amara_id, lang, version, sub_format):
+        """Returns subtitles from the store, downloading them from Amara
+        only if we do not have the given version yet.
+
+        amara - instance of Amara class
+        version - subtitle revision as reported by amara.check_language()
+        """
+        subs = self.get(amara_id, lang, version, sub_format)
+        if subs is not None:
+            return subs
+        subs = amara.download_subs(amara_id, lang, sub_format)
+        self.put(amara_id, lang, version, sub_format, subs)
+        return subs
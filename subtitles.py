@@ -0,0 +1,603 @@
+#!/usr/bin/env python3
+"""Parsing and serialization of subtitles in VTT, SRT, SBV and DFXP formats
+
+Subtitles are kept in a CueTable, where start and end times
+are stored in numeric arrays and the text of all cues in one string,
+so that even large numbers of tracks take little memory
+and can be processed quickly.
+
+VTT cue identifiers and cue settings (e.g. 'align:start position:10%'),
+the header and NOTE/STYLE/REGION blocks are kept as well,
+so that parsing and serializing VTT does not lose anything.
+
+Example:
+    cues = parse(subs, 'vtt')
+    srt = serialize(cues, 'srt')
+    # or simply
+    srt = convert(subs, 'vtt', 'srt')
+"""
+import sys, re
+from array import array
+from collections import namedtuple
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+SUPPORTED_FORMATS = ('vtt', 'srt', 'sbv', 'dfxp')
+
+# start, end - in seconds
+# ident    - cue identifier (VTT, DFXP xml:id), '' if none
+# settings - text after the timestamps, '' if none; its syntax depends on the format
+#            (VTT cue settings like 'align:start', SRT coordinates like 'X1:40 X2:600'),
+#            so it is dropped when converting between formats
+Cue = namedtuple('Cue', ['start', 'end', 'text', 'ident', 'settings'])
+Cue.__new__.__defaults__ = ('', '')
+
+
+class SubtitleParseError(ValueError):
+    pass
+
+
+class _StringPool:
+    """Many strings stored in one, string i is pool[starts[i]:ends[i]]"""
+
+    def __init__(self):
+        self.starts = array('L')
+        self.ends = array('L')
+        self._pool = ''
+        # Strings appended since the pool was last joined
+        self._pending = []
+        self._length = 0
+
+    def append(self, s):
+        self.starts.append(self._length)
+        self._pending.append(s)
+        self._length += len(s)
+        self.ends.append(self._length)
+
+    @property
+    def pool(self):
+        if self._pending:
+            self._pool += ''.join(self._pending)
+            self._pending = []
+        return self._pool
+
+    def __getitem__(self, i):
+        return self.pool[self.starts[i]:self.ends[i]]
+
+    def all(self):
+        pool = self.pool
+        return [pool[s:e] for s, e in zip(self.starts, self.ends)]
+
+
+class CueTable:
+    """Subtitle cues stored in parallel arrays
+
+    starts, ends - array('d') of cue times in seconds
+    Text, identifiers and settings of all cues are stored
+    in three string pools (see _StringPool).
+
+    header - VTT header block (e.g. 'WEBVTT\\nKind: captions'), None if not known
+    blocks - list of (cue index, block) for NOTE/STYLE/REGION blocks,
+             which precede the cue with the given index
+    """
+
+    def __init__(self):
+        self.starts = array('d')
+        self.ends = array('d')
+        self._texts = _StringPool()
+        self._idents = _StringPool()
+        self._settings = _StringPool()
+        self.header = None
+        self.blocks = []
+
+    @classmethod
+    def from_cues(cls, cues):
+        table = cls()
+        for cue in cues:
+            table.append(*cue)
+        return table
+
+    def empty_copy(self):
+        """Returns table without cues, but with the same header and blocks"""
+        table = CueTable()
+        table.header = self.header
+        table.blocks = list(self.blocks)
+        return table
+
+    def without_settings(self):
+        """Returns copy of the table without cue settings,
+        for serializing in a format with a different syntax of settings"""
+        table = self.empty_copy()
+        for cue in self:
+            table.append(*cue._replace(settings = ''))
+        return table
+
+    def append(self, start, end, text, ident = '', settings = ''):
+        self.starts.append(start)
+        self.ends.append(end)
+        self._texts.append(text)
+        self._idents.append(ident)
+        self._settings.append(settings)
+
+    def add_block(self, block):
+        """Adds NOTE/STYLE/REGION block after the cues appended so far"""
+        self.blocks.append((len(self), block))
+
+    def style_blocks(self):
+        """STYLE and REGION blocks, i.e. the ones that change how cues look"""
+        return [b for i, b in self.blocks if not b.startswith('NOTE')]
+
+    def text(self, i):
+        return self._texts[i]
+
+    def texts(self):
+        return self._texts.all()
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, i):
+        return Cue(self.starts[i], self.ends[i], self._texts[i],
+                self._idents[i], self._settings[i])
+
+    def __iter__(self):
+        texts, idents, settings = self._texts.all(), self._idents.all(), self._settings.all()
+        for i in range(len(self.starts)):
+            yield Cue(self.starts[i], self.ends[i], texts[i], idents[i], settings[i])
+
+    def __eq__(self, other):
+        if not isinstance(other, CueTable):
+            return NotImplemented
+        return list(self) == list(other) and self.blocks == other.blocks \
+                and (self.header or 'WEBVTT') == (other.header or 'WEBVTT')
+
+    def copy(self):
+        table = self.empty_copy()
+        for cue in self:
+            table.append(*cue)
+        return table
+
+    def duration(self):
+        """End of the last cue (seconds)"""
+        return max(self.ends) if len(self) else 0.0
+
+    def validate(self):
+        """Returns list of (cue index, problem) for broken timing"""
+        problems = []
+        for i in range(len(self)):
+            if self.starts[i] < 0:
+                problems.append((i, 'negative start time'))
+            if self.ends[i] <= self.starts[i]:
+                problems.append((i, 'cue ends before it starts'))
+            if i > 0 and self.starts[i] < self.starts[i-1]:
+                problems.append((i, 'cue starts before the previous one'))
+        return problems
+
+
+########## Timestamps ##########
+
+# [hh:]mm:ss.ttt (VTT) or hh:mm:ss,ttt (SRT) or h:mm:ss.ttt (SBV)
+_CLOCK_RE = re.compile(r'^(?:(\d+):)?(\d{1,2}):(\d{1,2})(?:[.,](\d{1,3}))?$')
+
+def parse_timestamp(s):
+    m = _CLOCK_RE.match(s.strip())
+    if m is None:
+        raise SubtitleParseError("Invalid timestamp '%s'" % s)
+    hours, minutes, seconds, fraction = m.groups()
+    t = int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)
+    if fraction:
+        t += int(fraction.ljust(3, '0')) / 1000.0
+    return t
+
+def format_timestamp(t, sep = '.', short_hours = False):
+    """Formats seconds as hh:mm:ss.ttt (or h:mm:ss.ttt with short_hours)"""
+    ms = int(round(t * 1000))
+    if ms < 0:
+        ms = 0
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    if short_hours:
+        return "%d:%02d:%02d%s%03d" % (hours, minutes, seconds, sep, ms)
+    return "%02d:%02d:%02d%s%03d" % (hours, minutes, seconds, sep, ms)
+
+
+########## Line-based formats ##########
+
+# Scanners below split a file into lines and yield what is where,
+# as indexes of lines, so that the same code serves both for parsing
+# and for editing cue text in place (see replace_texts()):
+#   ('header', [line indexes])
+#   ('block', [line indexes])                 NOTE/STYLE/REGION
+#   ('cue', ident, timing line index, [text line indexes])
+
+def _split_lines(text):
+    """Returns list of lines with their line endings"""
+    return text.lstrip('﻿').splitlines(keepends = True)
+
+def _line(lines, i):
+    return lines[i].rstrip('\r\n').rstrip()
+
+def _line_blocks(lines):
+    """Groups indexes of non-empty lines into blocks separated by empty lines"""
+    block = []
+    for i in range(len(lines)):
+        if _line(lines, i).strip() == '':
+            if block:
+                yield block
+                block = []
+        else:
+            block.append(i)
+    if block:
+        yield block
+
+# Timestamps and optional settings after them
+_TIMING_RE = re.compile(r'^\s*(\S+)\s+-->\s+(\S+)\s*(.*)$')
+
+def _scan_vtt(lines):
+    blocks = _line_blocks(lines)
+    header = next(blocks, None)
+    if header is None or not _line(lines, header[0]).startswith('WEBVTT'):
+        raise SubtitleParseError("Missing WEBVTT header")
+    # Header may be directly followed by the first cue
+    for k, i in enumerate(header):
+        if '-->' in _line(lines, i):
+            yield ('header', header[:k])
+            yield ('cue', '', i, header[k+1:])
+            break
+    else:
+        yield ('header', header)
+
+    for block in blocks:
+        first = _line(lines, block[0])
+        if first.startswith(('NOTE', 'STYLE', 'REGION')) \
+                and not any('-->' in _line(lines, i) for i in block):
+            yield ('block', block)
+            continue
+        # Optional cue identifier
+        ident = ''
+        if '-->' not in first:
+            ident = first
+            block = block[1:]
+        if not block:
+            continue
+        yield ('cue', ident, block[0], block[1:])
+
+def _scan_srt(lines):
+    for block in _line_blocks(lines):
+        # Cue number is optional in practice
+        if '-->' not in _line(lines, block[0]):
+            block = block[1:]
+        if not block:
+            continue
+        yield ('cue', '', block[0], block[1:])
+
+def _scan_sbv(lines):
+    for block in _line_blocks(lines):
+        yield ('cue', '', block[0], block[1:])
+
+def _parse_arrow_timing(line, sub_format):
+    m = _TIMING_RE.match(line)
+    if m is None:
+        raise SubtitleParseError("Invalid %s cue timing '%s'" % (sub_format.upper(), line))
+    return parse_timestamp(m.group(1)), parse_timestamp(m.group(2)), m.group(3)
+
+def _parse_sbv_timing(line, sub_format):
+    times = line.split(',')
+    if len(times) != 2:
+        raise SubtitleParseError("Invalid SBV cue timing '%s'" % line)
+    return parse_timestamp(times[0]), parse_timestamp(times[1]), ''
+
+def _parse_lines(text, scan, parse_timing, sub_format):
+    lines = _split_lines(text)
+    table = CueTable()
+    for item in scan(lines):
+        if item[0] == 'header':
+            table.header = '\n'.join(_line(lines, i) for i in item[1])
+        elif item[0] == 'block':
+            table.add_block('\n'.join(_line(lines, i) for i in item[1]))
+        else:
+            _, ident, timing, text_lines = item
+            start, end, settings = parse_timing(_line(lines, timing), sub_format)
+            table.append(start, end, '\n'.join(_line(lines, i) for i in text_lines),
+                    ident, settings)
+    return table
+
+
+_SCANNERS = {
+    'vtt': _scan_vtt,
+    'srt': _scan_srt,
+    'sbv': _scan_sbv,
+}
+
+def replace_texts(text, sub_format, texts):
+    """Returns subtitles with the text of cue i replaced by texts[i]
+
+    Everything else (timing lines, identifiers, comments, line endings)
+    is kept exactly as it was, only lines with changed text are rewritten.
+    Works only for line-based formats (vtt, srt, sbv).
+    """
+    sub_format = _format(sub_format)
+    if sub_format not in _SCANNERS:
+        raise ValueError("Cannot edit %s subtitles in place" % sub_format)
+    bom = '\ufeff' if text.startswith('\ufeff') else ''
+    lines = _split_lines(text)
+    # Line index -> lines that replace it
+    replaced = {}
+    k = 0
+    for item in _SCANNERS[sub_format](lines):
+        if item[0] != 'cue':
+            continue
+        if k >= len(texts):
+            raise ValueError("Less texts than cues")
+        _, ident, timing, text_lines = item
+        new_text = texts[k]
+        k += 1
+        if new_text == '\n'.join(_line(lines, i) for i in text_lines):
+            continue
+        eol = lines[timing][len(lines[timing].rstrip('\r\n')):] or '\n'
+        # Empty line would end the cue
+        new_lines = [l + eol for l in new_text.split('\n') if l.strip()]
+        if text_lines:
+            last = lines[text_lines[-1]]
+            if new_lines and not last.endswith(('\n', '\r')):
+                new_lines[-1] = new_lines[-1].rstrip('\r\n')
+            replaced[text_lines[0]] = ''.join(new_lines)
+            for i in text_lines[1:]:
+                replaced[i] = ''
+        else:
+            if not lines[timing].endswith(('\n', '\r')):
+                new_lines.insert(0, '\n')
+            replaced[timing] = lines[timing] + ''.join(new_lines)
+    if k != len(texts):
+        raise ValueError("More texts than cues")
+    return bom + ''.join(replaced.get(i, line) for i, line in enumerate(lines))
+
+
+########## WebVTT ##########
+
+def parse_vtt(text):
+    return _parse_lines(text, _scan_vtt, _parse_arrow_timing, 'vtt')
+
+def serialize_vtt(table):
+    out = [(table.header or 'WEBVTT') + '\n']
+    blocks = list(table.blocks)
+    for i, cue in enumerate(table):
+        while blocks and blocks[0][0] <= i:
+            out.append(blocks.pop(0)[1] + '\n')
+        timing = "%s --> %s" % (format_timestamp(cue.start), format_timestamp(cue.end))
+        if cue.settings:
+            timing += ' ' + cue.settings
+        if cue.ident:
+            timing = cue.ident + '\n' + timing
+        out.append("%s\n%s\n" % (timing, cue.text))
+    for _, block in blocks:
+        out.append(block + '\n')
+    return '\n'.join(out)
+
+
+########## SubRip ##########
+
+def parse_srt(text):
+    return _parse_lines(text, _scan_srt, _parse_arrow_timing, 'srt')
+
+def serialize_srt(table):
+    out = []
+    for i, cue in enumerate(table):
+        timing = "%s --> %s" % (format_timestamp(cue.start, ','), format_timestamp(cue.end, ','))
+        if cue.settings:
+            timing += ' ' + cue.settings
+        out.append("%d\n%s\n%s\n" % (i + 1, timing, cue.text))
+    return '\n'.join(out)
+
+
+########## SBV (YouTube) ##########
+
+def parse_sbv(text):
+    return _parse_lines(text, _scan_sbv, _parse_sbv_timing, 'sbv')
+
+def serialize_sbv(table):
+    out = []
+    for cue in table:
+        out.append("%s,%s\n%s\n" % (format_timestamp(cue.start, short_hours = True),
+            format_timestamp(cue.end, short_hours = True), cue.text))
+    return '\n'.join(out)
+
+
+########## DFXP / TTML ##########
+
+TTML_NS = 'http://www.w3.org/ns/ttml'
+TTML_PARAMETER_NS = 'http://www.w3.org/ns/ttml#parameter'
+XML_ID = '{http://www.w3.org/XML/1998/namespace}id'
+_OFFSET_TIME_RE = re.compile(r'^([\d.]+)(h|m|s|ms|f|t)$')
+
+def _parse_ttml_time(s, tick_rate, frame_rate):
+    s = s.strip()
+    m = _OFFSET_TIME_RE.match(s)
+    if m is not None:
+        value, unit = float(m.group(1)), m.group(2)
+        return {
+            'h': value * 3600,
+            'm': value * 60,
+            's': value,
+            'ms': value / 1000.0,
+            'f': value / frame_rate,
+            't': value / tick_rate,
+        }[unit]
+    # hh:mm:ss:frames
+    parts = s.split(':')
+    if len(parts) == 4:
+        h, m, sec, frames = parts
+        return int(h) * 3600 + int(m) * 60 + float(sec) + float(frames) / frame_rate
+    return parse_timestamp(s)
+
+def _ttml_text(elem):
+    """Text of a <p> element, <br/> as a newline"""
+    parts = [elem.text or '']
+    for child in elem:
+        if child.tag.split('}')[-1] == 'br':
+            parts.append('\n')
+        else:
+            parts.append(_ttml_text(child))
+        parts.append(child.tail or '')
+    return ''.join(parts)
+
+def parse_dfxp(text):
+    try:
+        root = ElementTree.fromstring(text.lstrip('﻿').encode('utf-8'))
+    except ElementTree.ParseError as e:
+        raise SubtitleParseError("Invalid DFXP: %s" % e)
+    tick_rate = float(root.get('{%s}tickRate' % TTML_PARAMETER_NS, 10000000))
+    frame_rate = float(root.get('{%s}frameRate' % TTML_PARAMETER_NS, 30))
+
+    table = CueTable()
+    for elem in root.iter():
+        if elem.tag.split('}')[-1] != 'p':
+            continue
+        begin = elem.get('begin')
+        if begin is None:
+            raise SubtitleParseError("DFXP paragraph without 'begin' attribute")
+        start = _parse_ttml_time(begin, tick_rate, frame_rate)
+        if elem.get('end') is not None:
+            end = _parse_ttml_time(elem.get('end'), tick_rate, frame_rate)
+        elif elem.get('dur') is not None:
+            end = start + _parse_ttml_time(elem.get('dur'), tick_rate, frame_rate)
+        else:
+            raise SubtitleParseError("DFXP paragraph without 'end' or 'dur' attribute")
+        text = '\n'.join(l.strip() for l in _ttml_text(elem).strip().split('\n'))
+        table.append(start, end, text, elem.get(XML_ID, ''))
+    return table
+
+def serialize_dfxp(table, lang = None):
+    lang_attr = ' xml:lang="%s"' % escape(lang) if lang else ''
+    out = ['<?xml version="1.0" encoding="UTF-8"?>',
+        '<tt xmlns="%s"%s>' % (TTML_NS, lang_attr),
+        '<body>', '<div>']
+    for cue in table:
+        text = '<br/>'.join(escape(l) for l in cue.text.split('\n'))
+        ident = ' xml:id="%s"' % escape(cue.ident, {'"': '&quot;'}) if cue.ident else ''
+        out.append('<p%s begin="%s" end="%s">%s</p>' % (ident, format_timestamp(cue.start),
+            format_timestamp(cue.end), text))
+    out += ['</div>', '</body>', '</tt>', '']
+    return '\n'.join(out)
+
+
+########## Public interface ##########
+
+_PARSERS = {
+    'vtt': parse_vtt,
+    'srt': parse_srt,
+    'sbv': parse_sbv,
+    'dfxp': parse_dfxp,
+}
+_SERIALIZERS = {
+    'vtt': serialize_vtt,
+    'srt': serialize_srt,
+    'sbv': serialize_sbv,
+    'dfxp': serialize_dfxp,
+}
+# Other names of the same formats
+_ALIASES = {
+    'webvtt': 'vtt',
+    'ttml': 'dfxp',
+    'xml': 'dfxp',
+}
+
+def _format(sub_format):
+    sub_format = sub_format.lower()
+    sub_format = _ALIASES.get(sub_format, sub_format)
+    if sub_format not in SUPPORTED_FORMATS:
+        raise ValueError("Unsupported subtitle format '%s'" % sub_format)
+    return sub_format
+
+def can_replace_texts(sub_format):
+    """Can replace_texts() edit subtitles in this format?"""
+    sub_format = sub_format.lower()
+    return _ALIASES.get(sub_format, sub_format) in _SCANNERS
+
+def is_supported(sub_format):
+    sub_format = sub_format.lower()
+    return _ALIASES.get(sub_format, sub_format) in SUPPORTED_FORMATS
+
+def detect_format(text):
+    """Guesses subtitle format from the content"""
+    head = text.lstrip('﻿ \t\r\n')[:200]
+    if head.startswith('WEBVTT'):
+        return 'vtt'
+    if head.startswith('<'):
+        return 'dfxp'
+    if '-->' in head:
+        return 'srt'
+    if re.match(r'^\d+:\d{2}:\d{2}\.\d+,\d+:\d{2}:\d{2}\.\d+', head):
+        return 'sbv'
+    raise SubtitleParseError("Unknown subtitle format")
+
+def parse(text, sub_format = None):
+    """Returns CueTable, sub_format is guessed if not given"""
+    if sub_format is None:
+        sub_format = detect_format(text)
+    return _PARSERS[_format(sub_format)](text)
+
+def serialize(table, sub_format):
+    return _SERIALIZERS[_format(sub_format)](table)
+
+def convert(text, from_format, to_format):
+    """Converts subtitles between formats"""
+    table = parse(text, from_format)
+    if _format(from_format) != _format(to_format):
+        table = table.without_settings()
+    return serialize(table, to_format)
+
+def read_file(fname, sub_format = None):
+    """Parses subtitle file, format is taken from the file extension"""
+    if sub_format is None:
+        sub_format = fname.rsplit('.', 1)[-1]
+    with open(fname, 'r', encoding = 'utf-8') as f:
+        return parse(f.read(), sub_format)
+
+def write_file(table, fname, sub_format = None):
+    if sub_format is None:
+        sub_format = fname.rsplit('.', 1)[-1]
+    with open(fname, 'w', encoding = 'utf-8') as f:
+        f.write(serialize(table, sub_format))
+
+
+def check_roundtrip(text, sub_format = None):
+    """Checks that parsing and serializing subtitles does not lose anything
+
+    Returns None if it does not, otherwise description of the first difference.
+    Timestamps may be formatted differently, so the check compares
+    parsed tables (cues with identifiers and settings, header and blocks).
+    """
+    table = parse(text, sub_format)
+    if sub_format is None:
+        sub_format = detect_format(text)
+    table2 = parse(serialize(table, sub_format), sub_format)
+    if len(table) != len(table2):
+        return "%d cues instead of %d" % (len(table2), len(table))
+    for i, (cue, cue2) in enumerate(zip(table, table2)):
+        if cue != cue2:
+            return "cue %d: %r instead of %r" % (i, cue2, cue)
+    if table.blocks != table2.blocks:
+        return "NOTE/STYLE/REGION blocks differ"
+    if (table.header or 'WEBVTT') != (table2.header or 'WEBVTT'):
+        return "header differs"
+    return None
+
+
+if __name__ == '__main__':
+    # Round-trip check of subtitle files, e.g. downloaded from Amara or YouTube:
+    #   ./subtitles.py subs/*.vtt
+    failed = 0
+    for fname in sys.argv[1:]:
+        with open(fname, 'r', encoding = 'utf-8') as f:
+            text = f.read()
+        try:
+            problem = check_roundtrip(text, fname.rsplit('.', 1)[-1])
+        except (SubtitleParseError, ValueError) as e:
+            problem = str(e)
+        if problem is not None:
+            print("%s: %s" % (fname, problem))
+            failed += 1
+    print("%d of %d files do not survive parsing and serialization" % (failed, len(sys.argv[1:])))
+    sys.exit(1 if failed else 0)
@@ -2,11 +2,17 @@
 # Anaconda Python...for some reason does not work
 ##!/usr/bin/env python3
 import os, sys, requests
-from oauth2client.tools import argparser
 
 from utils import eprint, epprint
 from api.amara_api import Amara
 import api.youtube_oauth as ytapi
+from api.youtube_quota import QUOTA, method_cost
+from subtitle_store import SubtitleStore, SUBTITLE_STORE_DIR
+from caption_index import CaptionIndex, CAPTION_INDEX_FILE, content_hash
+from caption_snapshot import CaptionSnapshot, CAPTION_SNAPSHOT_FILE
+from journal import Journal, default_journal_fname
+from subs_diff import diff_subs
+from subtitles import SubtitleParseError
 
 #SUPPORTED_LANGUAGES = ['cs','bg','ko','pl', 'my']
 # SAFETY MEASURE 
@@ -17,12 +23,21 @@ SUB_FORMAT = 'vtt'
 
 def read_cmd():
    """Read command line options."""
-   parser = argparser
+   parser = ytapi.oauth_argparser()
    parser.add_argument('input_file', metavar='INPUT_FILE', help='Text file containing YouTube IDs in the first column')
    parser.add_argument('-l','--lang', dest='lang', required = True, help='Subtitle language')
-   parser.add_argument('-u','--update', dest='update', default=False, action="store_true", help='Update subtitles even if present on YT')
+   parser.add_argument('-u','--update', dest='update', default=False, action="store_true", help='Update subtitles even if present on YT (only if they changed since we pushed them)')
+   parser.add_argument('--force', dest='force', default=False, action="store_true", help='With --update, upload subtitles even if they did not change')
+   parser.add_argument('--verify', dest='verify', default=False, action="store_true", help='Download captions from YT to detect changes made directly on YouTube (costs extra quota)')
+   parser.add_argument('--snapshot', dest='snapshot_fname', nargs='?', const=CAPTION_SNAPSHOT_FILE, default=None, help='Take existing YT captions from the channel snapshot (see caption_snapshot.py) instead of listing them')
+   parser.add_argument('--caption-index', dest='caption_index', default=CAPTION_INDEX_FILE, help='Index of captions pushed to YouTube')
    parser.add_argument('-p','--publish', dest='publish', default=True, action="store_true", help='Publish subtitles')
    parser.add_argument('-v','--verbose', dest='verbose', default=False, action="store_true", help='Verbose output')
+   parser.add_argument('--store', dest='store_dir', default=SUBTITLE_STORE_DIR, help='Local store of already downloaded Amara subtitles')
+   parser.add_argument('--no-cache', dest='use_cache', default=True, action="store_false", help='Do not use cached Amara video lookups')
+   parser.add_argument('--resume', dest='resume', default=False, action="store_true", help='Skip videos finished in the previous run (see --journal)')
+   parser.add_argument('--journal', dest='journal_fname', default=None, help='Journal file with progress of the run, written on every run, default is INPUT_FILE.sync_subs_amara2yt.LANG.journal')
+   parser.add_argument('--deferred', dest='deferred_fname', default=None, help='File for YTIDs postponed due to exhausted YouTube quota, default is INPUT_FILE.deferred')
    return parser.parse_args()
 
 opts = read_cmd()
@@ -51,18 +66,49 @@ with open(opts.input_file, "r") as f:
             ytids.append(l[0])
 
 
-TEMP_FOLDER = 'subs'
-if not os.path.isdir(TEMP_FOLDER):
-    try:
-        os.mkdir(TEMP_FOLDER)
-    except:
-        print("Could not create temp directory %s" % (TEMP_FOLDER))
-        raise
-
 AMARA_USERNAME = 'dhbot'
-amara = Amara(AMARA_USERNAME)
+amara = Amara(AMARA_USERNAME, use_cache = opts.use_cache)
+store = SubtitleStore(opts.store_dir)
+pushed = CaptionIndex(opts.caption_index)
 youtube = ytapi.get_authenticated_service(opts)
 
+if opts.journal_fname is None:
+    opts.journal_fname = default_journal_fname(__file__, opts.input_file, opts.lang)
+journal = Journal(opts.journal_fname, resume = opts.resume)
+
+if opts.deferred_fname is None:
+    opts.deferred_fname = "%s.deferred" % opts.input_file
+# YTIDs that we could not process today within the YouTube quota
+deferred = []
+# YTID -> caption tracks on YouTube
+all_captions = {}
+# YTIDs for which we already tried to list captions
+listed = set()
+
+snapshot = None
+if opts.snapshot_fname is not None:
+    snapshot = CaptionSnapshot(opts.snapshot_fname)
+    for ytid in ytids:
+        if snapshot.has(ytid):
+            all_captions[ytid] = snapshot.captions(ytid)
+            listed.add(ytid)
+    print("Captions for %d videos taken from snapshot %s" % (len(listed), opts.snapshot_fname))
+
+print(QUOTA.summary())
+
+def record_pushed(ytid, caption_id, amara_id, sub_version, subs_hash):
+    """Remember what we pushed, with --verify also what YouTube made of it"""
+    info = {
+        'sha256': subs_hash,
+        'amara_id': amara_id,
+        'amara_version': sub_version,
+        'youtube_sha256': None,
+    }
+    if opts.verify and QUOTA.can_afford('youtube.captions.download'):
+        data = ytapi.fetch_caption(youtube, caption_id, SUB_FORMAT)
+        info['youtube_sha256'] = content_hash(data)
+    pushed.put(ytid, opts.lang, caption_id, **info)
+
 uploaded = 0
 # Main loop
 for i in range(len(ytids)):
@@ -72,6 +118,25 @@ for i in range(len(ytids)):
     amara_id = ''
     ytid = ytids[i]
 
+    if journal.is_done(ytid):
+        continue
+
+    # Listing captions is the cheapest thing we need to do for every video,
+    # if we cannot afford that, we're done for today
+    if ytid not in listed:
+        list_cost = method_cost('youtube.captions.list')
+        if not QUOTA.can_afford('youtube.captions.list'):
+            deferred.extend(y for y in ytids[i:] if not journal.is_done(y))
+            break
+        # List captions for the following videos in one batched request
+        n = min(ytapi.CAPTIONS_BATCH_SIZE, QUOTA.remaining() // list_cost)
+        pending = [y for y in dict.fromkeys(ytids[i:])
+                if not journal.is_done(y) and y not in listed][:n]
+        all_captions.update(ytapi.list_captions_bulk(youtube, pending,
+            verbose = opts.verbose))
+        listed.update(pending)
+    journal.record(ytid, journal.STARTED)
+
     video_url = 'https://www.youtube.com/watch?v=%s' % ytid
 
     print("Syncing YTID %s" % ytid)
@@ -79,7 +144,10 @@ for i in range(len(ytids)):
     sys.stdout.flush()
     sys.stderr.flush()
 
-    captions = ytapi.list_captions(youtube, ytid, verbose = opts.verbose)
+    captions = all_captions.get(ytid)
+    if captions is None:
+        # Listing failed in the batch, try again to see what's wrong
+        captions = ytapi.list_captions(youtube, ytid, verbose = opts.verbose)
 
     captions_present = False
     for item in captions:
@@ -106,10 +174,65 @@ for i in range(len(ytids)):
             sys.exit(1)
 
     # PART 2: DOWNLOAD SUBTITLES FROM AMARA
-    subs = amara.download_subs(amara_id, opts.lang, SUB_FORMAT)
-    subs_fname = "%s/%s.%s.%s" % (TEMP_FOLDER, ytid, opts.lang, SUB_FORMAT)
-    with open(subs_fname, "w", encoding="utf-8") as f:
-        f.write(subs)
+    subs = store.fetch(amara, amara_id, opts.lang, sub_version, SUB_FORMAT)
+    # Uploaded to YouTube directly from memory
+    subs_data = subs.encode('utf-8')
+    subs_hash = content_hash(subs_data)
+
+    # Captions currently on YouTube, if we download them for --verify
+    youtube_data = None
+
+    # Do not update subtitles that we already pushed
+    if captions_present and opts.update and not opts.force \
+            and pushed.is_unchanged(ytid, opts.lang, captionid, subs_hash):
+        unchanged = True
+        youtube_hash = pushed.get(ytid, opts.lang, captionid).get('youtube_sha256')
+        if opts.verify and youtube_hash is not None:
+            if QUOTA.can_afford('youtube.captions.download'):
+                youtube_data = ytapi.fetch_caption(youtube, captionid, SUB_FORMAT)
+                if content_hash(youtube_data) != youtube_hash:
+                    print("Subtitles were changed on YouTube since our last update, YTID=%s" % ytid)
+                    unchanged = False
+            else:
+                print("Not enough YouTube quota left for verification, YTID=%s" % ytid)
+        if unchanged:
+            if opts.verbose:
+                print("Subtitles did not change since the last update, YTID=%s" % ytid)
+            journal.done(ytid, outcome = 'unchanged')
+            continue
+
+    # With --verify, compare the track on YouTube cue by cue,
+    # downloading it is much cheaper than an update
+    if captions_present and opts.update and opts.verify and not opts.force \
+            and (youtube_data is not None or QUOTA.can_afford('youtube.captions.download')):
+        if youtube_data is None:
+            youtube_data = ytapi.fetch_caption(youtube, captionid, SUB_FORMAT)
+        try:
+            diff = diff_subs(youtube_data, subs, SUB_FORMAT)
+        except SubtitleParseError as e:
+            print("WARNING: Could not compare with subtitles on YouTube: %s" % e)
+            diff = None
+        if diff is not None and diff.is_identical():
+            print("Subtitles on YouTube are identical to Amara, YTID=%s" % ytid)
+            pushed.put(ytid, opts.lang, captionid, sha256 = subs_hash, amara_id = amara_id,
+                    amara_version = sub_version, youtube_sha256 = content_hash(youtube_data))
+            journal.done(ytid, outcome = 'identical')
+            continue
+        if diff is not None:
+            print("Changes against YouTube: %s" % diff.summary())
+
+    # Postpone the upload if it does not fit into the remaining quota,
+    # but carry on, videos that do not need an upload are cheap
+    if captions_present and opts.update:
+        upload_method = 'youtube.captions.update'
+    elif not captions_present:
+        upload_method = 'youtube.captions.insert'
+    else:
+        upload_method = None
+    if upload_method is not None and not QUOTA.can_afford(upload_method):
+        print("Not enough YouTube quota left, postponing YTID=%s" % ytid)
+        deferred.append(ytid)
+        continue
 
     # PART 3: UPLOAD SUBTITLES TO YOUTUBE
     if captions_present:
@@ -117,20 +240,42 @@ for i in range(len(ytids)):
             print("Subtitles already present for YTID %s" % ytid)
         if opts.update:
             print("Updating subtitles for YTID %s " % ytid)
-            res = ytapi.update_caption(youtube, ytid, opts.lang, captionid, is_draft, subs_fname);
+            res = ytapi.update_caption(youtube, ytid, opts.lang, captionid, is_draft, subs_data);
             if res:
                 uploaded +=1
+                record_pushed(ytid, captionid, amara_id, sub_version, subs_hash)
+                journal.done(ytid, outcome = 'updated')
             else:
                 print("Unspecified ERROR while updating subtitles")
                 sys.exit(1)
+        else:
+            journal.done(ytid, outcome = 'skipped')
     else:
         print("Uploading new subtitles for YTID=", ytid)
-        res = ytapi.upload_caption(youtube, ytid, opts.lang, '', is_draft, subs_fname)
+        res = ytapi.upload_caption(youtube, ytid, opts.lang, '', is_draft, subs_data)
         if res:
             uploaded += 1
+            record_pushed(ytid, res, amara_id, sub_version, subs_hash)
+            if snapshot is not None:
+                snapshot.add_caption(ytid, res, opts.lang, is_draft)
+                snapshot.save()
+            journal.done(ytid, outcome = 'uploaded')
         else:
             print("Unspecified ERROR while uploading subtitles")
             sys.exit(1)
 
+journal.close()
+
+if len(deferred) > 0:
+    with open(opts.deferred_fname, "w") as f:
+        f.write('\n'.join(deferred) + '\n')
+    print("\n%d videos postponed due to YouTube quota, written to %s"
+            % (len(deferred), opts.deferred_fname))
+    print("Run again tomorrow with --resume (or with the deferred file as input)")
+else:
+    if os.path.isfile(opts.deferred_fname):
+        os.remove(opts.deferred_fname)
+
 print("\nFinished!")
 print("Succesfuly uploaded %d videos." % uploaded)
+print(QUOTA.summary())
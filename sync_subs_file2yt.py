@@ -2,8 +2,8 @@
 # Anaconda Python...for some reason does not work
 ##!/usr/bin/env python3
 import os, sys, requests
-from oauth2client.tools import argparser
 import api.youtube_oauth as ytapi
+from caption_snapshot import CaptionSnapshot, CAPTION_SNAPSHOT_FILE
 
 # SAFETY MEASURE 
 SUPPORTED_LANGUAGES = ['my']
@@ -13,12 +13,13 @@ SUB_FORMAT = 'vtt'
 
 def read_cmd():
    """Read command line options."""
-   parser = argparser
+   parser = ytapi.oauth_argparser()
    parser.add_argument('input_file', metavar='INPUT_FILE', help='Text file containing YouTube IDs in the first column')
    parser.add_argument('-l','--lang', dest='lang', required = True, help='Subtitle language')
    parser.add_argument('-d','--dir', dest='dirname', required = True, help='Directory with subtitle files')
    parser.add_argument('-u','--update', dest='update', default=False, action="store_true", help='Update subtitles even if present on YT')
    parser.add_argument('-p','--publish', dest='publish', default=True, action="store_true", help='Publish subtitles')
+   parser.add_argument('--snapshot', dest='snapshot_fname', nargs='?', const=CAPTION_SNAPSHOT_FILE, default=None, help='Take existing YT captions from the channel snapshot (see caption_snapshot.py) instead of listing them')
    parser.add_argument('-v','--verbose', dest='verbose', default=False, action="store_true", help='Verbose output')
    return parser.parse_args()
 
@@ -55,6 +56,19 @@ if not os.path.isdir(opts.dirname):
 # Create session with YT (I hope it is persistent)
 youtube = ytapi.get_authenticated_service(opts)
 
+all_captions = {}
+snapshot = None
+if opts.snapshot_fname is not None:
+    snapshot = CaptionSnapshot(opts.snapshot_fname)
+    for ytid in ytids:
+        if snapshot.has(ytid):
+            all_captions[ytid] = snapshot.captions(ytid)
+    print("Captions for %d videos taken from snapshot %s" % (len(all_captions), opts.snapshot_fname))
+
+# List existing captions for the rest of the videos at once (in batches)
+all_captions.update(ytapi.list_captions_bulk(youtube,
+    [ytid for ytid in ytids if ytid not in all_captions], verbose = opts.verbose))
+
 uploaded = 0
 # Main loop
 for ytid in ytids:
@@ -62,7 +76,10 @@ for ytid in ytids:
     sys.stdout.flush()
     sys.stderr.flush()
 
-    captions = ytapi.list_captions(youtube, ytid, verbose = opts.verbose)
+    captions = all_captions.get(ytid)
+    if captions is None:
+        # Listing failed in the batch, try again to see what's wrong
+        captions = ytapi.list_captions(youtube, ytid, verbose = opts.verbose)
 
     captions_present = False
     for item in captions:
@@ -90,6 +107,9 @@ for ytid in ytids:
         res = ytapi.upload_caption(youtube, ytid, opts.lang, '', is_draft, subs_fname)
         if res:
             uploaded += 1
+            if snapshot is not None:
+                snapshot.add_caption(ytid, res, opts.lang, is_draft)
+                snapshot.save()
         else:
             print("Unspecified ERROR while uploading subtitles")
             sys.exit(1)
@@ -3,17 +3,18 @@ from subprocess import Popen, PIPE, call, check_call
 import argparse, sys, os, requests
 from pprint import pprint
 from api.amara_api import Amara
-from utils import eprint, epprint, download_yt_subtitles
+from utils import eprint, epprint
+from youtube_subs import download_yt_subtitles
+from journal import Journal, default_journal_fname
+from subs_diff import diff_subs
+from subtitles import SubtitleParseError
 
 # We suppose that the uploaded subtitles are complete (non-critical)
 is_complete = True # do we upload complete subtitles?
 
-# DH TODO automatically handle missing YT sub formats
-# converting to srt can be done via
-# ffmpeg -i foo.vtt foo.srt
-# currently youtube-dl convert does not work when not downloading the video
+# If YouTube does not offer this format, subtitles are converted
+# from another one (see youtube_subs.py)
 sub_format = 'vtt'
-sub_format2 = "srt"
 
 def read_cmd():
    """Function for reading command line options."""
@@ -27,6 +28,18 @@ def read_cmd():
    parser.add_argument('--skip-errors', dest = 'skip', default = False, action = "store_true",
    help = 'Skip subtitles that could not be downloaded. \
          The list of failed YTIDs will be printed to \"failed_yt.dat\".')
+   parser.add_argument(
+           '--no-cache', dest = 'use_cache',
+           default = True, action = 'store_false',
+           help='Do not use cached Amara video lookups.')
+   parser.add_argument(
+           '--resume', dest = 'resume',
+           default = False, action = 'store_true',
+           help='Skip videos finished in the previous run (see --journal).')
+   parser.add_argument(
+           '--journal', dest = 'journal_fname', default = None,
+           help='Journal file with progress of the run, written on every run, \
+           default is INPUT_FILE.sync_subs_yt2amara.LANG.journal')
    return parser.parse_args()
 
 opts = read_cmd()
@@ -81,15 +94,19 @@ except FileNotFoundError as e:
 
 uploaded = 0
 missing = 0
+identical = 0
 
 AMARA_USERNAME = 'dhbot'
-amara = Amara(AMARA_USERNAME)
+amara = Amara(AMARA_USERNAME, use_cache = opts.use_cache)
+
+if opts.journal_fname is None:
+    opts.journal_fname = default_journal_fname(__file__, opts.input_file, opts.lang)
+journal = Journal(opts.journal_fname, resume = opts.resume)
 
 # Main loop
 for i in range(len(ytids)):
     video_present = False
     lang_present  = False
-    lang_visible  = False
     if len(ytids[i]) == 0 or ytids[i][0][0] == "#":
         print("")
         continue
@@ -103,34 +120,37 @@ for i in range(len(ytids)):
     if ytid in ytid_exist and not opts.rewrite:
         continue
 
+    if journal.is_done(ytid):
+        continue
+    journal.record(ytid, journal.STARTED)
+
     sys.stdout.flush()
     sys.stderr.flush()
     f_vids.flush()
 
 #   Check whether video is on Amara, if not create it
-    amara_response = amara.check_video(video_url)
-    if not amara_response or amara_response['meta']['total_count'] == 0:
+#   With --resume, use the video created in the previous run,
+#   check_video might not find it yet (cached response)
+    amara_id = journal.info(ytid).get('amara_id')
+    if amara_id is None:
+        amara_response = amara.check_video(video_url)
+        if amara_response and amara_response['meta']['total_count'] > 0:
+            amara_id = amara_response['objects'][0]['id']
+    if amara_id is None:
         video_present = False
         lang_present  = False
     else:
         video_present = True
-        amara_id = amara_response['objects'][0]['id']
-        amara_title = amara_response['objects'][0]['title']
-        for lg in amara_response['objects'][0]['languages']:
-            if lg["code"] == opts.lang:
-                lang_present = True
-                # lang could be there, but with no revisions
-                # this key was retired from API
-                lang_visible = True
-                #if lg["visible"] == True:
-                #    lang_visible = True
-                break
+        # NOTE: We do not look at the language list from check_video,
+        # since it might come from cache and be outdated.
+        # lang could be there, but with no revisions
         lang_present, sub_version = amara.check_language(amara_id, opts.lang)
-        if lang_present and lang_visible and sub_version > 0:
+        if lang_present and sub_version > 0:
             f_vids.write(ytid + '\n')
             if not opts.rewrite:
                 print("Subtitles already on Amara for video YTID=%s" % ytid)
                 print("Use \"-r\" option to overwrite them")
+                journal.done(ytid, outcome = 'present')
                 continue
 
     # Moved this here due to large number of Amara errors...
@@ -142,6 +162,7 @@ for i in range(len(ytids)):
         else:
             print("ERROR: During adding video to Amara. YTID=%s" % ytid)
             continue
+        journal.record(ytid, 'video_added', amara_id = amara_id)
         if opts.verbose:
             print("Created video on Amara with AmaraId %s" % amara_id)
             print("%s/cs/videos/%s" % (amara.AMARA_BASE_URL, amara_id))
@@ -150,6 +171,30 @@ for i in range(len(ytids)):
     # PART 2: GETTING THE SUBTITLES FROM YOUTUBE
     # imported from utils.py
     subs = download_yt_subtitles(opts.lang, sub_format, ytid, TEMP_DIR)
+    if subs is None:
+        missing += 1
+        if not opts.skip:
+            sys.exit(1)
+        with open("failed_yt.dat", "a") as f:
+            f.write(ytid + '\n')
+        continue
+
+    # With -r, do not create a new revision if nothing changed
+    if lang_present and sub_version > 0:
+        try:
+            diff = diff_subs(amara.download_subs(amara_id, opts.lang, sub_format), subs, sub_format)
+        except SubtitleParseError as e:
+            print("WARNING: Could not compare subtitles with Amara for YTID=%s: %s" % (ytid, e))
+            diff = None
+        if diff is not None and diff.is_identical():
+            print("Subtitles on Amara are identical to YouTube for YTID=%s" % ytid)
+            identical += 1
+            journal.done(ytid, outcome = 'identical')
+            continue
+        if diff is not None:
+            print("Rewriting subtitles for YTID=%s, %s" % (ytid, diff.summary()))
+            if opts.verbose:
+                print(diff.format_changes())
 
     # PART 3: Creating language on Amara
     if not lang_present:
@@ -165,8 +210,12 @@ for i in range(len(ytids)):
         print("Succesfully uploaded subtitles for YTID=%s AmaraID=%s" % (ytid, amara_id))
         uploaded += 1
         f_vids.write(ytid + '\n')
+        journal.done(ytid, outcome = 'uploaded', version = r['version_number'])
 
 
+journal.close()
 print("(: And we are finished! :)")
 print("Succesfuly uploaded %d video subtitles." % uploaded)
 print("%d videos are missing subtitles on YT" % missing)
+if opts.rewrite:
+    print("%d videos already had identical subtitles on Amara" % identical)
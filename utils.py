@@ -2,7 +2,6 @@
 import sys, os
 import pickle
 from pprint import pprint
-from subprocess import Popen, PIPE
 import string
 
 def answer_me(question):
@@ -100,43 +99,3 @@ def read_listed_topic_slugs():
     LISTED_TOPIC_FILE = dir_path + '/indexable_topic_slugs.txt'
     listed_topic_slugs = read_unique_data_from_one_column(LISTED_TOPIC_FILE)
     return listed_topic_slugs
-
-
-def download_yt_subtitles(lang, sub_format, ytid, dirname = "subs"):
-    video_url = 'https://www.youtube.com/watch?v=%s' % ytid
-    yt_download_cmd = 'youtube-dl --sub-lang %s --sub-format %s --write-sub \
-    --skip-download --youtube-skip-dash-manifest %s' % (lang, sub_format, video_url)
-    FNAME_OUT = "youtubedl.out"
-    FNAME_ERR = "youtubedl.err"
-    
-    p = Popen(yt_download_cmd, shell=True, stdout=PIPE, stderr=PIPE)
-    out, err = p.communicate()
-    with open(FNAME_OUT, 'a') as f:
-        f.write(out.decode('UTF-8'))
-
-    if err:
-        with open(FNAME_ERR, 'a') as f:
-            f.write(err.decode('UTF-8'))
-
-    # youtubedl automatically download subs to file named after video title
-    # Here we extract the name of the file and rename it to something more sane
-    fname = out.decode('UTF-8').split('Writing video subtitles to: ')
-    if len(fname) < 2:
-        print("ERROR: Requested subtitles were not found on YouTube.")
-        print("Look into file %s for more details" % FNAME_ERR)
-        sys.exit(1)
-        #return None
-
-    if not os.path.isdir(dirname):
-        os.mkdir(dirname)
-
-    fname = fname[1].rstrip();
-    fname_target = "%s/%s.%s.%s" % (dirname, ytid, lang, sub_format)
-    os.rename(fname, fname_target)
-    print('Subtitles downloaded to file %s' % fname_target)
-
-    with open(fname_target, 'r') as content_file:
-        subs = content_file.read()
-
-    return subs
-
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+import os, glob, threading, tempfile, subprocess
+from collections import namedtuple
+import requests
+
+import subtitles
+
+# youtube-dl (or its fork yt-dlp) is used as a library,
+# so that we do not spawn a new process for every video
+try:
+    import yt_dlp as youtube_dl
+except ImportError:
+    try:
+        import youtube_dl
+    except ImportError:
+        youtube_dl = None
+
+# Formats offered by YouTube that we can convert to other formats,
+# in order of preference
+CONVERTIBLE_FORMATS = ('vtt', 'ttml', 'srt')
+
+# Command line tool, used only if the Python module is not installed
+YOUTUBE_DL_EXECUTABLE = 'youtube-dl'
+
+# Result of downloading subtitles for one video
+# subs  - subtitles as string, None if they could not be downloaded
+# fname - file where the subtitles were saved, or None
+# log   - messages from youtube-dl for this video
+# error - error message, None on success
+SubtitleDownload = namedtuple('SubtitleDownload',
+        ['ytid', 'lang', 'sub_format', 'subs', 'fname', 'log', 'error'])
+
+
+class _Logger:
+    """Collects messages from youtube-dl instead of printing them"""
+
+    def __init__(self):
+        self.messages = []
+
+    def debug(self, msg):
+        pass
+
+    def warning(self, msg):
+        self.messages.append(msg)
+
+    def error(self, msg):
+        self.messages.append(msg)
+
+
+class YouTubeSubtitleFetcher:
+    """Downloads subtitles uploaded to YouTube videos (not automatic captions)
+
+    One instance can be used for many videos, it keeps youtube-dl
+    instance and HTTP connections open between them.
+    Not thread-safe, use one instance per thread (see get_fetcher()).
+    """
+
+    def __init__(self):
+        if youtube_dl is None:
+            raise ImportError("youtube_dl or yt_dlp module is needed to download subtitles from YouTube")
+        self.logger = _Logger()
+        self.ydl = youtube_dl.YoutubeDL({
+            'skip_download': True,
+            'writesubtitles': True,
+            'youtube_include_dash_manifest': False,
+            'quiet': True,
+            'no_warnings': False,
+            'logger': self.logger,
+        })
+        self.session = requests.Session()
+
+    def list_subtitles(self, ytid):
+        """Returns dictionary lang -> list of available formats,
+        e.g. {'cs': [{'ext': 'vtt', 'url': '...'}, ...]}, or None on error"""
+        video_url = 'https://www.youtube.com/watch?v=%s' % ytid
+        try:
+            info = self.ydl.extract_info(video_url, download = False, process = False)
+        except youtube_dl.utils.DownloadError:
+            return None
+        return info.get('subtitles') or {}
+
+    def fetch(self, ytid, lang, sub_format = 'vtt'):
+        """Returns subtitles as string, or None if they are not on YouTube"""
+        tracks = self.list_subtitles(ytid)
+        if not tracks or lang not in tracks:
+            return None
+        available = dict((sub.get('ext'), sub) for sub in tracks[lang])
+        if sub_format in available:
+            return self._get(available[sub_format])
+        if sub_format not in subtitles.SUPPORTED_FORMATS:
+            return None
+        # Requested format is not offered by YouTube, convert from another one
+        for ext in CONVERTIBLE_FORMATS:
+            if ext in available:
+                subs = self._get(available[ext])
+                self.logger.messages.append("Converting subtitles from %s to %s" % (ext, sub_format))
+                return subtitles.convert(subs, ext, sub_format)
+        return None
+
+    def _get(self, sub):
+        if sub.get('data') is not None:
+            return sub['data']
+        r = self.session.get(sub['url'])
+        r.raise_for_status()
+        r.encoding = 'utf-8'
+        return r.text
+
+    def download(self, ytid, lang, sub_format = 'vtt'):
+        """Returns SubtitleDownload (with fname=None)"""
+        self.logger.messages = []
+        try:
+            subs = self.fetch(ytid, lang, sub_format)
+            error = None
+        except (requests.RequestException, subtitles.SubtitleParseError) as e:
+            subs, error = None, str(e)
+        log = '\n'.join(self.logger.messages)
+        if subs is None and error is None:
+            error = "Requested subtitles were not found on YouTube"
+        return SubtitleDownload(ytid, lang, sub_format, subs, None, log, error)
+
+
+def _download_with_executable(ytid, lang, sub_format):
+    """Runs youtube-dl executable in its own temporary directory,
+    so that more downloads can run concurrently."""
+    video_url = 'https://www.youtube.com/watch?v=%s' % ytid
+    with tempfile.TemporaryDirectory(prefix = 'kstools-ytdl-') as workdir:
+        cmd = [YOUTUBE_DL_EXECUTABLE, '--sub-lang', lang, '--sub-format', sub_format,
+                '--write-sub', '--skip-download', '--youtube-skip-dash-manifest',
+                '-o', '%(id)s.%(ext)s', video_url]
+        try:
+            p = subprocess.run(cmd, cwd = workdir, stdout = subprocess.PIPE,
+                    stderr = subprocess.PIPE)
+        except OSError as e:
+            return SubtitleDownload(ytid, lang, sub_format, None, None, '',
+                    "Could not run %s: %s" % (YOUTUBE_DL_EXECUTABLE, e))
+        log = (p.stdout + p.stderr).decode('UTF-8', errors = 'replace')
+
+        fnames = glob.glob(os.path.join(workdir, "*.%s.%s" % (lang, sub_format)))
+        if len(fnames) == 0:
+            return SubtitleDownload(ytid, lang, sub_format, None, None, log,
+                    "Requested subtitles were not found on YouTube")
+        with open(fnames[0], 'r', encoding = 'utf-8') as f:
+            subs = f.read()
+    return SubtitleDownload(ytid, lang, sub_format, subs, None, log, None)
+
+
+_local = threading.local()
+
+def get_fetcher():
+    """Returns YouTubeSubtitleFetcher for the current thread"""
+    fetcher = getattr(_local, 'fetcher', None)
+    if fetcher is None:
+        fetcher = YouTubeSubtitleFetcher()
+        _local.fetcher = fetcher
+    return fetcher
+
+
+def fetch_yt_subtitles(ytid, lang, sub_format = 'vtt', dirname = None):
+    """Downloads subtitles for one video, returns SubtitleDownload
+
+    Safe to call from more threads or processes at once.
+    If dirname is given, subtitles are also saved to
+    file <dirname>/<ytid>.<lang>.<sub_format>
+    """
+    if youtube_dl is not None:
+        result = get_fetcher().download(ytid, lang, sub_format)
+    else:
+        result = _download_with_executable(ytid, lang, sub_format)
+
+    if result.subs is not None and dirname is not None:
+        os.makedirs(dirname, exist_ok = True)
+        fname = "%s/%s.%s.%s" % (dirname, ytid, lang, sub_format)
+        with open(fname, 'w', encoding = 'utf-8') as f:
+            f.write(result.subs)
+        result = result._replace(fname = fname)
+    return result
+
+
+def download_yt_subtitles(lang, sub_format, ytid, dirname = None):
+    """Returns subtitles from YouTube, or None if they are not available
+
+    If dirname is given, subtitles are also saved to
+    file <dirname>/<ytid>.<lang>.<sub_format>
+    """
+    result = fetch_yt_subtitles(ytid, lang, sub_format, dirname)
+    if result.error is not None:
+        print("ERROR: %s YTID=%s" % (result.error, ytid))
+        if result.log:
+            print(result.log.rstrip())
+        return None
+    if result.fname is not None:
+        print('Subtitles downloaded to file %s' % result.fname)
+    return result.subs